@@ -0,0 +1,252 @@
+"""
+Headless benchmark of the acquisition -> render -> log path.
+
+Builds MainWindow under Qt's offscreen platform with synthetic histories and
+times the hot calls for several graph selections. Every history size runs in
+its own process so its peak RSS is measured on its own. Results are written as
+JSON; --compare flags metrics that got slower than a previous result file.
+
+    python3 -m benchmarks.bench_gui
+    python3 -m benchmarks.bench_gui --rows 1000 100000 --output new.json --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from datetime import timedelta
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROWS = [1000, 10000, 100000, 1000000]
+# Graph groups checked for each case; graph_data covers 7 of the 8 channels (o2 is not graphed)
+SELECTIONS = {
+    1: ['Pressure'],
+    2: ['Pressure', 'Flow Rate'],
+    4: ['Temperature'],
+    7: ['Temperature', 'Pressure', 'Flow Rate', 'Pump Speed'],
+}
+WINDOWS = {'10min': timedelta(minutes=10), 'all': None}  # None shows the whole history
+SAMPLE_PERIOD_S = 5
+CSV_BATCH_ROWS = 50  # Rows per logger flush, like LOG_BATCH_ROWS
+
+
+def synthetic_csv(path, headers, rows, seed=0):
+    """
+    Write a CSV log of `rows` random-walk samples every SAMPLE_PERIOD_S seconds.
+    """
+    rng = np.random.default_rng(seed)
+    n_channels = len(headers) - 2
+    start = np.datetime64('2026-01-01T00:00:00', 'us')
+    with open(path, 'w') as file:
+        file.write(','.join(headers) + '\n')
+        for chunk in range(0, rows, 100000):
+            n = min(100000, rows - chunk)
+            idx = np.arange(chunk + 1, chunk + n + 1)
+            times = np.datetime_as_string(start + (idx - 1) * np.timedelta64(SAMPLE_PERIOD_S, 's'), unit='us')
+            values = (10 + np.cumsum(rng.normal(0, 0.05, (n, n_channels)), axis=0)).round(3)
+            file.writelines(f"{i},{t.replace('T', ' ')},{','.join(map(str, v))}\n" for i, t, v in zip(idx, times, values.tolist()))
+
+
+def summarize(seconds) -> dict:
+    times_ms = np.array(seconds) * 1000
+    return {
+        'n': len(times_ms),
+        'median_ms': float(np.median(times_ms)),
+        'p95_ms': float(np.percentile(times_ms, 95)),
+        'max_ms': float(times_ms.max()),
+    }
+
+
+def timed(function, repeat: int, setup=None) -> dict:
+    seconds = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return summarize(seconds)
+
+
+def run_size(rows: int, repeat: int) -> dict:
+    """
+    Benchmark one history size in this process.
+    """
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix='sow_bench_')
+    os.chdir(workdir)  # The window creates its log, segments and rollups here
+    import sow_gui
+    from PyQt5.QtWidgets import QApplication
+    from utils.logger import CsvLogger
+    from utils.segments import SegmentedCsvLogger
+    from utils.qtgraph import PainterGraph
+    sow_gui.DATA_CAPACITY = rows
+    sow_gui.RESUME_LAST_LOG = False
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = sow_gui.MainWindow(graph_backend='matplotlib')  # The native graph is timed next to it below
+    window.acquisition.stop()  # Only synthetic samples in the store
+    window.show()
+    if not window.realtimeGroup.isVisible():
+        window.toggle_group()
+    window.build_graph()  # No-op if toggle_group already built it
+    native = PainterGraph()
+    native.resize(window.graph.size())
+    native.show()
+    app.processEvents()
+
+    results = []
+
+    def record(metric, stats, **case):
+        results.append(dict(rows=rows, metric=metric, **case, **stats))
+
+    source = os.path.join(workdir, 'synthetic.csv')
+    synthetic_csv(source, window.headers, rows)
+    window.csv_filename = source
+    record('read_csv_file', timed(window.read_csv_file, max(1, repeat // 5)))
+
+    next_idx = [rows + 1]
+
+    def append_sample():
+        # One new sample, like an update_data tick
+        last_row = window.data.last_row()
+        window.data.append(next_idx[0], last_row[1] + timedelta(seconds=SAMPLE_PERIOD_S), last_row[2:])
+        next_idx[0] += 1
+
+    span = timedelta(seconds=rows * SAMPLE_PERIOD_S)
+    for series, groups in SELECTIONS.items():
+        window.selected_buttons = {key: key in groups for key in window.selected_buttons}
+        for window_name, duration in WINDOWS.items():
+            case = {'series': series, 'window': window_name}
+            window.graph.set_xlim_duration(duration or span)
+            window.update_graphs()
+            app.processEvents()
+
+            def cold():
+                window.decimator.reset()
+                window.graph.static_dirty = True
+            record('update_graphs_cold', timed(window.update_graphs, repeat, setup=cold), **case)
+            record('update_graphs_tick', timed(window.update_graphs, repeat, setup=append_sample), **case)
+
+            # update_plot on the already decimated data of the last tick
+            times, data, units, multipliers = window.graph.last_plot_args
+            for blit in (True, False):
+                window.graph.blit = blit
+                window.graph.static_dirty = True
+                window.graph.update_plot(times, data, units, multipliers)
+                record('update_plot_blit' if blit else 'update_plot_full',
+                       timed(lambda: window.graph.update_plot(times, data, units, multipliers), repeat), **case)
+            window.graph.blit = sow_gui.GRAPH_BLIT
+            native.set_xlim_duration(window.graph.xlim_duration, redraw=False)
+            native.update_plot(times, data, units, multipliers)
+            record('update_plot_native', timed(lambda: native.update_plot(times, data, units, multipliers), repeat), **case)
+            record('update_plot_native_static', timed(lambda: native.update_plot(times, data, units, multipliers), repeat,
+                                                      setup=lambda: setattr(native, 'static_dirty', True)), **case)
+            window.graph.static_dirty = True
+            record('canvas_draw', timed(window.graph.canvas.draw, repeat), **case)
+
+    # CSV writes: flushes of CSV_BATCH_ROWS rows through both loggers, from this thread
+    _, times, columns = window.data.last(CSV_BATCH_ROWS)
+    batch = [[i, t, *values] for i, t, values in zip(range(CSV_BATCH_ROWS), times.astype(object), zip(*columns.values()))]
+    for name, logger_class in (('csv_flush', CsvLogger), ('segmented_csv_flush', SegmentedCsvLogger)):
+        logger = logger_class(os.path.join(workdir, f'{name}.csv'), window.headers, batch_rows=10 ** 9, max_age=3600, fsync_interval=None)
+
+        def fill():
+            for row in batch:
+                logger.log(row)
+        record(name, timed(logger.flush, repeat, setup=fill), batch_rows=CSV_BATCH_ROWS)
+        logger.close()
+
+    native.close()
+    window.close()
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KiB on Linux
+    return {'rows': rows, 'peak_rss_mb': peak_rss_mb, 'results': results}
+
+
+def metadata() -> dict:
+    import matplotlib
+    from PyQt5.QtCore import QT_VERSION_STR
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'qt': QT_VERSION_STR,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """
+    Return (case key, baseline median, new median) for every case that got
+    more than `tolerance` times slower than in the baseline file.
+    """
+    def medians(document):
+        return {
+            (case['metric'], case['rows'], case.get('series'), case.get('window')): case['median_ms']
+            for size in document['sizes'] for case in size['results']
+        }
+    with open(baseline_path) as file:
+        old = medians(json.load(file))
+    new = medians(results)
+    return [(key, old[key], new[key]) for key in new if key in old and new[key] > old[key] * tolerance]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless benchmark of the S.O.W GUI hot paths.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='History sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per case')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='Previous result file; exits with 1 when a case regressed')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Slowdown factor that counts as a regression')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        json.dump(run_size(args.child, args.repeat), sys.stdout)
+        return 0
+
+    sizes = []
+    for rows in args.rows:
+        print(f"Benchmarking {rows} rows...", file=sys.stderr)
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_gui', '--child', str(rows), '--repeat', str(args.repeat)],
+                               cwd=ROOT, capture_output=True, text=True)
+        if child.returncode:
+            print(child.stderr, file=sys.stderr)
+            return child.returncode
+        size = json.loads(child.stdout)
+        sizes.append(size)
+        print(f"  peak RSS {size['peak_rss_mb']:.0f} MB", file=sys.stderr)
+        for case in size['results']:
+            label = ' '.join(f"{key}={case[key]}" for key in ('series', 'window', 'batch_rows') if key in case)
+            print(f"  {case['metric']:<22} {label:<22} median {case['median_ms']:8.2f} ms  p95 {case['p95_ms']:8.2f} ms", file=sys.stderr)
+
+    results = {'meta': metadata(), 'sizes': sizes}
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for (metric, rows, series, window), old, new in regressions:
+            print(f"Regression: {metric} rows={rows} series={series} window={window}: {old:.2f} -> {new:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
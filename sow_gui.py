@@ -1,70 +1,112 @@
+import os
 import sys
-import csv
-import random
-import matplotlib
-matplotlib.use('Qt5Agg')  # Set the backend to Qt5Agg
-
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QDoubleSpinBox, QGroupBox, QSplitter, QCheckBox, QComboBox, QMainWindow, QMessageBox, QDesktopWidget
-from PyQt5.QtCore import Qt, QTimer, QTime, QDateTime
-from PyQt5.QtGui import QFont, QPixmap
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.ticker import MaxNLocator
+import json
+import time
+STARTED = time.perf_counter()  # Start-up timings are measured from the start of the imports
+import numpy as np
+import argparse
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QDoubleSpinBox, QGroupBox, QSplitter, QCheckBox, QComboBox, QMainWindow, QMessageBox, QDesktopWidget, QScrollArea
+from PyQt5.QtCore import Qt, QEvent, QTimer, QTime, QObject, pyqtSignal
+from PyQt5.QtGui import QFont
 from datetime import datetime, timedelta
+from utils.store import TimeSeriesStore
+from utils.decimate import MinMaxDecimator
+from utils.rollup import RollupEngine
+from utils.gpio import GPIOSession, MockGPIO
+from utils.actuator import ActuatorWorker
+from utils.acquisition import AcquisitionEngine, RandomWalkDriver, HEADERS, INITIAL_VALUES
+from utils.segments import SegmentedCsvLogger, segment_name, read_segments_tail
+from utils.binlog import BinaryLogger, BinaryLog
+from utils.ingest import find_latest_log
+from utils.replay import ReplaySource
+from utils import perf
+from utils.widgets import WidgetBinder, load_pixmap
+from utils.qtgraph import PainterGraph
+from utils.stats import StreamingStats
+from utils.alarms import AlarmEngine, AlarmRule, DEFAULT_RULES
+from utils.service import ServiceClient, RemoteDriver, RemoteActuators, RemoteController, RemoteAlarms, SOCKET_PATH
+from utils.shm import SharedRingWriter
+from utils.control import Controller, ControlLoop, PlantDriver, DEFAULT_LOOPS
+from utils.simulator import FleetSimulator, FleetSource, FaultConfig
+from utils.fleet import FleetIngest, FleetUnitClient, ServiceFleetSource, simulated_fleet
+IMPORTED = time.perf_counter()
 
-CONNECT_LED = False  # True
-if CONNECT_LED:
-    from utils.gpio import blink_led
-else:
-    # Dummy function to represent blink_led functionality
-    def blink_led(pin):
-        print(f"Blinking LED on pin {pin}")
+DATA_CAPACITY = 24 * 60 * 60 // 5  # One day of samples at the 5 s update rate
+SAMPLE_RATE_HZ = 0.2  # Sensor sample rate of the acquisition thread (every 5 seconds)
+GUI_REFRESH_MS = 200  # How often the GUI drains new samples from the acquisition thread
+LOG_BATCH_ROWS = 50  # Rows queued before the logger writes a batch
+LOG_MAX_AGE_S = 5.0  # Longest time a row waits in the logger queue
+LOG_FSYNC_INTERVAL_S = 30  # fsync at most this often; 0 fsyncs every batch, None never
+LOG_FORMAT = 'csv'  # 'csv' or 'binary' (fixed-width records, see utils/binlog.py)
+LOG_BINARY_DTYPE = 'float32'  # Value type of the binary log
+LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # Start a new CSV segment once the current one reaches this size
+LOG_SEGMENT_MAX_AGE = timedelta(days=1)  # ... or spans this much time
+LOG_INDEX_EVERY = 100  # Rows between entries of the sparse time index next to each segment
+LOG_COMPRESS_SEGMENTS = False  # gzip closed segments
+RESUME_LAST_LOG = True  # Continue the newest sow_data_* log in the working directory instead of starting a new one
+LOG_FILE = None  # Log file to continue; None picks the newest sow_data_* file
+REPLAY_FILE = None  # Recorded sow_data_* log to play back instead of the simulated sensors (also --replay)
+REPLAY_SPEED = 1.0  # Playback speed of a replay; None plays as fast as possible (also --speed 1/10/100/max)
+REPLAY_OUTPUT_DIR = 'replay'  # Log and rollups written during a replay go here, away from the live logs
+REPLAY_REPORT_MS = 5000  # How often the achieved replay (or simulation) rate is printed
+SIMULATE_RATE_HZ = None  # Drive the GUI from the vectorized simulator (utils/simulator.py) at this many samples per second instead of the sensors (also --simulate HZ)
+SIMULATE_SEED = None  # The same seed replays the same readings and faults
+SIMULATE_FAULTS = FaultConfig(dropout=1e-4, stuck=1e-4, spike=1e-3)  # Fault injection rates of the simulator, per reading
+SIMULATE_OUTPUT_DIR = 'simulated'  # Log and rollups written during a simulation go here, away from the live logs
+FLEET_UNITS = None  # Show a summary grid of this many simulated units instead of one machine (also --fleet N; the rate is --simulate or SAMPLE_RATE_HZ)
+FLEET_SOCKETS = []  # Show a summary grid of the units whose acquisition services listen on these sockets (also --fleet-attach SOCKET...)
+FLEET_CAPACITY = 720  # Samples kept in memory per unit in fleet mode (one hour at 0.2 Hz); a drill-down window restores from it
+FLEET_OUTPUT_DIR = 'fleet'  # One log directory per unit under this directory
+FLEET_REFRESH_MS = 1000  # How often the grid picks up the units that changed
+FLEET_COLUMNS = 6  # Tiles per grid row
+FLEET_TILE_CHANNELS = {'dissolved oxygen concentration': 'D.O.', 'pressure': 'P', 'flow rate': 'Flow', 'pump speed': 'Pump', 'lower tank temp': 'Lower', 'C-box': 'C-box'}
+FLEET_STATUS_COLORS = {'ok': 'green', 'alarm': 'red', 'stale': 'gray'}
+STALE_AFTER_FACTOR = 3  # A unit is stale after missing this many sample periods
+SERVICE_SOCKET = None  # Attach to the acquisition service (python3 -m utils.service) on this Unix socket instead of sampling locally (also --attach)
+GRAPH_BACKEND = 'native'  # 'native' QPainter graph (utils/qtgraph.py) or 'matplotlib' (also --graph)
+GRAPH_BLIT = True  # Incremental blitted rendering; False redraws the whole figure every tick
+GRAPH_HEADROOM = 0.1  # Fraction of the x/y range kept free so most ticks only need a blit
+DRAW_TIME_SAMPLES = 100  # Number of recent update_plot timings kept for draw_stats
+GRAPH_MAX_FPS = 5  # Render requests are coalesced into at most this many graph redraws per second
+STARTUP_MODE = 'warmup'  # Graph construction: 'eager' before the first paint, 'warmup' right after it, 'lazy' when the real-time view is first shown (also --startup)
+GRAPH_WARMUP_MS = 500  # Delay between the first paint and building the graph in 'warmup' mode
+STARTUP_LOG = 'sow_startup.jsonl'  # Import, first paint and first sample times of every start are appended here; None disables it
+LOGO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sow_machine.jpg')
+ASSET_CACHE_DIR = os.path.expanduser('~/.cache/sow')  # Decoded, scaled images are kept here between runs; None disables the disk cache
+PERF_ENABLED = False  # Collect hot-path timings from the start; otherwise only while the performance panel is open
+PERF_REFRESH_MS = 1000  # Refresh interval of the performance panel
+PERF_EXPORT_PATH = 'sow_perf.jsonl'  # Timing summaries are appended here while collecting; None disables the export
+PERF_EXPORT_S = 60  # Seconds between exports
 
-class TimeSeriesGraph(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.initUI()
+CONNECT_LED = False  # True drives the real GPIO pins, False uses the mock backend
+ALARM_LOG_FILE = 'sow_alarms.csv'  # Alarm event log, next to the data log
+SHM_NAME = 'sow_live'  # Live samples are published to this shared memory ring for other local processes (utils/shm.py); None disables it
+SHM_CAPACITY = 4096  # Samples kept in the shared memory ring
+ALARM_RULES = DEFAULT_RULES  # Checked on the acquisition thread for every sample, see utils/alarms.py
+CONTROL_ENABLED = True  # Hold the Manual Control values as setpoints with the PID loops of utils/control.py; without CONNECT_LED they act on a simulated plant
+CONTROL_RATE_HZ = 10  # Rate of the control loop thread
+CONTROL_LOOPS = DEFAULT_LOOPS  # Controlled channels, output pins and gains
 
-    def initUI(self):
-        self.figure, self.ax = plt.subplots()
-        self.canvas = FigureCanvas(self.figure)
-        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        self.xlim_duration = timedelta(minutes=10)  # Default xlim duration
-        self.ax.set_xlim(datetime.now(), datetime.now() + self.xlim_duration)
-        self.times = []
-        self.data = {}
-        self.lines = {}
-        self.ax.legend(loc='upper left')
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
-        self.setLayout(layout)
-
-    def update_plot(self, times, data, units, multipliers):
-        if not times:
-            return  # Return if there are no times to plot
-        self.ax.clear()
-        self.times = times
-        for label, values in data.items():
-            unit = units.get(label, '')
-            multiplier = multipliers.get(label, 1)
-            self.ax.plot(self.times, [v * multiplier for v in values], label=f'{label} (x{multiplier} {unit})')
-        self.ax.set_xlim(self.times[-1] - self.xlim_duration, self.times[-1])
-        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        self.ax.xaxis.set_major_locator(MaxNLocator(nbins=5))
-        self.ax.legend(loc='upper left')
-        self.canvas.draw()
-
-    def set_xlim_duration(self, duration):
-        self.xlim_duration = duration
-        if self.times:
-            self.ax.set_xlim(self.times[-1] - self.xlim_duration, self.times[-1])
-            self.canvas.draw()
+class ActuatorSignals(QObject):
+    # Emitted from the actuator worker thread, delivered on the GUI thread
+    completed = pyqtSignal(str, float)
+    failed = pyqtSignal(str, str)
+
+class AlarmSignals(QObject):
+    # Emitted from the acquisition thread, delivered on the GUI thread
+    event = pyqtSignal(object)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, replay_file=REPLAY_FILE, replay_speed=REPLAY_SPEED, graph_backend=GRAPH_BACKEND, service_socket=SERVICE_SOCKET, startup_mode=STARTUP_MODE,
+                 simulate_rate=SIMULATE_RATE_HZ, client=None, shm_name=SHM_NAME):
         super().__init__()
-        self.headers = ["idx", "datetime", "dissolved oxygen concentration", "pressure", "flow rate", "pump speed", "Upper tank temp", "lower tank temp", "C-box", "External temp"]
+        self.graph_backend = graph_backend
+        self.startup_mode = startup_mode
+        self.startup = {'imports': round(IMPORTED - STARTED, 3)}  # Seconds from STARTED to each start-up step
+        interpreter = perf.process_age()
+        if interpreter is not None:
+            self.startup['interpreter'] = round(max(0.0, interpreter - (time.perf_counter() - STARTED)), 3)  # Before the imports
+        self.headers = list(HEADERS)
         self.units = {
             "dissolved oxygen concentration": "ppm",
             "pressure": "atm",
@@ -85,18 +127,70 @@ class MainWindow(QMainWindow):
             "C-box": 1,
             "External temp": 1
         }
-        self.data = []
-        self.buffer = []
+        self.data = TimeSeriesStore(self.headers[2:], capacity=DATA_CAPACITY)
+        self.decimator = MinMaxDecimator()  # Reduces the visible window to ~2 points per pixel
+        self.logger = None
         self.start_time = datetime.now()
         self.csv_filename = f"sow_data_{self.start_time.strftime('%Y%m%d_%H%M%S')}.csv"
-        self.o2 = 250
-        self.pressure = 25
-        self.flow_rate = 2
-        self.pump_speed = 1.0
-        self.upper_temp = 4
-        self.lower_temp = 5
-        self.cbox_temp = self.lower_temp + 4
-        self.external_temp = 25  # Static value for external temperature
+        previous_log = LOG_FILE or (find_latest_log('.', 'sowlog' if LOG_FORMAT == 'binary' else 'csv') if RESUME_LAST_LOG else None)
+        if replay_file or simulate_rate:
+            output_dir = REPLAY_OUTPUT_DIR if replay_file else SIMULATE_OUTPUT_DIR
+            os.makedirs(output_dir, exist_ok=True)
+            self.csv_filename = os.path.join(output_dir, segment_name(self.start_time))
+            # Rollups per run: a replay of older data must not append to the buckets of a later run
+            run_name = os.path.basename(replay_file).split('.')[0] if replay_file else 'simulated'
+            rollup_prefix = os.path.join(output_dir, f"{run_name}_{self.start_time.strftime('%Y%m%d_%H%M%S')}")
+        elif previous_log:
+            self.csv_filename = os.path.splitext(previous_log)[0] + '.csv'
+        self.restore_stats = {'rows': 0, 'seconds': 0.0}
+        self.client = client or (ServiceClient(service_socket) if service_socket else None)  # The service (or the fleet) samples, logs and drives the actuators
+        self.binary_filename = os.path.splitext(self.csv_filename)[0] + '.sowlog'
+        if self.client:
+            rollup_prefix = None  # The service persists its own
+        elif not (replay_file or simulate_rate):
+            rollup_prefix = os.path.join(os.path.dirname(self.csv_filename), 'sow_data')
+        self.rollups = RollupEngine(self.headers[2:], rollup_prefix)  # 1-min / 1-hour aggregates next to the log segments
+        self.rollup_decimator = MinMaxDecimator()
+        self.channel_stats = StreamingStats(self.headers[2:])  # Rolling mean/std/min/max/EWMA per channel over the x-axis scale windows
+        self.stat_names = {
+            "dissolved oxygen concentration": "D.O.",
+            "pressure": "P",
+            "flow rate": "Flow",
+            "pump speed": "Pump",
+            "Upper tank temp": "Upper",
+            "lower tank temp": "Lower",
+            "C-box": "C-box",
+            "External temp": "Ext"
+        }
+        initial_values = dict(INITIAL_VALUES)
+        self.driver = RandomWalkDriver(initial_values)
+        self.controller = None
+        if CONTROL_ENABLED and not self.client and not replay_file and not simulate_rate:
+            loops = [ControlLoop(**loop) for loop in CONTROL_LOOPS]
+            backend = None if CONNECT_LED else MockGPIO()
+            if backend:
+                self.driver = PlantDriver(initial_values, backend, loops)  # Responds to the PWM outputs of the loops
+            if self.driver.simulated and not backend:
+                print("Closed-loop control disabled: the sensor readings are simulated, the loops would drive the real outputs blindly.")
+            else:
+                self.controller = Controller(self.driver, loops, GPIOSession(backend), CONTROL_RATE_HZ)
+        if self.client:
+            self.driver = RemoteDriver(self.client)  # Manual setpoints go to the service
+            self.acquisition = self.client
+            if CONTROL_ENABLED and self.client.control:
+                self.controller = RemoteController(self.client)  # The service runs the loops, also while no GUI is attached
+        elif replay_file:
+            self.acquisition = ReplaySource(replay_file, replay_speed)  # Recorded samples take the place of the simulated ones
+        elif simulate_rate:
+            self.simulator = FleetSimulator(1, initial_values, drift=0.01, faults=SIMULATE_FAULTS, seed=SIMULATE_SEED)
+            self.driver = self.simulator.driver(0)
+            self.acquisition = FleetSource(self.simulator, simulate_rate)
+        else:
+            self.acquisition = AcquisitionEngine(self.driver, self.headers[2:], rate=SAMPLE_RATE_HZ)
+        self.samples = self.acquisition.subscribe()
+        self.sample_period = 1 / (simulate_rate or SAMPLE_RATE_HZ)
+        self.replay_rows = 0  # Rows taken in by update_data since the last replay report
+        self.replay_update_time = 0.0
         self.graph_data = {
             'Temperature': ['Upper tank temp', 'lower tank temp', 'C-box', 'External temp'],
             'Pressure': ['pressure'],
@@ -111,15 +205,64 @@ class MainWindow(QMainWindow):
         }
         self.output_labels = {}  # Dictionary to map buttons to their corresponding output labels
         self.connect_led = True  # Example flag to simulate LED connection
+        self.binder = WidgetBinder()  # Only touches a label when its text or color changes
+        self.graph_dirty = False  # New data or settings that the graph does not show yet
+        self.last_render = 0.0
+        self.render_stats = {'requests': 0, 'renders': 0, 'hidden': 0}
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.timeout.connect(self.render_graph)
+        self.actuator_signals = ActuatorSignals()
+        self.actuator_signals.completed.connect(self.on_actuator_completed)
+        self.actuator_signals.failed.connect(self.on_actuator_failed)
+        on_done = lambda command, latency: self.actuator_signals.completed.emit(command.name, latency)
+        on_failed = lambda command, message: self.actuator_signals.failed.emit(command.name, message)
+        if self.client:
+            self.actuators = RemoteActuators(self.client, on_done, on_failed)
+        else:
+            self.actuators = ActuatorWorker(GPIOSession(None if CONNECT_LED else MockGPIO()), on_done, on_failed)
+        self.alarm_signals = AlarmSignals()
+        self.alarm_signals.event.connect(self.on_alarm)
+        if self.client:
+            self.alarms = RemoteAlarms(self.client)  # The service checks the rules and keeps the alarm log
+        else:
+            self.alarms = AlarmEngine(self.headers[2:], [AlarmRule(**rule) for rule in ALARM_RULES],
+                                      None if replay_file or simulate_rate else self.actuators,  # A replay must not switch the real pumps
+                                      log_path=os.path.join(os.path.dirname(self.csv_filename), ALARM_LOG_FILE))
+            self.acquisition.add_listener(self.alarms.check)
+        self.alarms.listeners.append(self.alarm_signals.event.emit)
+        self.shared_ring = None
+        if shm_name and not (replay_file or simulate_rate or self.client):  # Only live samples acquired here; the service publishes its own with --shm
+            try:
+                self.shared_ring = SharedRingWriter(shm_name, self.headers, SHM_CAPACITY)
+                self.acquisition.add_listener(self.shared_ring.publish)  # Readers see each sample as soon as it is acquired
+            except Exception as e:
+                print(f"Error publishing the live samples to shared memory: {e}")
         self.initUI()
+        self.show_alarms()  # An attached GUI starts with the service's active alarms
+        if self.startup_mode == 'eager':
+            self.build_graph()
         self.create_csv_file()
         self.read_csv_file()  # Initialize the GUI with data from the CSV file
+        last_row = self.data.last_row()
+        if last_row and not self.client:
+            for name, value in zip(self.headers[2:], last_row[2:]):
+                self.driver.set_value(name, value)  # Continue the readings where the previous run stopped
+        self.acquisition.start(next_idx=last_row[0] + 1 if last_row else 1)
+        if self.controller:
+            if self.client:
+                self.show_setpoints()  # Keep the service's setpoints
+            else:
+                self.update_setpoints()
+            self.controller.start()
         self.data_timer = QTimer()
         self.data_timer.timeout.connect(self.update_data)
-        self.data_timer.start(5000)  # Update data every 5 seconds
-        self.save_timer = QTimer()
-        self.save_timer.timeout.connect(self.save_last_buffer_to_csv)
-        self.save_timer.start(30000)  # Save data every 30 seconds
+        self.data_timer.start(GUI_REFRESH_MS)  # Pick up new samples from the acquisition thread
+        if replay_file or simulate_rate:
+            self.replay_timer = QTimer()
+            self.replay_timer.timeout.connect(self.report_replay if replay_file else self.report_simulation)
+            self.replay_timer.start(REPLAY_REPORT_MS)
+        self.mark_startup('window')
 
     def initUI(self):
         self.setWindowTitle('S.O.W Machine v1')
@@ -284,8 +427,8 @@ class MainWindow(QMainWindow):
         buttonLayout.addWidget(self.pump_speed_button)
         self.realtimeLayout.addLayout(buttonLayout)
 
-        self.graph = TimeSeriesGraph()
-        self.realtimeLayout.addWidget(self.graph)
+        self.graph = None  # Built by build_graph, see STARTUP_MODE
+        self.graph_slot = self.realtimeLayout.count()
 
         sliderLayout = QHBoxLayout()
         self.slider_label = QLabel("X-axis scale", self)
@@ -293,7 +436,7 @@ class MainWindow(QMainWindow):
         self.slider_label.setFixedHeight(21)  # Reduced height to 70%
         sliderLayout.addWidget(self.slider_label, alignment=Qt.AlignRight)
         self.xlim_combo = QComboBox()
-        self.xlim_combo.addItems(["1 min", "3 min", "10 min", "30 min", "1 hour", "1 day"])
+        self.xlim_combo.addItems(["1 min", "3 min", "10 min", "30 min", "1 hour", "1 day", "1 week"])
         self.xlim_combo.setFont(font)
         self.xlim_combo.setFixedHeight(21)  # Reduced height to 70%
         self.xlim_combo.setCurrentIndex(2)  # Set default to "10 min"
@@ -406,6 +549,12 @@ class MainWindow(QMainWindow):
         self.pump_speed_value.setFont(font)
         self.pump_speed_value.setFixedHeight(21)  # Reduced height to 70%
         self.outputLayout.addWidget(self.pump_speed_value, 6, 1)
+        self.stats_labels = []  # Two rows of rolling averages, four channels each
+        for row in (7, 8):
+            label = QLabel()
+            label.setFont(QFont("Arial", 7))
+            self.outputLayout.addWidget(label, row, 0, 1, 4)
+            self.stats_labels.append(label)
         self.outputGroup.setLayout(self.outputLayout)
         rightLayout.addWidget(self.outputGroup)
         
@@ -420,10 +569,10 @@ class MainWindow(QMainWindow):
         self.current_time_label = QLabel()
         self.current_time_label.setFont(font)
         self.current_time_label.setFixedHeight(21)  # Reduced height to 70%
+        self.clock_timer = QTimer(self)
+        self.clock_timer.setSingleShot(True)  # Re-armed for the next full second by update_time
+        self.clock_timer.timeout.connect(self.update_time)
         self.update_time()
-        timer = QTimer(self)
-        timer.timeout.connect(self.update_time)
-        timer.start(1000)
         sideLayout.addWidget(self.current_time_label, 0, 1)
         external_temp_text = QLabel('External Temperature (°C):')
         external_temp_text.setFont(font)
@@ -438,10 +587,30 @@ class MainWindow(QMainWindow):
         logo_label.setFixedHeight(21)  # Reduced height to 70%
         sideLayout.addWidget(logo_label, 2, 0, 1, 2)
         logo_pixmap = QLabel()
-        logo_pixmap.setPixmap(QPixmap('sow_machine.jpg').scaled(100, 100, Qt.KeepAspectRatio))
+        logo_pixmap.setPixmap(load_pixmap(LOGO_FILE, 100, 100, ASSET_CACHE_DIR))  # Scaled copy cached, the full-size JPEG is only decoded once
         logo_pixmap.setAlignment(Qt.AlignCenter)
         logo_pixmap.setFixedHeight(21)  # Reduced height to 70%
         sideLayout.addWidget(logo_pixmap, 3, 0, 1, 2)
+        self.perf_button = QPushButton('Performance')
+        self.perf_button.setFont(font)
+        self.perf_button.setCheckable(True)
+        self.perf_button.setFixedHeight(21)  # Reduced height to 70%
+        self.perf_button.toggled.connect(self.toggle_perf_panel)
+        sideLayout.addWidget(self.perf_button, 4, 0, 1, 2)
+        self.perf_label = QLabel()
+        self.perf_label.setFont(QFont("Monospace", 7))
+        self.perf_label.setVisible(False)
+        sideLayout.addWidget(self.perf_label, 5, 0, 1, 2)
+        self.alarm_label = QLabel('No alarms')
+        self.alarm_label.setFont(font)
+        self.alarm_label.setFixedHeight(21)  # Reduced height to 70%
+        sideLayout.addWidget(self.alarm_label, 6, 0, 1, 2)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.update_perf_panel)
+        self.last_perf_export = time.monotonic()
+        if PERF_ENABLED:
+            perf.monitor.enabled = True
+            self.perf_timer.start(PERF_REFRESH_MS)
         sideGroup.setLayout(sideLayout)
         rightLayout.addWidget(sideGroup)
         
@@ -459,127 +628,288 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
 
     def create_csv_file(self):
+        if self.client:
+            return  # The service writes the log
         try:
-            with open(self.csv_filename, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(self.headers)
+            if LOG_FORMAT == 'binary':
+                self.logger = BinaryLogger(self.binary_filename, self.headers, value_dtype=LOG_BINARY_DTYPE, batch_rows=LOG_BATCH_ROWS, max_age=LOG_MAX_AGE_S, fsync_interval=LOG_FSYNC_INTERVAL_S)
+                return
+            # The logger writes the header to a new file and appends to a resumed one
+            self.logger = SegmentedCsvLogger(self.csv_filename, self.headers, max_segment_bytes=LOG_SEGMENT_MAX_BYTES, max_segment_age=LOG_SEGMENT_MAX_AGE,
+                                             index_every=LOG_INDEX_EVERY, compress=LOG_COMPRESS_SEGMENTS,
+                                             batch_rows=LOG_BATCH_ROWS, max_age=LOG_MAX_AGE_S, fsync_interval=LOG_FSYNC_INTERVAL_S)
         except Exception as e:
             print(f"Error creating CSV file: {e}")
 
+    def read_binary_log(self):
+        start = time.perf_counter()
+        log = BinaryLog(self.binary_filename)
+        records = log.records[-self.data.capacity:]  # Only the tail that fits in memory
+        self.data.clear()
+        self.decimator.reset()
+        values = np.column_stack([records[name] for name in self.headers[2:]]) if len(records) else np.empty((0, len(self.headers) - 2))
+        values = values.astype(np.float64).round(3)  # Readings have 3 decimals; drop the float32 noise
+        self.data.extend(records['idx'], records['time_us'].view('datetime64[us]'), values)
+        self.channel_stats.load(records['time_us'].view('datetime64[us]'), values)
+        self.restore_stats = {'rows': len(records), 'seconds': time.perf_counter() - start}
+        self.update_output_group()
+        self.request_render()
+
+    def read_snapshot(self):
+        # History sent by the service when the client connected
+        start = time.perf_counter()
+        if self.client.headers != self.headers:
+            print(f"Unexpected columns from the service on {self.client.socket_path}, starting with an empty dataset.")
+            return
+        self.data.clear()
+        self.decimator.reset()
+        self.data.extend(self.client.idx, self.client.times, self.client.values)
+        self.channel_stats.load(self.client.times, self.client.values)
+        self.restore_stats = {'rows': len(self.client.idx), 'seconds': time.perf_counter() - start}
+        self.update_output_group()
+        self.request_render()
+
     def read_csv_file(self):
+        if self.client:
+            self.read_snapshot()
+            return
+        if LOG_FORMAT == 'binary':
+            self.read_binary_log()
+            return
         try:
-            with open(self.csv_filename, 'r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip the header
-                self.data = [row for row in reader]
-                for row in self.data:
-                    row[1] = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S.%f')  # Parse datetime strings
-                    for i in range(2, len(row)):
-                        row[i] = float(row[i])  # Convert the remaining fields to float
+            start = time.perf_counter()
+            headers, idx, times, values = read_segments_tail(self.csv_filename, self.data.capacity)  # Only the tail that fits in memory, across rotated segments
+            if headers != self.headers:
+                print(f"Unexpected columns in {self.csv_filename}, starting with an empty dataset.")
+                return
+            self.data.clear()
+            self.decimator.reset()
+            self.data.extend(idx, times, values)
+            self.channel_stats.load(times, values)
+            self.restore_stats = {'rows': len(idx), 'seconds': time.perf_counter() - start}
             self.update_output_group()
-            self.update_graphs()
+            self.request_render()
         except FileNotFoundError:
             print("CSV file not found, starting with an empty dataset.")
         except Exception as e:
             print(f"Error reading CSV file: {e}")
 
+    @perf.timed('update_data', period=GUI_REFRESH_MS / 1000)
     def update_data(self):
-        current_time = datetime.now()
-        idx = len(self.data) + 1
-        self.o2 = self.get_new_value(self.o2, 50, 400, 5)
-        self.pressure = self.get_new_value(self.pressure, 23, 27, 0.1)
-        self.flow_rate = self.get_new_value(self.flow_rate, 1.5, 2.5, 0.1)
-        self.pump_speed = self.get_new_value(self.pump_speed, 0, 2, 0.2)
-        self.upper_temp = self.get_new_value(self.upper_temp, 1, 10, 0.02)
-        self.lower_temp = self.get_new_value(self.lower_temp, 1, 10, 0.02)
-        self.cbox_temp = round(self.lower_temp + 4, 3)
-        row = [idx, current_time, self.o2, self.pressure, self.flow_rate, self.pump_speed, self.upper_temp, self.lower_temp, self.cbox_temp, self.external_temp]
-        self.data.append(row)
-        self.buffer.append(row)
-        self.update_graphs()
+        if perf.monitor.enabled:
+            perf.monitor.interval('GUI tick', GUI_REFRESH_MS / 1000, time.monotonic())
+        batch = self.samples.drain()
+        if not batch:
+            return
+        if 'first_sample' not in self.startup:
+            self.mark_startup('first_sample')
+        start = time.perf_counter()
+        for idx, current_time, values in batch:
+            if perf.monitor.enabled:
+                perf.monitor.interval('sample', self.sample_period, current_time.timestamp())  # Drift against the sample period
+            self.data.append(idx, current_time, values)
+            if self.logger:
+                self.logger.log([idx, current_time] + values)
+            self.rollups.add(current_time, values)
+            self.channel_stats.add(current_time, values)
+        self.request_render()
         self.update_output_group()
+        self.replay_rows += len(batch)
+        self.replay_update_time += time.perf_counter() - start
 
-    def get_new_value(self, current_value, min_value, max_value, max_change_rate):
-        change = random.uniform(-max_change_rate, max_change_rate)
-        new_value = current_value + change
-        return round(max(min(new_value, max_value), min_value), 3)
+    def update_setpoints(self):
+        self.controller.set_setpoint('pump speed', self.pump_speed_spinbox.value())
+        self.controller.set_setpoint('lower tank temp', self.lower_temp_spinbox.value())
+        self.controller.set_setpoint('pressure', self.pressure_spinbox.value())
+        self.controller.set_setpoint('flow rate', self.flow_spinbox.value())
+
+    def show_setpoints(self):
+        setpoints = self.controller.setpoints
+        for channel, spinbox in (('pump speed', self.pump_speed_spinbox), ('lower tank temp', self.lower_temp_spinbox),
+                                 ('pressure', self.pressure_spinbox), ('flow rate', self.flow_spinbox)):
+            if channel in setpoints:
+                spinbox.setValue(setpoints[channel])
 
     def update_pump_speed_temp_pressure(self):
+        if self.controller:
+            self.update_setpoints()  # The loops move the readings there, the next samples show it
+            return
         self.pump_speed = self.pump_speed_spinbox.value()
         self.lower_temp = self.lower_temp_spinbox.value()
         self.pressure = self.pressure_spinbox.value()
         self.cbox_temp = round(self.lower_temp + 4, 3)
-        self.pump_speed_value.setText(str(self.pump_speed))
-        self.lower_temp_value.setText(str(self.lower_temp))
-        self.pressure_value.setText(str(self.pressure))
-        self.cbox_value.setText(str(self.cbox_temp))
-        if self.data:
-            self.data[-1][5] = self.pump_speed
-            self.data[-1][7] = self.lower_temp
-            self.data[-1][3] = self.pressure
-            self.data[-1][8] = self.cbox_temp
-        self.update_graphs()
+        self.driver.set_value('pump speed', self.pump_speed)
+        self.driver.set_value('lower tank temp', self.lower_temp)
+        self.driver.set_value('pressure', self.pressure)
+        self.binder.set_value(self.pump_speed_value, self.pump_speed)
+        self.binder.set_value(self.lower_temp_value, self.lower_temp)
+        self.binder.set_value(self.pressure_value, self.pressure)
+        self.binder.set_value(self.cbox_value, self.cbox_temp)
+        self.data.update_last('pump speed', self.pump_speed)
+        self.data.update_last('lower tank temp', self.lower_temp)
+        self.data.update_last('pressure', self.pressure)
+        self.data.update_last('C-box', self.cbox_temp)
+        self.request_render()
         self.update_output_group()
 
     def update_flow_rate(self):
+        if self.controller:
+            self.update_setpoints()
+            return
         self.flow_rate = self.flow_spinbox.value()
-        self.flow_value.setText(str(self.flow_rate))
-        if self.data:
-            self.data[-1][4] = self.flow_rate
-        self.update_graphs()
+        self.driver.set_value('flow rate', self.flow_rate)
+        self.binder.set_value(self.flow_value, self.flow_rate)
+        self.data.update_last('flow rate', self.flow_rate)
+        self.request_render()
         self.update_output_group()
 
-    def save_last_buffer_to_csv(self):
-        if not self.buffer:
-            return
-        try:
-            with open(self.csv_filename, 'a', newline='') as file:
-                writer = csv.writer(file)
-                last_row = self.buffer[-1]
-                writer.writerow([last_row[0], last_row[1].strftime('%Y-%m-%d %H:%M:%S.%f')] + last_row[2:])
-            self.buffer.clear()
-        except Exception as e:
-            print(f"Error saving to CSV file: {e}")
-
+    @perf.timed('update_output_group')
     def update_output_group(self):
         if self.data:
-            latest_data = self.data[-1]
-            self.o2_value.setText(str(latest_data[2]))
-            self.pressure_value.setText(str(latest_data[3]))
-            self.flow_value.setText(str(latest_data[4]))
-            self.pump_speed_value.setText(str(latest_data[5]))
-            self.upper_temp_value.setText(str(latest_data[6]))
-            self.lower_temp_value.setText(str(latest_data[7]))
-            self.cbox_value.setText(str(latest_data[8]))
-            self.external_temp_value.setText(str(latest_data[9]))
+            latest_data = self.data.last_row()
+            self.binder.set_value(self.o2_value, latest_data[2])
+            self.binder.set_value(self.pressure_value, latest_data[3])
+            self.binder.set_value(self.flow_value, latest_data[4])
+            self.binder.set_value(self.pump_speed_value, latest_data[5])
+            self.binder.set_value(self.upper_temp_value, latest_data[6])
+            self.binder.set_value(self.lower_temp_value, latest_data[7])
+            self.binder.set_value(self.cbox_value, latest_data[8])
+            self.binder.set_value(self.external_temp_value, latest_data[9])
+            self.update_stats_output()
         self.update_status_color(self.pump1_status_value, self.pump1_button.isChecked())
         self.update_status_color(self.pump2_status_value, self.pump2_button.isChecked())
         self.update_status_color(self.chiller_status_value, self.chiller_button.isChecked())
 
+    def update_stats_output(self):
+        # Rolling statistics over the window picked in the x-axis scale
+        window = self.xlim_combo.currentText()
+        snapshot = self.channel_stats.snapshot(window)
+        if not snapshot[self.headers[2]]['count']:
+            return
+        value_labels = [self.o2_value, self.pressure_value, self.flow_value, self.pump_speed_value,
+                        self.upper_temp_value, self.lower_temp_value, self.cbox_value, self.external_temp_value]
+        for (name, stats), label in zip(snapshot.items(), value_labels):
+            self.binder.set_tooltip(label, f"Last {window}: mean {stats['mean']:.3f}, std {stats['std']:.3f}, "
+                                           f"min {stats['min']:.3f}, max {stats['max']:.3f}, EWMA {stats['ewma']:.3f}")
+        averages = [f"{self.stat_names[name]} {stats['mean']:.2f}" for name, stats in snapshot.items()]
+        self.binder.set_text(self.stats_labels[0], f"{window} avg:  " + '   '.join(averages[:4]))
+        self.binder.set_text(self.stats_labels[1], '   '.join(averages[4:]))
+
     def update_status_color(self, label, status):
-        if status:
-            label.setText('On')
-            label.setStyleSheet("color: red;")
+        self.binder.set_text(label, 'On' if status else 'Off')
+        self.binder.set_color(label, 'red' if status else 'black')
+
+    def build_graph(self):
+        """
+        Create the graph widget on first use. The graph libraries are only
+        imported here, so the controls and outputs paint without them.
+        """
+        if self.graph is not None:
+            return
+        start = time.perf_counter()
+        if self.graph_backend == 'native':
+            self.graph = PainterGraph(GRAPH_HEADROOM, DRAW_TIME_SAMPLES)
         else:
-            label.setText('Off')
-            label.setStyleSheet("color: black;")
+            from utils.mplgraph import TimeSeriesGraph  # Imports matplotlib
+            self.graph = TimeSeriesGraph(GRAPH_BLIT, GRAPH_HEADROOM, DRAW_TIME_SAMPLES)  # Matplotlib fallback
+        self.realtimeLayout.insertWidget(self.graph_slot, self.graph)
+        self.change_xlim(self.xlim_combo.currentIndex())  # Also renders what arrived before the graph existed
+        self.mark_startup('graph_ready', graph_build=round(time.perf_counter() - start, 3))
+
+    def graph_visible(self):
+        return self.graph is not None and self.graph.isVisible() and not self.isMinimized()
+
+    def request_render(self):
+        """
+        Mark the graph dirty and schedule one redraw, at most GRAPH_MAX_FPS times
+        a second. Requests in between are merged; while the graph is hidden
+        nothing is drawn until it is shown again.
+        """
+        self.graph_dirty = True
+        self.render_stats['requests'] += 1
+        if not self.graph_visible():
+            self.render_stats['hidden'] += 1
+            return
+        if not self.render_timer.isActive():
+            delay = self.last_render + 1 / GRAPH_MAX_FPS - time.monotonic()
+            self.render_timer.start(max(0, int(delay * 1000)))
 
+    def render_graph(self):
+        if not self.graph_dirty or not self.graph_visible():
+            return
+        self.graph_dirty = False
+        self.last_render = time.monotonic()
+        self.render_stats['renders'] += 1
+        self.update_graphs()
+
+    @perf.timed('update_graphs')
     def update_graphs(self):
-        if not self.data:
+        if not self.data or not self.graph:
             return
-        times = [row[1] for row in self.data]
-        data_dict = {}
-        for key, selected in self.selected_buttons.items():
-            if selected:
-                for label in self.graph_data[key]:
-                    data_dict[label] = [row[self.headers.index(label)] for row in self.data]
-        if self.graph:
-            self.graph.update_plot(times, data_dict, self.units, self.multipliers)
+        duration = self.graph.xlim_duration
+        raw_times = self.data.times()
+        end = raw_times[-1]
+        start = end - duration
+        labels = [label for key, selected in self.selected_buttons.items() if selected for label in self.graph_data[key]]
+        earliest_rollup = self.rollups.earliest()
+        rollup = None
+        if start < raw_times[0] and earliest_rollup is not None and earliest_rollup < raw_times[0]:
+            # The window reaches back past the in-memory samples, use the aggregates
+            rollup = self.rollups.query(start, end, min_points=self.graph.plot_width())
+        if rollup:
+            _, times, columns = rollup
+            times = np.repeat(times, 2)
+            data_dict = {label: np.column_stack((columns[f'{label}:min'], columns[f'{label}:max'])).ravel() for label in labels}
+            times, data_dict = self.rollup_decimator.decimate(times, data_dict, duration, self.graph.plot_width())
+        else:
+            _, times, columns = self.data.window(start)
+            data_dict = {label: columns[label] for label in labels}
+            times, data_dict = self.decimator.decimate(times, data_dict, duration, self.graph.plot_width())
+        self.graph.update_plot(times, data_dict, self.units, self.multipliers)
+
+    def toggle_perf_panel(self, checked):
+        self.perf_label.setVisible(checked)
+        if checked and not perf.monitor.enabled:
+            perf.monitor.reset()  # Drop the tick times from before the monitor was paused
+        perf.monitor.enabled = checked or PERF_ENABLED
+        if perf.monitor.enabled:
+            self.perf_timer.start(PERF_REFRESH_MS)
+            self.update_perf_panel()
+        else:
+            self.perf_timer.stop()
+
+    def update_perf_panel(self):
+        if self.perf_label.isVisible():
+            widgets = self.binder.stats()
+            renders = self.render_stats
+            self.binder.set_text(self.perf_label, perf.monitor.format() + f"\nwidgets: {widgets['applied']} applied, {widgets['skipped']} skipped"
+                                 f"\ngraph: {renders['renders']} renders / {renders['requests']} requests, {renders['hidden']} while hidden"
+                                 + self.format_draw_stats()
+                                 + (self.format_control_stats() if self.controller and not self.client else ''))
+        if PERF_EXPORT_PATH and time.monotonic() - self.last_perf_export >= PERF_EXPORT_S:
+            self.last_perf_export = time.monotonic()
+            try:
+                perf.monitor.export(PERF_EXPORT_PATH)
+            except OSError as e:
+                print(f"Error exporting performance stats to {PERF_EXPORT_PATH}: {e}")
+
+    def format_draw_stats(self):
+        stats = self.graph.draw_stats() if self.graph else {}
+        if not stats:
+            return ''
+        return (f"\ndraw ({stats['mode']}): mean {stats['mean_ms']:.1f} max {stats['max_ms']:.1f} last {stats['last_ms']:.1f} ms "
+                f"over {stats['ticks']} ticks, {stats['static_redraws']} static redraws")
+
+    def format_control_stats(self):
+        stats = self.controller.stats()
+        return (f"\ncontrol: {stats['rate_hz']:g} Hz, jitter p50 {stats['jitter_p50_ms']:.1f} p99 {stats['jitter_p99_ms']:.1f} ms, "
+                f"{stats['overruns']} overruns, compute p99 {stats['compute_p99_ms']:.2f} ms")
 
     def update_time(self):
+        now = QTime.currentTime()
         if self.current_time_label:
-            current_time = QTime.currentTime().toString('hh:mm:ss')
-            self.current_time_label.setText(current_time)
+            self.binder.set_text(self.current_time_label, now.toString('hh:mm:ss'))
+        self.clock_timer.start(1000 - now.msec() + 5)  # Fire just after the next second starts, so every tick changes the text
 
     def toggle_manual_mode(self):
         checked = self.auto_manual_button.isChecked()
@@ -598,17 +928,14 @@ class MainWindow(QMainWindow):
         self.toggle_button_color(button)
 
     def toggle_button_color(self, button):
-        if button.isChecked():
-            button.setStyleSheet("color: red;")
-        else:
-            button.setStyleSheet("color: black;")
+        self.binder.set_color(button, 'red' if button.isChecked() else 'black')
         self.update_status_color(self.output_labels.get(button.text(), QLabel()), button.isChecked())
 
     def update_graph_selection(self, state):
         checkbox = self.sender()
         label = checkbox.text()
         self.selected_buttons[label] = state == Qt.Checked
-        self.update_graphs()
+        self.request_render()
 
     def change_xlim(self, index):
         durations = {
@@ -617,16 +944,23 @@ class MainWindow(QMainWindow):
             2: timedelta(minutes=10),
             3: timedelta(minutes=30),
             4: timedelta(hours=1),
-            5: timedelta(days=1)
+            5: timedelta(days=1),
+            6: timedelta(weeks=1)
         }
         if self.graph:
-            self.graph.set_xlim_duration(durations[index])
+            self.graph.set_xlim_duration(durations[index], redraw=False)
+            self.request_render()
+        if self.data:
+            self.update_stats_output()
 
     def toggle_group(self):
         if self.inputGroup.isVisible():
             self.inputGroup.setVisible(False)
             self.realtimeGroup.setVisible(True)
             self.toggleButton.setText('See Input')
+            self.build_graph()
+            if self.graph_dirty:
+                self.request_render()  # Catch up on what arrived while the graph was hidden, in one draw
         else:
             self.inputGroup.setVisible(True)
             self.realtimeGroup.setVisible(False)
@@ -650,22 +984,243 @@ class MainWindow(QMainWindow):
     def toggle_pump1_action(self):
         self.toggle_button_color(self.pump1_button)
         if self.connect_led:
-            blink_led(17)
+            self.actuators.submit('Pump1', 17)
 
     def toggle_pump2_action(self):
         self.toggle_button_color(self.pump2_button)
         if self.connect_led:
-            blink_led(18)
+            self.actuators.submit('Pump2', 18)
             
     def toggle_chiller_action(self):
         self.toggle_button_color(self.chiller_button)
         if self.connect_led:
-            blink_led(27)
+            self.actuators.submit('Chiller S/W', 27)
+
+    def on_actuator_completed(self, name, latency):
+        print(f"{name} actuated in {latency:.1f} s")
+
+    def on_actuator_failed(self, name, message):
+        QMessageBox.warning(self, 'Actuator Error', f'{name} could not be switched: {message}')
+
+    def on_alarm(self, event):
+        print(f"Alarm {event.state}: {event.rule.name} ({event.rule.channel} = {event.value:.3f}) at {event.time:%H:%M:%S}")
+        self.show_alarms()
+
+    def show_alarms(self):
+        active = self.alarms.active_rules()
+        if active:
+            self.binder.set_text(self.alarm_label, 'ALARM: ' + ', '.join(rule.name for rule in active))
+            self.binder.set_color(self.alarm_label, 'red')
+        else:
+            self.binder.set_text(self.alarm_label, 'No alarms')
+            self.binder.set_color(self.alarm_label, 'black')
+
+    def report_first_frame(self):
+        self.mark_startup('first_paint')
+        if self.startup_mode == 'warmup':
+            QTimer.singleShot(GRAPH_WARMUP_MS, self.build_graph)
+
+    def mark_startup(self, step, **extra):
+        if step in self.startup:
+            return
+        self.startup[step] = round(time.perf_counter() - STARTED, 3)
+        self.startup.update(extra)
+        if step in ('first_paint', 'first_sample') and 'first_paint' in self.startup and 'first_sample' in self.startup:
+            self.report_startup()
+        elif step == 'graph_ready' and 'first_paint' in self.startup:
+            print(f"Graph ready {self.startup[step]:.2f} s after start (built in {self.startup['graph_build']:.2f} s)")
+
+    def report_startup(self):
+        steps = ', '.join(f"{step.replace('_', ' ')} {self.startup[step]:.2f} s" for step in ('interpreter', 'imports', 'window', 'graph_ready', 'first_paint', 'first_sample') if step in self.startup)
+        print(f"Startup ({self.startup_mode}, {self.graph_backend} graph): {steps} "
+              f"(restored {self.restore_stats['rows']} rows from {self.client.socket_path if self.client else self.csv_filename} in {self.restore_stats['seconds'] * 1000:.0f} ms)")
+        if STARTUP_LOG:
+            try:
+                with open(STARTUP_LOG, 'a') as file:
+                    file.write(json.dumps({'time': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'), 'mode': self.startup_mode, 'graph': self.graph_backend,
+                                           'restored_rows': self.restore_stats['rows'], **self.startup}) + '\n')
+            except OSError as e:
+                print(f"Error writing the start-up timings to {STARTUP_LOG}: {e}")
+
+    def report_replay(self):
+        # Requested versus achieved replay rate, and whether the GUI and storage path kept up
+        stats = self.acquisition.stats()
+        logger_dropped = self.logger.stats()['rows_dropped'] if self.logger else 0
+        seconds = REPLAY_REPORT_MS / 1000
+        print(f"Replay {stats['speed']:g}x: requested {stats['requested_rows_per_s']:.0f} rows/s, "
+              f"achieved {stats['achieved_rows_per_s']:.0f} rows/s ({stats['achieved_speed']:.1f}x, max lag {stats['max_lag_s']:.2f} s), "
+              f"GUI took {self.replay_rows / seconds:.0f} rows/s using {self.replay_update_time / seconds * 100:.0f}% of the GUI thread, "
+              f"dropped {stats['dropped']} samples / {logger_dropped} log rows"
+              + (", finished" if stats['finished'] else ''))
+        self.replay_rows = 0
+        self.replay_update_time = 0.0
+        if stats['finished'] and not len(self.samples):
+            self.replay_timer.stop()
+
+    def report_simulation(self):
+        # Requested versus achieved simulated rate, and whether the GUI and storage path kept up
+        stats = self.acquisition.stats()
+        logger_dropped = self.logger.stats()['rows_dropped'] if self.logger else 0
+        seconds = REPLAY_REPORT_MS / 1000
+        print(f"Simulation {stats['rate_hz']:g} Hz: achieved {stats['achieved_samples_per_s']:.0f} samples/s ({stats['overruns']} overruns), "
+              f"GUI took {self.replay_rows / seconds:.0f} rows/s using {self.replay_update_time / seconds * 100:.0f}% of the GUI thread, "
+              f"dropped {stats['dropped']} samples / {logger_dropped} log rows, "
+              f"faults {', '.join(f'{name} {count}' for name, count in stats['faults'].items())}")
+        self.replay_rows = 0
+        self.replay_update_time = 0.0
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange and self.graph_dirty and not self.isMinimized():
+            self.request_render()
+        super().changeEvent(event)
+
+    def closeEvent(self, event):
+        self.rollups.flush()  # Persist the partially filled rollup buckets
+        if self.controller:
+            self.controller.stop(timeout=1)  # Switches the control outputs off
+        self.actuators.stop(timeout=1, report_cancelled=False)  # No dialog per cancelled command while the window closes
+        self.acquisition.stop(timeout=1)
+        if self.shared_ring:
+            self.shared_ring.close()
+        self.alarms.close(timeout=1)
+        if self.logger:
+            self.logger.close(timeout=5)  # Write the rows still queued
+        super().closeEvent(event)
+
+class FleetWindow(QMainWindow):
+    """
+    Summary grid of many units. The units share one ingestion thread and one
+    log writer thread (utils/fleet.py); every unit keeps its own bounded store
+    and log directory. Each refresh only touches the tiles of units that
+    received samples or changed status, and the binder skips the ones whose
+    text did not change. Clicking a tile opens the usual Input/Output/graph
+    window for that unit.
+
+    The units are either the acquisition services listening on `sockets`
+    (one ServiceClient each) or `n_units` simulated ones.
+    """
+
+    def __init__(self, n_units, rate, graph_backend=GRAPH_BACKEND, sockets=None):
+        super().__init__()
+        self.graph_backend = graph_backend
+        if sockets:
+            self.source = ServiceFleetSource(sockets, rate)
+            names, drivers = self.source.names, self.source.drivers
+        else:
+            simulator, self.source, names = simulated_fleet(n_units, rate, SIMULATE_FAULTS, SIMULATE_SEED)
+            drivers = [simulator.driver(i) for i in range(n_units)]
+        self.ingest = FleetIngest(self.source, names, FLEET_OUTPUT_DIR, FLEET_CAPACITY, ALARM_RULES, drivers=drivers,
+                                  batch_rows=LOG_BATCH_ROWS, max_age=LOG_MAX_AGE_S, fsync_interval=LOG_FSYNC_INTERVAL_S,
+                                  max_segment_bytes=LOG_SEGMENT_MAX_BYTES, max_segment_age=LOG_SEGMENT_MAX_AGE, index_every=LOG_INDEX_EVERY)
+        if sockets:
+            self.source.restore(self.ingest)  # Start from the history the services hold
+        self.binder = WidgetBinder()
+        self.statuses = [None] * len(names)
+        self.drilldowns = {}  # unit -> MainWindow
+        self.repaints = 0
+        self.initUI(names)
+        self.source.start()
+        self.ingest.start()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(FLEET_REFRESH_MS)
+
+    def initUI(self, names):
+        self.setWindowTitle(f'S.O.W Machine v1 - fleet of {len(names)}')
+        self.resize(800, 400)
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont("Arial", 10))
+        layout.addWidget(self.summary_label)
+        grid_widget = QWidget()
+        grid = QGridLayout()
+        grid.setSpacing(4)
+        tile_font = QFont("Monospace", 8)
+        self.tiles = []
+        for i, name in enumerate(names):
+            tile = QPushButton(name)
+            tile.setFont(tile_font)
+            tile.setFixedSize(124, 76)
+            tile.clicked.connect(lambda checked, unit=i: self.open_unit(unit))
+            grid.addWidget(tile, i // FLEET_COLUMNS, i % FLEET_COLUMNS)
+            self.tiles.append(tile)
+        grid_widget.setLayout(grid)
+        scroll = QScrollArea()
+        scroll.setWidget(grid_widget)
+        layout.addWidget(scroll)
+        central = QWidget()
+        central.setLayout(layout)
+        self.setCentralWidget(central)
+
+    def refresh(self):
+        now = time.monotonic()
+        changed = self.ingest.take_changed()
+        for i, unit in enumerate(self.ingest.units):
+            status = unit.status(now, max(STALE_AFTER_FACTOR / self.source.rate, 2 * FLEET_REFRESH_MS / 1000))
+            if status != self.statuses[i]:
+                self.statuses[i] = status
+                changed.add(i)  # Went stale or recovered without new samples
+        applied = self.binder.applied
+        for i in changed:
+            self.update_tile(i)
+        self.repaints = self.binder.applied - applied
+        stats = self.ingest.stats()
+        counts = {status: self.statuses.count(status) for status in FLEET_STATUS_COLORS}
+        self.binder.set_text(self.summary_label, f"{stats['units']} units: {counts['ok']} ok, {counts['alarm']} alarm, {counts['stale']} stale | "
+                                                 f"{stats['samples_per_s']:.0f} samples/s, ingest {stats['busy'] * 100:.1f}% busy, "
+                                                 f"{len(changed)} changed, {self.repaints} widget updates")
+
+    def update_tile(self, i):
+        unit = self.ingest.units[i]
+        tile = self.tiles[i]
+        status = self.statuses[i]
+        lines = [f"{unit.name} {status.upper()}"]
+        if unit.latest:
+            values = dict(zip(unit.store.channels, unit.latest[2]))
+            cells = [f"{label} {values[name]:g}" for name, label in FLEET_TILE_CHANNELS.items()]
+            lines += [' '.join(cells[j:j + 2]) for j in range(0, len(cells), 2)]
+        self.binder.set_text(tile, '\n'.join(lines))
+        self.binder.set_color(tile, FLEET_STATUS_COLORS[status])
+        self.binder.set_tooltip(tile, ', '.join(rule.name for rule in unit.alarms.active_rules()) or 'No alarms')
+
+    def open_unit(self, i):
+        window = self.drilldowns.get(i)
+        if window is None or not window.isVisible():
+            window = MainWindow(graph_backend=self.graph_backend, client=FleetUnitClient(self.ingest, i), shm_name=None)
+            window.setWindowTitle(f'S.O.W Machine v1 - {self.ingest.units[i].name}')
+            self.drilldowns[i] = window
+            window.show()
+        window.raise_()
+        window.activateWindow()
+
+    def closeEvent(self, event):
+        for window in self.drilldowns.values():
+            window.close()
+        self.source.stop(timeout=1)
+        self.ingest.stop(timeout=5)  # Ingests the last samples and writes the queued log rows
+        super().closeEvent(event)
 
 def main():
-    app = QApplication(sys.argv)
-    mainWindow = MainWindow()
+    parser = argparse.ArgumentParser(description='S.O.W Machine GUI')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--replay', default=REPLAY_FILE, help='Play back a recorded sow_data_* log instead of the simulated sensors')
+    source.add_argument('--simulate', type=float, default=SIMULATE_RATE_HZ, metavar='HZ', help='Drive the GUI from the fault-injecting simulator at this sample rate')
+    source.add_argument('--attach', nargs='?', const=SOCKET_PATH, default=SERVICE_SOCKET, metavar='SOCKET', help='Attach to a running acquisition service (python3 -m utils.service)')
+    fleet = parser.add_mutually_exclusive_group()
+    fleet.add_argument('--fleet', type=int, default=FLEET_UNITS, metavar='N', help='Show a summary grid of N simulated units')
+    fleet.add_argument('--fleet-attach', nargs='+', default=FLEET_SOCKETS, metavar='SOCKET', help='Show a summary grid of the units served on these sockets')
+    parser.add_argument('--graph', default=GRAPH_BACKEND, choices=['native', 'matplotlib'], help='Graph backend')
+    parser.add_argument('--startup', default=STARTUP_MODE, choices=['eager', 'warmup', 'lazy'], help='When the graph is built')
+    parser.add_argument('--speed', default='max' if REPLAY_SPEED is None else str(REPLAY_SPEED), help="Replay speed, e.g. 1, 10, 100 or 'max'")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.fleet or args.fleet_attach:
+        fleetWindow = FleetWindow(args.fleet, args.simulate or SAMPLE_RATE_HZ, args.graph, args.fleet_attach)
+        fleetWindow.show()
+        sys.exit(app.exec_())
+    mainWindow = MainWindow(args.replay, None if args.speed == 'max' else float(args.speed), args.graph, args.attach, args.startup, args.simulate)
     mainWindow.show()  # Show the main window
+    QTimer.singleShot(0, mainWindow.report_first_frame)  # Runs once the first frame has been painted
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,232 @@
+import time
+import random
+import threading
+import numpy as np
+from collections import deque
+from datetime import datetime
+
+JITTER_SAMPLES = 1024  # Recent wake-up delays kept for stats()
+# Channel schema shared by the GUI, the service, the simulator and the fleet: log columns and starting values
+CHANNELS = ["dissolved oxygen concentration", "pressure", "flow rate", "pump speed", "Upper tank temp", "lower tank temp", "C-box", "External temp"]
+HEADERS = ["idx", "datetime"] + CHANNELS
+INITIAL_VALUES = {
+    "dissolved oxygen concentration": 250,
+    "pressure": 25,
+    "flow rate": 2,
+    "pump speed": 1.0,
+    "Upper tank temp": 4,
+    "lower tank temp": 5,
+    "C-box": 9,  # Lower tank temp + 4
+    "External temp": 25,  # Static
+}
+
+
+class SensorDriver:
+    """
+    Interface for sensor drivers used by AcquisitionEngine.
+
+    `read` is called from the acquisition thread with the names of the
+    channels that are due and returns their values. `set_value` lets manual
+    overrides from the GUI reach the driver and is called from another thread,
+    so implementations must guard their state. `simulated` marks drivers whose
+    readings are made up; Controller refuses to close real outputs on them.
+    """
+    channels = []
+    simulated = False
+
+    def read(self, names) -> dict:
+        raise NotImplementedError
+
+    def set_value(self, name: str, value: float):
+        pass
+
+    def close(self):
+        pass
+
+
+class RandomWalkDriver(SensorDriver):
+    """
+    Simulated sensors: every channel does a bounded random walk, the C-box
+    follows the lower tank temperature and the external temperature is static.
+
+    Parameters:
+    initial (dict): Starting value per channel.
+    """
+    # name -> (min value, max value, max change per sample)
+    limits = {
+        "dissolved oxygen concentration": (50, 400, 5),
+        "pressure": (23, 27, 0.1),
+        "flow rate": (1.5, 2.5, 0.1),
+        "pump speed": (0, 2, 0.2),
+        "Upper tank temp": (1, 10, 0.02),
+        "lower tank temp": (1, 10, 0.02),
+    }
+    channels = CHANNELS  # The limited channels, then the C-box and the external temperature
+    simulated = True
+
+    def __init__(self, initial: dict):
+        self.values = dict(initial)
+        self.lock = threading.Lock()
+
+    def read(self, names) -> dict:
+        with self.lock:
+            for name in names:
+                if name in self.limits:
+                    self.values[name] = self.get_new_value(self.values[name], *self.limits[name])
+            self.values["C-box"] = round(self.values["lower tank temp"] + 4, 3)
+            return {name: self.values[name] for name in names}
+
+    def set_value(self, name: str, value: float):
+        with self.lock:
+            self.values[name] = value
+            if name == "lower tank temp":
+                self.values["C-box"] = round(value + 4, 3)
+
+    @staticmethod
+    def get_new_value(current_value, min_value, max_value, max_change_rate):
+        change = random.uniform(-max_change_rate, max_change_rate)
+        new_value = current_value + change
+        return round(max(min(new_value, max_value), min_value), 3)
+
+
+def notify(listeners, sample):
+    for listener in listeners:
+        try:
+            listener(sample)
+        except Exception as e:
+            print(f"Error in sample listener: {e}")
+
+
+class SampleQueue:
+    """
+    Bounded single-consumer queue of samples. Appending and draining a deque
+    are atomic in CPython, so the acquisition thread never takes a lock; when
+    the consumer falls behind the oldest samples are dropped and counted.
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self.samples = deque(maxlen=maxlen)
+        self.dropped = 0
+
+    def put(self, sample):
+        if len(self.samples) == self.samples.maxlen:
+            self.dropped += 1
+        self.samples.append(sample)
+
+    def drain(self, limit: int = None) -> list:
+        batch = []
+        while self.samples and (limit is None or len(batch) < limit):
+            batch.append(self.samples.popleft())
+        return batch
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class AcquisitionEngine:
+    """
+    Samples a SensorDriver on its own thread with drift-free scheduling.
+
+    Deadlines are computed from the start time (start + k * period) rather
+    than by sleeping a fixed interval, so the rate does not drift; missed
+    deadlines are skipped and counted as overruns. Every tick publishes one
+    timestamped sample (idx, datetime, values in `channels` order) to every
+    subscribed SampleQueue. Listeners are called with each sample on the
+    acquisition thread before it is queued, for checks that must not wait for
+    the GUI. Channels with a lower rate than the engine keep their last value
+    between reads.
+
+    Parameters:
+    driver (SensorDriver): Source of the channel values.
+    channels (list): Published channels, in header order.
+    rates (dict): Optional per-channel sample rate in Hz; defaults to `rate`.
+    rate (float): Default sample rate in Hz; the engine ticks at the highest rate.
+    """
+
+    def __init__(self, driver, channels, rates: dict = None, rate: float = 0.2):
+        self.driver = driver
+        self.channels = list(channels)
+        self.rates = {name: (rates or {}).get(name, rate) for name in self.channels}
+        self.period = 1 / max(self.rates.values())
+        self.subscribers = []
+        self.listeners = []
+        self.latest = {}
+        self.next_idx = 1
+        self.samples = 0
+        self.overruns = 0
+        self.jitter = deque(maxlen=JITTER_SAMPLES)  # Seconds between deadline and wake-up
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def subscribe(self, maxlen: int = 10000) -> SampleQueue:
+        queue = SampleQueue(maxlen)
+        self.subscribers.append(queue)
+        return queue
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self, next_idx: int = 1):
+        self.next_idx = next_idx
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='acquisition', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+        self.driver.close()
+
+    def run(self):
+        start = time.monotonic()
+        due = {name: start for name in self.channels}
+        tick = 0
+        while not self.stopping.is_set():
+            deadline = start + tick * self.period
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.stopping.wait(delay):
+                break
+            now = time.monotonic()
+            self.jitter.append(now - deadline)
+            names = [name for name in self.channels if due[name] <= now + 1e-6]
+            for name in names:
+                due[name] += 1 / self.rates[name]
+            try:
+                self.latest.update(self.driver.read(names))
+            except Exception as e:
+                print(f"Error reading sensors: {e}")
+            self.publish()
+            # Skip the deadlines that already passed instead of bursting to catch up
+            tick += 1
+            behind = int((time.monotonic() - start) / self.period) + 1 - tick
+            if behind > 0:
+                self.overruns += behind
+                tick += behind
+                for name in self.channels:
+                    due[name] = max(due[name], start + tick * self.period)
+
+    def publish(self):
+        if len(self.latest) < len(self.channels):
+            return  # Wait until every channel has been read once
+        sample = (self.next_idx, datetime.now(), [self.latest[name] for name in self.channels])
+        self.next_idx += 1
+        self.samples += 1
+        notify(self.listeners, sample)
+        for queue in self.subscribers:
+            queue.put(sample)
+
+    def stats(self) -> dict:
+        """
+        Sampling statistics, with the wake-up jitter in milliseconds.
+        """
+        jitter = np.array(self.jitter) * 1000
+        return {
+            'rate_hz': 1 / self.period,
+            'samples': self.samples,
+            'overruns': self.overruns,
+            'dropped': sum(queue.dropped for queue in self.subscribers),
+            'jitter_p50_ms': float(np.percentile(jitter, 50)) if len(jitter) else 0.0,
+            'jitter_p99_ms': float(np.percentile(jitter, 99)) if len(jitter) else 0.0,
+            'jitter_max_ms': float(jitter.max()) if len(jitter) else 0.0,
+        }
@@ -0,0 +1,122 @@
+import time
+import queue
+import threading
+import numpy as np
+from collections import deque
+from dataclasses import dataclass, field
+
+LATENCY_SAMPLES = 256  # Recent latencies kept per actuator
+
+
+@dataclass
+class ActuatorCommand:
+    name: str  # Actuator name, e.g. 'Pump1'
+    pin: int
+    action: str = 'pulse'  # 'pulse', 'on' or 'off'
+    submitted: float = field(default_factory=time.monotonic)
+
+
+class ActuatorWorker:
+    """
+    Executes actuator commands on a background thread so GPIO timing never
+    blocks the caller.
+
+    Commands are queued with `submit` and run one at a time against a single
+    long-lived GPIOSession. `on_done(command, latency)` and
+    `on_failed(command, message)` are called from the worker thread; the GUI
+    connects them to Qt signals so the results arrive on the GUI thread.
+
+    Parameters:
+    session (GPIOSession): Open GPIO session the commands are run against.
+    on_done (callable): Called after a command completed.
+    on_failed (callable): Called when a command raised.
+    """
+
+    def __init__(self, session, on_done=None, on_failed=None):
+        self.session = session
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.commands = queue.Queue()
+        self.latencies = {}  # name -> deque of (queue wait, run time) in seconds
+        self.failures = {}
+        self.thread = threading.Thread(target=self.run, name='actuator-worker', daemon=True)
+        self.thread.start()
+
+    def submit(self, name: str, pin: int, action: str = 'pulse') -> ActuatorCommand:
+        command = ActuatorCommand(name, pin, action)
+        self.commands.put(command)
+        return command
+
+    def pending(self) -> int:
+        return self.commands.qsize()
+
+    def run(self):
+        while True:
+            command = self.commands.get()
+            if command is None:
+                break
+            started = time.monotonic()
+            try:
+                self.execute(command)
+            except Exception as e:
+                self.failures[command.name] = self.failures.get(command.name, 0) + 1
+                print(f"Error running {command.action} on {command.name} (pin {command.pin}): {e}")
+                if self.on_failed:
+                    self.on_failed(command, str(e))
+                continue
+            finished = time.monotonic()
+            self.latencies.setdefault(command.name, deque(maxlen=LATENCY_SAMPLES)).append((started - command.submitted, finished - started))
+            if self.on_done:
+                self.on_done(command, finished - command.submitted)
+
+    def execute(self, command):
+        if command.action == 'pulse':
+            self.session.pulse(command.pin)
+        elif command.action in ('on', 'off'):
+            self.session.set(command.pin, command.action == 'on')
+        else:
+            raise ValueError(f"Unknown actuator action '{command.action}'.")
+
+    def metrics(self) -> dict:
+        """
+        Per-actuator latency summary in milliseconds: time spent waiting in
+        the queue and time spent driving the pins.
+        """
+        report = {}
+        for name, samples in self.latencies.items():
+            waits, runs = (np.array(column) * 1000 for column in zip(*samples))
+            report[name] = {
+                'count': len(samples),
+                'failures': self.failures.get(name, 0),
+                'queue_p50_ms': float(np.percentile(waits, 50)),
+                'queue_max_ms': float(waits.max()),
+                'run_p50_ms': float(np.percentile(runs, 50)),
+                'run_max_ms': float(runs.max()),
+            }
+        for name, count in self.failures.items():
+            report.setdefault(name, {'count': 0, 'failures': count})
+        return report
+
+    def stop(self, timeout: float = None, report_cancelled: bool = True):
+        """
+        Discard the queued commands, let the running one finish, stop the
+        thread and release the GPIO pins. Discarded commands are reported
+        through `on_failed`, or only printed without `report_cancelled` (for
+        callers that are shutting down themselves). If the join times out,
+        `session.close()` waits for the command in flight and the closed
+        session refuses any later one, so no pin is driven after the cleanup.
+        """
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if command is None:
+                continue
+            if report_cancelled and self.on_failed:
+                self.on_failed(command, 'Cancelled on shutdown.')
+            else:
+                print(f"Cancelled {command.action} on {command.name} (pin {command.pin}) on shutdown.")
+        self.commands.put(None)
+        self.thread.join(timeout)
+        self.session.close()
@@ -0,0 +1,223 @@
+import sys
+import time
+import argparse
+import numpy as np
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from utils.logger import CsvLogger
+
+CHECK_TIME_SAMPLES = 1024  # Recent check durations kept for stats()
+ALARM_LOG_HEADERS = ['idx', 'datetime', 'rule', 'channel', 'state', 'value', 'severity']
+# Rules of the GUI and the acquisition service (ALARM_RULES in sow_gui.py). A rule can
+# also switch an actuator, e.g. 'action': ('Chiller S/W', 27, 'pulse').
+DEFAULT_RULES = [
+    {'name': 'D.O. low', 'channel': 'dissolved oxygen concentration', 'low': 100, 'hysteresis': 10, 'debounce': 2, 'severity': 'critical'},
+    {'name': 'Pressure out of range', 'channel': 'pressure', 'low': 23.5, 'high': 26.5, 'hysteresis': 0.2, 'debounce': 2},
+    {'name': 'Lower tank temp high', 'channel': 'lower tank temp', 'high': 9.0, 'hysteresis': 0.3, 'debounce': 2},
+    {'name': 'Lower tank temp rising fast', 'channel': 'lower tank temp', 'high': 0.01, 'rate': True, 'debounce': 3},  # °C per second
+]
+
+
+@dataclass
+class AlarmRule:
+    """
+    One alarm condition on a channel.
+
+    The alarm is raised when the value (or with `rate`, its change per second)
+    is above `high` or below `low` for `debounce` consecutive samples, and
+    cleared once it is back inside the limits by at least `hysteresis` for
+    `debounce` samples. `action` and `clear_action` are optional actuator
+    commands (name, pin, 'pulse'/'on'/'off') submitted on raise and clear.
+    """
+    name: str
+    channel: str
+    low: float = None
+    high: float = None
+    rate: bool = False
+    hysteresis: float = 0.0
+    debounce: int = 1
+    severity: str = 'warning'
+    action: tuple = None
+    clear_action: tuple = None
+
+
+@dataclass
+class AlarmEvent:
+    time: datetime
+    rule: AlarmRule
+    state: str  # 'raised' or 'cleared'
+    value: float
+
+
+class AlarmEngine:
+    """
+    Evaluates every rule on every sample. The rules are compiled into NumPy
+    arrays, so a check is a handful of vector operations regardless of the
+    number of rules; only state changes run Python code. Meant to be called
+    from the acquisition thread (see AcquisitionEngine.add_listener), so alarms
+    fire within the sample that caused them and never wait for a repaint.
+
+    Parameters:
+    channels (list): Channel names, in the order of the sample values.
+    rules (list): AlarmRule objects.
+    actuators (ActuatorWorker): Receives the rule actions; None disables them.
+    log_path (str): CSV alarm event log; None keeps the events in memory only.
+    max_events (int): Events kept in memory.
+    """
+
+    def __init__(self, channels, rules, actuators=None, log_path: str = None, max_events: int = 1000):
+        self.channels = list(channels)
+        self.rules = list(rules)
+        self.actuators = actuators
+        self.events = deque(maxlen=max_events)
+        self.listeners = []  # Called with each AlarmEvent, on the acquisition thread
+        self.logger = CsvLogger(log_path, ALARM_LOG_HEADERS, batch_rows=1, max_age=1.0) if log_path else None
+        self.event_count = 0
+        self.checks = 0
+        self.check_times = deque(maxlen=CHECK_TIME_SAMPLES)
+        index = {name: i for i, name in enumerate(self.channels)}
+        self.channel_index = np.array([index[rule.channel] for rule in self.rules], dtype=np.intp)
+        self.low = np.array([-np.inf if rule.low is None else rule.low for rule in self.rules], dtype=np.float64)
+        self.high = np.array([np.inf if rule.high is None else rule.high for rule in self.rules], dtype=np.float64)
+        self.hysteresis = np.array([rule.hysteresis for rule in self.rules], dtype=np.float64)
+        self.debounce = np.array([max(1, rule.debounce) for rule in self.rules], dtype=np.int64)
+        self.is_rate = np.array([rule.rate for rule in self.rules], dtype=bool)
+        self.active = np.zeros(len(self.rules), dtype=bool)
+        self.counter = np.zeros(len(self.rules), dtype=np.int64)
+        self.previous = None  # (time s, values) of the last sample, for the rate rules
+
+    def check(self, sample):
+        """
+        Evaluate all rules on one (idx, datetime, values) sample.
+        """
+        start = time.perf_counter()
+        _, sample_time, values = sample
+        values = np.asarray(values, dtype=np.float64)
+        now = sample_time.timestamp()
+        observed = values[self.channel_index]
+        if self.is_rate.any():
+            if self.previous is not None and now > self.previous[0]:
+                rates = (values - self.previous[1]) / (now - self.previous[0])
+            else:
+                rates = np.full(len(values), np.nan)  # No rate for the first sample; NaN compares False
+            observed = np.where(self.is_rate, rates[self.channel_index], observed)
+        self.previous = (now, values)
+        outside = (observed > self.high) | (observed < self.low)
+        inside = (observed <= self.high - self.hysteresis) & (observed >= self.low + self.hysteresis)
+        pending = np.where(self.active, inside, outside)
+        self.counter = np.where(pending, self.counter + 1, 0)
+        changed = self.counter >= self.debounce
+        if changed.any():
+            self.active ^= changed
+            self.counter[changed] = 0
+            for i in np.flatnonzero(changed):
+                self.fire(AlarmEvent(sample_time, self.rules[i], 'raised' if self.active[i] else 'cleared', float(observed[i])))
+        self.checks += 1
+        self.check_times.append(time.perf_counter() - start)
+
+    def fire(self, event: AlarmEvent):
+        self.events.append(event)
+        self.event_count += 1
+        rule = event.rule
+        command = rule.action if event.state == 'raised' else rule.clear_action
+        if command and self.actuators:
+            self.actuators.submit(*command)
+        if self.logger:
+            self.logger.log([self.event_count, event.time, rule.name, rule.channel, event.state, event.value, rule.severity])
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in alarm listener: {e}")
+
+    def active_rules(self) -> list:
+        return [self.rules[i] for i in np.flatnonzero(self.active)]
+
+    def stats(self) -> dict:
+        check_us = np.array(self.check_times) * 1e6
+        return {
+            'rules': len(self.rules),
+            'checks': self.checks,
+            'events': self.event_count,
+            'active': int(self.active.sum()),
+            'check_p50_us': float(np.percentile(check_us, 50)) if len(check_us) else 0.0,
+            'check_max_us': float(check_us.max()) if len(check_us) else 0.0,
+        }
+
+    def close(self, timeout: float = None):
+        if self.logger:
+            self.logger.close(timeout)
+
+
+def benchmark(n_rules: int, n_samples: int, n_channels: int = 8, seed: int = 0) -> dict:
+    """
+    Time AlarmEngine.check on random-walk samples with a mix of limit and rate rules.
+    """
+    rng = np.random.default_rng(seed)
+    channels = [f'ch{i}' for i in range(n_channels)]
+    rules = []
+    for i in range(n_rules):
+        channel = channels[i % n_channels]
+        if i % 4 == 3:
+            rules.append(AlarmRule(f'rule{i}', channel, low=-0.5, high=0.5, rate=True, debounce=2))
+        else:
+            limit = rng.uniform(1, 5)
+            rules.append(AlarmRule(f'rule{i}', channel, low=-limit, high=limit, hysteresis=0.1, debounce=int(rng.integers(1, 4))))
+    engine = AlarmEngine(channels, rules)
+    values = np.cumsum(rng.normal(0, 0.3, (n_samples, n_channels)), axis=0)
+    values -= np.round(values / 10) * 10  # Keep the walk around zero so alarms keep toggling
+    start_time = datetime(2026, 1, 1)
+    samples = [(i, start_time + timedelta(seconds=i), row) for i, row in enumerate(values.tolist())]
+    start = time.perf_counter()
+    for sample in samples:
+        engine.check(sample)
+    elapsed = time.perf_counter() - start
+    stats = engine.stats()
+    stats.update({'samples': n_samples, 'samples_per_s': n_samples / elapsed, 'mean_us': elapsed / n_samples * 1e6})
+    return stats
+
+
+def self_test():
+    """
+    Feed fixed sequences (one sample per second) and check where each rule
+    raises and clears: a high limit with hysteresis and a debounce of 2, a
+    low limit without either, and a rate rule. Raises AssertionError on a
+    mismatch.
+    """
+    rules = [
+        AlarmRule('high', 'a', high=10, hysteresis=1, debounce=2),
+        AlarmRule('low', 'b', low=0),
+        AlarmRule('rate', 'c', high=0.5, rate=True, debounce=2),
+    ]
+    engine = AlarmEngine(['a', 'b', 'c'], rules)
+    columns = [
+        [5, 11, 9, 11, 12, 9.5, 8.9, 9.5, 8, 7],  # One sample above 10 is not enough; clears after two samples <= 9
+        [1, -1, 0, 0.5, -0.1, 1, 1, 1, 1, 1],  # Raises below 0, clears at 0
+        [0, 0.2, 1, 2, 2.2, 3, 3, 3, 3, 3],  # Rates 0.2, 0.8, 1.0, 0.2, 0.8, 0, ... per second
+    ]
+    start_time = datetime(2026, 1, 1)
+    for i, row in enumerate(zip(*columns)):
+        engine.check((i, start_time + timedelta(seconds=i), list(row)))
+    fired = [(int((event.time - start_time).total_seconds()), event.rule.name, event.state) for event in engine.events]
+    expected = [(1, 'low', 'raised'), (2, 'low', 'cleared'), (3, 'rate', 'raised'), (4, 'high', 'raised'),
+                (4, 'low', 'raised'), (5, 'low', 'cleared'), (7, 'rate', 'cleared'), (9, 'high', 'cleared')]
+    assert fired == expected, f"alarm events {fired}, expected {expected}"
+    assert not engine.active.any()
+
+if __name__ == '__main__':
+    # python3 -m utils.alarms --rules 10 100 1000 --samples 100000
+    # python3 -m utils.alarms --self-test
+    parser = argparse.ArgumentParser(description='Benchmark the alarm engine.')
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--samples', type=int, default=100000)
+    parser.add_argument('--self-test', action='store_true', help='Check the raise and clear points of known sequences and exit')
+    args = parser.parse_args(sys.argv[1:])
+    if args.self_test:
+        self_test()
+        print("Alarm engine self-test passed.")
+        sys.exit(0)
+    for n_rules in args.rules:
+        stats = benchmark(n_rules, args.samples)
+        print(f"{n_rules:5d} rules: {stats['samples_per_s']:9.0f} samples/s, mean {stats['mean_us']:6.1f} us, "
+              f"p50 {stats['check_p50_us']:6.1f} us, max {stats['check_max_us']:7.1f} us, {stats['events']} events")
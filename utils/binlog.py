@@ -0,0 +1,191 @@
+import os
+import sys
+import csv
+import json
+import struct
+import argparse
+import numpy as np
+from utils.logger import CsvLogger
+
+MAGIC = b'SOWLOG01'
+HEADER_ALIGN = 64  # The record area starts on a multiple of this many bytes
+CSV_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+CONVERT_CHUNK_ROWS = 65536
+
+
+def record_dtype(channels, value_dtype='float32'):
+    """
+    Fixed-width record: int64 idx, int64 epoch microseconds, one value per channel.
+    """
+    return np.dtype([('idx', '<i8'), ('time_us', '<i8')] + [(name, np.dtype(value_dtype).newbyteorder('<')) for name in channels])
+
+
+def encode_header(channels, value_dtype='float32') -> bytes:
+    """
+    MAGIC, uint32 JSON length, JSON schema, zero padding to HEADER_ALIGN.
+    """
+    schema = json.dumps({'version': 1, 'channels': list(channels), 'value_dtype': np.dtype(value_dtype).name, 'time': 'epoch_us'}).encode()
+    header = MAGIC + struct.pack('<I', len(schema)) + schema
+    return header + b'\0' * (-len(header) % HEADER_ALIGN)
+
+
+def read_header(file):
+    """
+    Return (schema dict, header size in bytes) from an open binary log.
+    """
+    magic = file.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError("Not a S.O.W binary log file.")
+    length, = struct.unpack('<I', file.read(4))
+    schema = json.loads(file.read(length))
+    size = len(MAGIC) + 4 + length
+    return schema, size + (-size % HEADER_ALIGN)
+
+
+class BinaryLogger(CsvLogger):
+    """
+    Write-behind logger for the binary format: the same batching thread as
+    CsvLogger, but every row is one fixed-width record. A partially written
+    last record is cut off when the file is opened.
+
+    Parameters:
+    path (str): Binary log file; created with a schema header when missing.
+    headers (list): Column names like MainWindow.headers (idx, datetime, channels...).
+    value_dtype (str): 'float32' or 'float64' for the channel values.
+    """
+
+    def __init__(self, path, headers, value_dtype='float32', **kwargs):
+        self.channels = list(headers[2:])
+        self.value_dtype = value_dtype
+        self.dtype = record_dtype(self.channels, value_dtype)
+        super().__init__(path, headers, **kwargs)
+
+    def open(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb+') as file:
+                schema, header_size = read_header(file)
+                if schema['channels'] != self.channels or schema['value_dtype'] != np.dtype(self.value_dtype).name:
+                    raise ValueError(f"Schema of {self.path} does not match the logged channels.")
+                size = file.seek(0, os.SEEK_END)
+                torn = (size - header_size) % self.dtype.itemsize
+                if torn:
+                    file.truncate(size - torn)
+                    print(f"Recovered {self.path}: dropped a truncated last record ({torn} bytes).")
+                self.recovered_bytes = torn
+            return open(self.path, 'ab')
+        file = open(self.path, 'wb')
+        file.write(encode_header(self.channels, self.value_dtype))
+        file.flush()
+        return file
+
+    def write_rows(self, batch) -> int:
+        records = np.empty(len(batch), dtype=self.dtype)
+        records['idx'] = [row[0] for row in batch]
+        records['time_us'] = np.array([row[1] for row in batch], dtype='datetime64[us]').view(np.int64)
+        values = np.array([row[2:] for row in batch], dtype=np.float64)
+        for i, name in enumerate(self.channels):
+            records[name] = values[:, i]
+        self.file.write(records.tobytes())
+        return records.nbytes
+
+
+class BinaryLog:
+    """
+    Memory-mapped, read-only view of a binary log. `records` is a numpy.memmap
+    of the structured records; `times`, `column` and `window` return views into
+    it, so history is windowed without copying or parsing.
+
+    Parameters:
+    path (str): Binary log file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.schema, self.header_size = read_header(file)
+            size = file.seek(0, os.SEEK_END)
+        self.channels = self.schema['channels']
+        self.dtype = record_dtype(self.channels, self.schema['value_dtype'])
+        count = (size - self.header_size) // self.dtype.itemsize  # Ignore a torn last record
+        if count:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=self.header_size, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def times(self):
+        return self.records['time_us'].view('datetime64[us]')
+
+    def column(self, name):
+        return self.records[name]
+
+    def window(self, start=None, end=None):
+        """
+        Return the records with start <= time <= end as a memmap slice.
+        """
+        times = self.records['time_us']
+        lo = 0 if start is None else np.searchsorted(times, np.datetime64(start, 'us').astype(np.int64), side='left')
+        hi = len(times) if end is None else np.searchsorted(times, np.datetime64(end, 'us').astype(np.int64), side='right')
+        return self.records[lo:hi]
+
+
+def csv_to_binary(csv_path, binary_path, value_dtype='float32') -> int:
+    """
+    Convert a CSV log written by the GUI to the binary format. Returns the row count.
+    """
+    with open(csv_path, 'r', newline='') as source:
+        reader = csv.reader(source)
+        headers = next(reader)
+        channels = headers[2:]
+        dtype = record_dtype(channels, value_dtype)
+        rows = 0
+        with open(binary_path, 'wb') as target:
+            target.write(encode_header(channels, value_dtype))
+            while True:
+                chunk = [row for _, row in zip(range(CONVERT_CHUNK_ROWS), reader) if row]
+                if not chunk:
+                    break
+                columns = list(zip(*chunk))
+                records = np.empty(len(chunk), dtype=dtype)
+                records['idx'] = np.array(columns[0], dtype=np.int64)
+                records['time_us'] = np.array(columns[1], dtype='datetime64[us]').view(np.int64)
+                for i, name in enumerate(channels):
+                    records[name] = np.array(columns[2 + i], dtype=np.float64)
+                target.write(records.tobytes())
+                rows += len(chunk)
+    return rows
+
+
+def binary_to_csv(binary_path, csv_path) -> int:
+    """
+    Convert a binary log back to the CSV layout of the GUI. Returns the row count.
+    """
+    log = BinaryLog(binary_path)
+    with open(csv_path, 'w', newline='') as target:
+        writer = csv.writer(target)
+        writer.writerow(['idx', 'datetime'] + log.channels)
+        for start in range(0, len(log), CONVERT_CHUNK_ROWS):
+            chunk = log.records[start:start + CONVERT_CHUNK_ROWS]
+            times = chunk['time_us'].view('datetime64[us]').astype(object)
+            values = [chunk[name].astype(str) for name in log.channels]  # Shortest repr of the stored float
+            for i, row in enumerate(zip(*values)):
+                writer.writerow([int(chunk['idx'][i]), times[i].strftime(CSV_TIME_FORMAT)] + list(row))
+    return len(log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert S.O.W logs between CSV and the binary format.')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float64'], help='Value type when writing a binary log')
+    args = parser.parse_args(argv)
+    if args.source.endswith('.csv'):
+        rows = csv_to_binary(args.source, args.target, args.dtype)
+    else:
+        rows = binary_to_csv(args.source, args.target)
+    print(f"Converted {rows} rows: {args.source} -> {args.target}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
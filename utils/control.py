@@ -0,0 +1,313 @@
+import sys
+import math
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from collections import deque
+from dataclasses import dataclass
+from utils.gpio import GPIOSession, MockGPIO
+from utils.acquisition import SensorDriver, RandomWalkDriver
+
+CONTROL_RATE_HZ = 10  # Default rate of the control loop
+TIMING_SAMPLES = 1024  # Recent loop periods kept for stats()
+# Loops of the GUI (CONTROL_LOOPS in sow_gui.py). Outputs are software PWM duty
+# cycles; the chiller relay is time-proportioned in 5 s windows (0.2 Hz).
+DEFAULT_LOOPS = [
+    {'channel': 'lower tank temp', 'pin': 22, 'setpoint': 5.0, 'kp': 0.8, 'ki': 0.02, 'reverse': True, 'frequency': 0.2},  # Chiller
+    {'channel': 'pressure', 'pin': 23, 'setpoint': 25.0, 'kp': 0.5, 'ki': 0.05, 'frequency': 50},  # Pressure valve
+    {'channel': 'flow rate', 'pin': 24, 'setpoint': 2.0, 'kp': 0.5, 'ki': 0.2, 'frequency': 100},  # Feed pump
+    {'channel': 'pump speed', 'pin': 25, 'setpoint': 1.0, 'kp': 0.4, 'ki': 0.5, 'frequency': 1000},  # Circulation pump motor driver
+]
+
+
+@dataclass
+class ControlLoop:
+    """
+    One controlled channel: a PID that drives the PWM output on `pin` to hold
+    the channel at `setpoint`. With `reverse` the output lowers the value
+    (cooling). `kd` acts on the measurement, filtered over `derivative_tau` s.
+    """
+    channel: str
+    pin: int
+    setpoint: float
+    kp: float
+    ki: float = 0.0
+    kd: float = 0.0
+    derivative_tau: float = 1.0
+    reverse: bool = False
+    frequency: float = 100.0
+    out_min: float = 0.0
+    out_max: float = 1.0
+
+
+class PID:
+    """
+    Positional PID with anti-windup. The integral only accumulates while the
+    output is not saturated in the direction of the error (conditional
+    integration) and is itself clamped to the output range, so it unwinds as
+    soon as the error changes sign. The derivative acts on the measurement, so
+    setpoint steps do not kick the output.
+    """
+
+    def __init__(self, kp: float, ki: float = 0.0, kd: float = 0.0, out_min: float = 0.0, out_max: float = 1.0,
+                 reverse: bool = False, derivative_tau: float = 1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.out_min = out_min
+        self.out_max = out_max
+        self.sign = -1.0 if reverse else 1.0
+        self.derivative_tau = derivative_tau
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_measurement = None
+        self.output = self.out_min
+
+    def update(self, setpoint: float, measurement: float, dt: float) -> float:
+        error = self.sign * (setpoint - measurement)
+        if self.last_measurement is not None and dt > 0:
+            slope = -self.sign * (measurement - self.last_measurement) / dt
+            self.derivative += dt / (self.derivative_tau + dt) * (slope - self.derivative)
+        self.last_measurement = measurement
+        integral = min(max(self.integral + self.ki * error * dt, self.out_min), self.out_max)
+        output = self.kp * error + integral + self.kd * self.derivative
+        if not (output > self.out_max and error > 0 or output < self.out_min and error < 0):
+            self.integral = integral
+        self.output = min(max(self.kp * error + self.integral + self.kd * self.derivative, self.out_min), self.out_max)
+        return self.output
+
+
+class Controller:
+    """
+    Runs the PID loops on their own thread at a fixed rate.
+
+    Scheduling is drift-free like AcquisitionEngine: deadlines are start +
+    k * period and missed deadlines are skipped and counted as overruns. Every
+    tick reads the controlled channels from the driver, updates each PID with
+    the measured time since the previous tick and sets the PWM outputs through
+    its own GPIOSession (the actuator worker's pulses hold their session's
+    lock for seconds). Setpoints can be changed from any thread.
+
+    Parameters:
+    driver (SensorDriver): Source of the measurements, e.g. PlantDriver.
+    loops (list): ControlLoop objects.
+    session (GPIOSession): Session for the PWM outputs; closed by stop().
+    rate (float): Loop rate in Hz.
+
+    Raises ValueError when a simulated driver would drive real GPIO outputs.
+    """
+
+    def __init__(self, driver, loops, session, rate: float = CONTROL_RATE_HZ):
+        if driver.simulated and not isinstance(session.gpio, MockGPIO):
+            raise ValueError("Refusing to drive real GPIO outputs from simulated readings.")
+        self.driver = driver
+        self.loops = list(loops)
+        self.session = session
+        self.period = 1 / rate
+        self.pids = {loop.channel: PID(loop.kp, loop.ki, loop.kd, loop.out_min, loop.out_max, loop.reverse, loop.derivative_tau)
+                     for loop in self.loops}
+        self.setpoints = {loop.channel: loop.setpoint for loop in self.loops}
+        self.enabled = {loop.channel: True for loop in self.loops}
+        self.measurements = {}
+        self.outputs = {loop.channel: 0.0 for loop in self.loops}
+        self.ticks = 0
+        self.overruns = 0
+        self.errors = 0
+        self.periods = deque(maxlen=TIMING_SAMPLES)  # Seconds between consecutive ticks
+        self.latencies = deque(maxlen=TIMING_SAMPLES)  # Seconds between deadline and wake-up
+        self.compute_times = deque(maxlen=TIMING_SAMPLES)  # Seconds spent reading, computing and writing per tick
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def set_setpoint(self, channel: str, value: float):
+        self.setpoints[channel] = value
+
+    def set_enabled(self, channel: str, enabled: bool):
+        """
+        Hand a channel over to manual control (False) or back to its PID. A
+        disabled loop's output is switched off and its PID restarts cleanly.
+        """
+        self.enabled[channel] = enabled
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='control', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the loop, switch every output off and release the pins.
+        """
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+        for loop in self.loops:
+            self.session.set_duty(loop.pin, 0.0, loop.frequency)
+        self.session.close()
+
+    def run(self):
+        start = time.monotonic()
+        last = None
+        tick = 0
+        while not self.stopping.is_set():
+            deadline = start + tick * self.period
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.stopping.wait(delay):
+                break
+            now = time.monotonic()
+            self.latencies.append(now - deadline)
+            if last is not None:
+                self.periods.append(now - last)
+            try:
+                self.step(now - last if last is not None else self.period)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in control loop: {e}")
+            last = now
+            self.compute_times.append(time.monotonic() - now)
+            self.ticks += 1
+            tick += 1
+            behind = int((time.monotonic() - start) / self.period) + 1 - tick
+            if behind > 0:
+                self.overruns += behind
+                tick += behind
+
+    def step(self, dt: float):
+        self.measurements.update(self.driver.read([loop.channel for loop in self.loops]))
+        for loop in self.loops:
+            pid = self.pids[loop.channel]
+            if self.enabled[loop.channel]:
+                output = pid.update(self.setpoints[loop.channel], self.measurements[loop.channel], dt)
+            else:
+                pid.reset()
+                output = 0.0
+            self.outputs[loop.channel] = output
+            self.session.set_duty(loop.pin, output, loop.frequency)
+
+    def stats(self) -> dict:
+        """
+        Loop timing in milliseconds and the state of each loop. Jitter is how
+        far the time between ticks strayed from the period.
+        """
+        jitter = np.abs(np.array(self.periods) - self.period) * 1000
+        latency = np.array(self.latencies) * 1000
+        compute = np.array(self.compute_times) * 1000
+        percentile = lambda values, p: float(np.percentile(values, p)) if len(values) else 0.0
+        return {
+            'rate_hz': 1 / self.period,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'errors': self.errors,
+            'jitter_p50_ms': percentile(jitter, 50),
+            'jitter_p99_ms': percentile(jitter, 99),
+            'jitter_max_ms': float(jitter.max()) if len(jitter) else 0.0,
+            'latency_p99_ms': percentile(latency, 99),
+            'compute_p99_ms': percentile(compute, 99),
+            'loops': {loop.channel: {'setpoint': self.setpoints[loop.channel], 'value': self.measurements.get(loop.channel),
+                                     'output': self.outputs[loop.channel], 'enabled': self.enabled[loop.channel]} for loop in self.loops},
+        }
+
+
+class PlantDriver(SensorDriver):
+    """
+    Simulated plant for testing the control loops without hardware. Each
+    controlled channel is a first-order lag towards `base + gain * duty`, where
+    duty is the PWM duty cycle its loop set on the MockGPIO backend, plus
+    noise. The plant advances by the time elapsed since the previous read (times
+    `time_scale`), so it evolves the same however often it is read. The other
+    channels behave like RandomWalkDriver; the upper tank follows the lower one.
+
+    Parameters:
+    initial (dict): Starting value per channel.
+    backend (MockGPIO): GPIO backend the controller writes to.
+    loops (list): ControlLoop objects, for the pin of each channel.
+    time_scale (float): Plant seconds per wall-clock second.
+    seed (int): Seed of the noise.
+    """
+    # name -> (value at zero duty, change at full duty, time constant in s, noise per sqrt(s))
+    models = {
+        "lower tank temp": (10.0, -9.0, 120.0, 0.002),
+        "pressure": (23.0, 4.0, 10.0, 0.01),
+        "flow rate": (1.0, 2.0, 4.0, 0.005),
+        "pump speed": (0.0, 2.0, 1.5, 0.005),
+    }
+    channels = RandomWalkDriver.channels
+    simulated = True
+
+    def __init__(self, initial: dict, backend, loops, time_scale: float = 1.0, seed: int = None):
+        self.values = dict(initial)
+        self.backend = backend
+        self.pins = {loop.channel: loop.pin for loop in loops}
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.last = time.monotonic()
+
+    def advance(self):
+        now = time.monotonic()
+        dt = (now - self.last) * self.time_scale
+        self.last = now
+        if dt <= 0:
+            return
+        for name, (base, gain, tau, noise) in self.models.items():
+            duty = self.backend.duty_cycles.get(self.pins.get(name), 0.0) / 100
+            target = base + gain * duty
+            self.values[name] += (target - self.values[name]) * (1 - math.exp(-dt / tau)) + self.random.gauss(0, noise * math.sqrt(dt))
+        self.values["Upper tank temp"] += (self.values["lower tank temp"] - 1 - self.values["Upper tank temp"]) * (1 - math.exp(-dt / 600))
+
+    def read(self, names) -> dict:
+        with self.lock:
+            self.advance()
+            if "dissolved oxygen concentration" in names:
+                self.values["dissolved oxygen concentration"] = RandomWalkDriver.get_new_value(
+                    self.values["dissolved oxygen concentration"], *RandomWalkDriver.limits["dissolved oxygen concentration"])
+            self.values["C-box"] = self.values["lower tank temp"] + 4
+            return {name: round(self.values[name], 3) for name in names}
+
+    def set_value(self, name: str, value: float):
+        with self.lock:
+            self.advance()
+            self.values[name] = value
+
+
+def simulate(rate: float, seconds: float, loops=DEFAULT_LOOPS, time_scale: float = 1.0, seed: int = 0) -> dict:
+    """
+    Run the controller against the simulated plant in real time. The
+    setpoints step to 80 % of the way towards the other end of their range a
+    third of the way in; returns the loop stats and the final tracking errors.
+    """
+    loops = [ControlLoop(**loop) for loop in loops]
+    backend = MockGPIO()
+    initial = {name: value for name, value in zip(RandomWalkDriver.channels, (250, 24, 1.5, 0.5, 6, 7, 11, 25))}
+    plant = PlantDriver(initial, backend, loops, time_scale, seed)
+    controller = Controller(plant, loops, GPIOSession(backend), rate)
+    controller.start()
+    time.sleep(seconds / 3)
+    steps = {'lower tank temp': 4.0, 'pressure': 24.5, 'flow rate': 2.2, 'pump speed': 1.4}
+    for loop in loops:
+        controller.set_setpoint(loop.channel, steps.get(loop.channel, loop.setpoint))
+    time.sleep(seconds * 2 / 3)
+    stats = controller.stats()
+    controller.stop(timeout=1)
+    stats['pwm_updates'] = sum(1 for call in backend.calls if call[0] == 'pwm_duty')
+    return stats
+
+if __name__ == '__main__':
+    # python3 -m utils.control --rate 10 20 50 --seconds 30
+    parser = argparse.ArgumentParser(description='Run the control loops against the simulated plant and report loop timing.')
+    parser.add_argument('--rate', type=float, nargs='+', default=[CONTROL_RATE_HZ])
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Plant seconds per second')
+    args = parser.parse_args(sys.argv[1:])
+    for rate in args.rate:
+        stats = simulate(rate, args.seconds, time_scale=args.time_scale)
+        print(f"{rate:5.0f} Hz: {stats['ticks']} ticks, {stats['overruns']} overruns, {stats['errors']} errors, "
+              f"jitter p50 {stats['jitter_p50_ms']:.2f} p99 {stats['jitter_p99_ms']:.2f} max {stats['jitter_max_ms']:.2f} ms, "
+              f"wake-up p99 {stats['latency_p99_ms']:.2f} ms, compute p99 {stats['compute_p99_ms']:.3f} ms, {stats['pwm_updates']} PWM updates")
+        for channel, loop in stats['loops'].items():
+            print(f"    {channel:<16} setpoint {loop['setpoint']:7.2f}  value {loop['value']:7.3f}  error {loop['value'] - loop['setpoint']:+7.3f}  output {loop['output']:.2f}")
@@ -0,0 +1,93 @@
+import numpy as np
+from datetime import timedelta
+
+
+class MinMaxDecimator:
+    """
+    Reduce time series to about `points_per_pixel` points per horizontal pixel.
+
+    Samples are grouped into buckets aligned to multiples of the bucket width,
+    and every bucket is replaced by its minimum and maximum (in the order they
+    occurred), so spikes survive decimation. Buckets older than the newest one
+    are settled and cached, so each tick only reduces the samples appended
+    since the previous call.
+
+    Parameters:
+    points_per_pixel (int): Output points per pixel; min/max gives 2 per bucket.
+    """
+
+    def __init__(self, points_per_pixel: int = 2):
+        self.points_per_pixel = points_per_pixel
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the cached buckets, e.g. after the underlying history was reloaded.
+        """
+        self.width = None
+        self.channels = None
+        self.ids = np.empty(0, dtype=np.int64)  # Settled bucket ids
+        self.first = {}  # Per channel: value that occurred first in each settled bucket
+        self.second = {}  # Per channel: value that occurred last of the min/max pair
+
+    def decimate(self, times, columns, duration: timedelta, pixels: int):
+        """
+        Decimate a window of samples.
+
+        Parameters:
+        times (numpy.ndarray): datetime64 sample times, ascending.
+        columns (dict): Channel name -> values aligned with `times`.
+        duration (timedelta): Width of the x-axis window; sets the bucket width.
+        pixels (int): Horizontal size of the plot in pixels.
+
+        Returns:
+        tuple: (times, columns) with two points per bucket, or the inputs
+        unchanged when they are already small enough.
+        """
+        pixels = max(1, int(pixels))
+        if len(times) <= self.points_per_pixel * pixels:
+            return times, columns
+        t = np.asarray(times, dtype='datetime64[us]').view(np.int64)
+        width = max(1, int(duration / timedelta(microseconds=1)) // (pixels * self.points_per_pixel // 2))
+        newest = t[-1] // width
+        if width != self.width or list(columns) != self.channels or (len(self.ids) and self.ids[-1] >= newest):
+            self.reset()
+            self.width = width
+            self.channels = list(columns)
+
+        # Drop settled buckets that scrolled out of the window
+        keep = np.searchsorted(self.ids, t[0] // width)
+        self.ids = self.ids[keep:]
+        for name in self.channels:
+            self.first[name] = self.first.get(name, np.empty(0))[keep:]
+            self.second[name] = self.second.get(name, np.empty(0))[keep:]
+
+        # Only reduce the samples after the last settled bucket
+        tail = np.searchsorted(t, (self.ids[-1] + 1) * width) if len(self.ids) else 0
+        ids, first, second = self.reduce(t[tail:] // width, {name: np.asarray(values)[tail:] for name, values in columns.items()})
+
+        self.ids = np.concatenate((self.ids, ids[:-1]))
+        out_columns = {}
+        for name in self.channels:
+            self.first[name] = np.concatenate((self.first[name], first[name][:-1]))
+            self.second[name] = np.concatenate((self.second[name], second[name][:-1]))
+            pairs = (np.append(self.first[name], first[name][-1]), np.append(self.second[name], second[name][-1]))
+            out_columns[name] = np.column_stack(pairs).ravel()
+        centers = np.minimum(np.append(self.ids, ids[-1]) * width + width // 2, t[-1])
+        out_times = np.repeat(centers, 2).view('datetime64[us]')
+        return out_times, out_columns
+
+    @staticmethod
+    def reduce(ids, columns):
+        # Min/max of each run of equal bucket ids, ordered by occurrence
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+        ends = np.append(starts[1:], len(ids)) - 1
+        first, second = {}, {}
+        for name, values in columns.items():
+            order = np.lexsort((values, ids))  # Sort by bucket, then by value
+            imin = order[starts]
+            imax = order[ends]
+            min_first = imin <= imax
+            first[name] = np.where(min_first, values[imin], values[imax])
+            second[name] = np.where(min_first, values[imax], values[imin])
+        return ids[starts], first, second
@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from collections import deque
+from datetime import datetime
+from utils.acquisition import SensorDriver, SampleQueue, notify, HEADERS
+from utils.store import TimeSeriesStore
+from utils.segments import SegmentedCsvLogger, segment_name
+from utils.logger import SharedLogWriter
+from utils.alarms import AlarmEngine, AlarmRule, DEFAULT_RULES
+from utils.perf import process_usage
+from utils.simulator import FleetSimulator, FleetSource, FaultConfig
+from utils.service import ServiceClient, RemoteDriver, alarm_message
+
+INGEST_INTERVAL_S = 0.2  # How often the shared ingestion thread drains the unit queues
+STALE_AFTER_S = 30.0  # A unit without samples for this long is reported stale
+TIMING_SAMPLES = 1024  # Recent ingestion passes kept for stats()
+
+
+class UnitState:
+    """
+    Everything kept per unit in fleet mode: a bounded store, a logger on the
+    shared writer thread, an alarm engine without its own log, and the latest
+    sample. `lock` guards the store against the GUI thread reading it.
+    """
+
+    def __init__(self, name: str, channels, capacity: int, logger, rules):
+        self.name = name
+        self.store = TimeSeriesStore(channels, capacity)
+        self.logger = logger
+        self.alarms = AlarmEngine(channels, [AlarmRule(**rule) for rule in rules])
+        self.lock = threading.Lock()
+        self.latest = None
+        self.last_seen = None  # time.monotonic() of the last sample
+        self.samples = 0
+        self.subscribers = []  # Queues of the drill-down windows
+        self.listeners = []
+
+    def status(self, now: float, stale_after: float = STALE_AFTER_S) -> str:
+        if self.last_seen is None or now - self.last_seen > stale_after:
+            return 'stale'
+        return 'alarm' if self.alarms.active.any() else 'ok'
+
+
+class FleetIngest:
+    """
+    Shared ingestion for many units. One thread drains every unit's queue each
+    `interval`, appends to the unit's store, queues the log rows and checks the
+    alarms, and records which units changed; one SharedLogWriter thread writes
+    all the logs. The thread count stays constant as units are added, so CPU
+    and memory grow with the samples and the per-unit stores only.
+
+    Parameters:
+    source: Sample source with per-unit queues (`subscribe(maxlen, unit)`), e.g. FleetSource.
+    names (list): Unit names; logs go to `directory`/<name>/.
+    directory (str): Root of the per-unit log directories; None keeps no logs.
+    capacity (int): Samples kept in memory per unit.
+    rules (list): Alarm rules, as in DEFAULT_RULES.
+    drivers (list): Optional SensorDriver per unit, for setpoints from the drill-down view.
+    """
+
+    def __init__(self, source, names, directory: str = None, capacity: int = 720, rules=DEFAULT_RULES, drivers=None,
+                 interval: float = INGEST_INTERVAL_S, **log_options):
+        self.source = source
+        self.drivers = drivers
+        self.interval = interval
+        self.writer = SharedLogWriter() if directory else None
+        if directory:
+            raise_file_limit(2 * len(names) + 64)  # Segment and index file per unit
+        self.units = []
+        self.queues = []
+        now = datetime.now()
+        for i, name in enumerate(names):
+            logger = None
+            if directory:
+                os.makedirs(os.path.join(directory, name), exist_ok=True)
+                logger = SegmentedCsvLogger(os.path.join(directory, name, segment_name(now)), HEADERS, shared_writer=self.writer, **log_options)
+            self.units.append(UnitState(name, HEADERS[2:], capacity, logger, rules))
+            self.queues.append(source.subscribe(unit=i))
+        self.changed = set()
+        self.changed_lock = threading.Lock()
+        self.samples = 0
+        self.passes = 0
+        self.busy = 0.0
+        self.pass_times = deque(maxlen=TIMING_SAMPLES)  # Seconds per ingestion pass
+        self.started = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='fleet-ingest', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.ingest_all()
+        self.ingest_all()
+
+    def ingest_all(self):
+        start = time.perf_counter()
+        changed = []
+        for i, queue in enumerate(self.queues):
+            batch = queue.drain()
+            if batch:
+                self.ingest(self.units[i], batch)
+                changed.append(i)
+        if changed:
+            with self.changed_lock:
+                self.changed.update(changed)
+        elapsed = time.perf_counter() - start
+        self.busy += elapsed
+        self.passes += 1
+        self.pass_times.append(elapsed)
+
+    def ingest(self, unit, batch):
+        with unit.lock:
+            for sample in batch:
+                idx, sample_time, values = sample
+                unit.store.append(idx, sample_time, values)
+                if unit.logger:
+                    unit.logger.log([idx, sample_time] + values)
+                unit.alarms.check(sample)
+                if unit.listeners:
+                    notify(unit.listeners, sample)
+                for queue in unit.subscribers:
+                    queue.put(sample)
+            unit.latest = batch[-1]
+            unit.last_seen = time.monotonic()
+            unit.samples += len(batch)
+        self.samples += len(batch)
+
+    def restore(self, unit: int, idx, times, values):
+        """
+        Seed a unit's store with history received from its source (e.g. a
+        service snapshot). The rows are not logged or checked for alarms
+        again, and the unit stays stale until its first live sample.
+        """
+        state = self.units[unit]
+        with state.lock:
+            state.store.extend(idx, times, values)
+            state.latest = state.store.last_row()
+        with self.changed_lock:
+            self.changed.add(unit)
+
+    def take_changed(self) -> set:
+        """
+        Units that received samples since the previous call.
+        """
+        with self.changed_lock:
+            changed, self.changed = self.changed, set()
+        return changed
+
+    def set_value(self, unit: int, name: str, value: float):
+        if self.drivers:
+            self.drivers[unit].set_value(name, value)
+
+    def stop(self, timeout: float = None):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+        for unit in self.units:
+            if unit.logger:
+                unit.logger.close(timeout)
+        if self.writer:
+            self.writer.close(timeout)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 1e-9
+        pass_ms = np.array(self.pass_times) * 1000
+        logs = [unit.logger.stats() for unit in self.units if unit.logger]
+        return {
+            'units': len(self.units),
+            'samples': self.samples,
+            'samples_per_s': self.samples / elapsed,
+            'busy': self.busy / elapsed,  # Share of one core spent ingesting
+            'pass_p99_ms': float(np.percentile(pass_ms, 99)) if len(pass_ms) else 0.0,
+            'dropped': sum(queue.dropped for queue in self.queues),
+            'log_rows_dropped': sum(log['rows_dropped'] for log in logs),
+            'alarming': sum(bool(unit.alarms.active.any()) for unit in self.units),
+        }
+
+
+class FleetUnitClient:
+    """
+    One fleet unit with the interface of ServiceClient, so the single-unit
+    MainWindow can open it as a drill-down view: the snapshot is the unit's
+    store, the deltas come from the shared ingestion thread, and setpoints go
+    to the unit's driver. The snapshot and the subscription are taken under
+    the unit lock, so no sample falls between them.
+    """
+
+    def __init__(self, ingest: FleetIngest, unit: int, maxlen: int = 10000):
+        self.ingest = ingest
+        self.unit = unit
+        state = ingest.units[unit]
+        self.socket_path = state.name  # Shown where the GUI names its data source
+        self.headers = HEADERS
+        self.control = None  # No control loops in fleet mode
+        self.queue = SampleQueue(maxlen)
+        self.listeners = []
+        self.actuator_listeners = []
+        self.alarm_listeners = []
+        with state.lock:
+            self.idx, self.times, columns = state.store.last()
+            self.idx, self.times = self.idx.copy(), self.times.copy()
+            self.values = np.column_stack([columns[name] for name in state.store.channels])
+            self.alarms = [{'rule': rule.name, 'channel': rule.channel, 'severity': rule.severity} for rule in state.alarms.active_rules()]
+            state.subscribers.append(self.queue)
+            state.alarms.listeners.append(self.on_alarm)
+
+    def on_alarm(self, event):
+        notify(self.alarm_listeners, alarm_message(event))
+
+    def subscribe(self, maxlen: int = 10000) -> SampleQueue:
+        return self.queue
+
+    def add_listener(self, callback):
+        state = self.ingest.units[self.unit]
+        with state.lock:
+            state.listeners.append(callback)
+        self.listeners.append(callback)
+
+    def start(self, next_idx: int = 1):
+        pass  # The fleet is already running
+
+    def stop(self, timeout: float = None):
+        state = self.ingest.units[self.unit]
+        with state.lock:
+            if self.queue in state.subscribers:
+                state.subscribers.remove(self.queue)
+            for callback in self.listeners:
+                if callback in state.listeners:
+                    state.listeners.remove(callback)
+            if self.on_alarm in state.alarms.listeners:
+                state.alarms.listeners.remove(self.on_alarm)
+
+    def send(self, message: dict):
+        if message.get('cmd') == 'set':
+            self.ingest.set_value(self.unit, message['channel'], message['value'])
+        elif message.get('cmd') == 'actuate':
+            for listener in self.actuator_listeners:
+                listener({'name': message['name'], 'pin': message['pin'], 'action': message['action'], 'state': 'failed',
+                          'message': 'Actuators are not available in fleet mode'})
+
+    def stats(self) -> dict:
+        return {'samples': self.ingest.units[self.unit].samples, 'dropped': self.queue.dropped}
+
+
+class ServiceFleetSource:
+    """
+    Fleet source for real units: one ServiceClient per unit's acquisition
+    service (python3 -m utils.service), with the per-unit `subscribe` of
+    FleetSource, so FleetIngest treats both alike. Every client reads its
+    socket on its own thread. A unit whose service cannot be reached stays
+    stale. Setpoints from the drill-down view go to the unit's service
+    through `drivers`.
+
+    Parameters:
+    sockets (list): Unix socket of every unit's service.
+    rate (float): Samples per second the units are expected to send, for the stale check.
+    timeout (float): Seconds to wait for each connection and snapshot.
+    """
+
+    def __init__(self, sockets, rate: float = 0.2, timeout: float = 10.0):
+        self.rate = rate
+        self.names = unit_names(sockets)
+        self.clients = []
+        for socket_path in sockets:
+            try:
+                client = ServiceClient(socket_path, timeout)
+                if client.headers != HEADERS:
+                    raise ValueError(f"it sends {client.headers[2:]}")
+            except (OSError, ValueError) as e:
+                print(f"Error attaching to the acquisition service at {socket_path}: {e}")
+                client = None
+            self.clients.append(client)
+        self.drivers = [RemoteDriver(client) if client else SensorDriver() for client in self.clients]
+        self.offline = [SampleQueue(1) for _ in self.clients]  # Never filled
+
+    def subscribe(self, maxlen: int = 10000, unit: int = 0) -> SampleQueue:
+        client = self.clients[unit]
+        return client.subscribe(maxlen) if client else self.offline[unit]
+
+    def add_listener(self, callback, unit: int = 0):
+        if self.clients[unit]:
+            self.clients[unit].add_listener(callback)
+
+    def restore(self, ingest):
+        """
+        Seed the stores of `ingest` with the snapshot every service sent on connect.
+        """
+        for unit, client in enumerate(self.clients):
+            if client and len(client.idx):
+                ingest.restore(unit, client.idx, client.times, client.values)
+
+    def start(self, next_idx=None):
+        # next_idx is ignored: every service numbers its own samples
+        for client in self.clients:
+            if client:
+                client.start()
+
+    def stop(self, timeout: float = None):
+        for client in self.clients:
+            if client:
+                client.stop(timeout)
+
+    def stats(self) -> dict:
+        stats = [client.stats() for client in self.clients if client]
+        return {
+            'connected': sum(stat['connected'] for stat in stats),
+            'samples': sum(stat['samples'] for stat in stats),
+            'dropped': sum(stat['dropped'] for stat in stats),
+        }
+
+
+def unit_names(sockets) -> list:
+    """
+    Unit names from the service sockets: the file name without its
+    extension, or the position in the list where those are not unique.
+    """
+    names = [os.path.splitext(os.path.basename(path))[0] for path in sockets]
+    if len(set(names)) < len(names):
+        names = [f'unit{i + 1:04d}' for i in range(len(sockets))]
+    return names
+
+
+def raise_file_limit(needed: int):
+    """
+    Raise the soft limit on open files up to the hard limit when `needed`
+    descriptors would not fit (the default soft limit is often 1024).
+    """
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < needed:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else min(needed, hard), hard))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Could not raise the open file limit to {needed}: {e}")
+
+
+def simulated_fleet(n_units: int, rate: float, faults: FaultConfig = None, seed: int = None):
+    """
+    FleetSimulator, FleetSource and unit names for a simulated fleet.
+    """
+    simulator = FleetSimulator(n_units, drift=0.01, faults=faults, seed=seed)
+    return simulator, FleetSource(simulator, rate), [f'unit{i + 1:04d}' for i in range(n_units)]
+
+
+def benchmark(n_units: int, rate: float, seconds: float, directory: str = None, capacity: int = 720) -> dict:
+    """
+    Run a simulated fleet through the shared ingestion for `seconds` and
+    report its CPU, memory and thread count.
+    """
+    workdir = directory or tempfile.mkdtemp(prefix='sow_fleet_')
+    before = process_usage()
+    threads_before = threading.active_count()
+    simulator, source, names = simulated_fleet(n_units, rate, FaultConfig(dropout=1e-4, stuck=1e-4, spike=1e-3), seed=0)
+    ingest = FleetIngest(source, names, workdir, capacity, drivers=[simulator.driver(i) for i in range(n_units)], fsync_interval=None)
+    source.start()
+    ingest.start()
+    time.sleep(seconds)
+    stats = ingest.stats()
+    threads = threading.active_count() - threads_before
+    source.stop(timeout=5)
+    ingest.stop(timeout=5)
+    after = process_usage()
+    stats.update({
+        'requested_samples_per_s': n_units * rate,
+        'overruns': source.overruns,
+        'threads': threads,
+        'cpu_percent': (after['cpu_s'] - before['cpu_s']) / seconds * 100,
+        'rss_mb': after['rss_mb'],
+        'rss_per_unit_kb': (after['rss_mb'] - before['rss_mb']) * 1024 / n_units,
+    })
+    if not directory:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return stats
+
+if __name__ == '__main__':
+    # python3 -m utils.fleet --units 100 500 1000 --rate 0.2 10 --seconds 10
+    parser = argparse.ArgumentParser(description='Measure the shared fleet ingestion with simulated units.')
+    parser.add_argument('--units', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--rate', type=float, nargs='+', default=[0.2, 10])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(sys.argv[1:])
+    if args.child:
+        json.dump(benchmark(args.units[0], args.rate[0], args.seconds), sys.stdout)
+        sys.exit(0)
+    for units in args.units:
+        for rate in args.rate:
+            # One process per case, so the memory per unit is measured from a clean heap
+            child = subprocess.run([sys.executable, '-m', 'utils.fleet', '--child', '--units', str(units), '--rate', str(rate), '--seconds', str(args.seconds)],
+                                   capture_output=True, text=True)
+            if child.returncode:
+                print(child.stderr, file=sys.stderr)
+                sys.exit(child.returncode)
+            stats = json.loads(child.stdout)
+            print(f"{units:5d} units x {rate:5g} Hz: {stats['samples_per_s']:7.0f}/{stats['requested_samples_per_s']:.0f} samples/s, "
+                  f"{stats['overruns']} overruns, {stats['dropped']} dropped, ingest {stats['busy'] * 100:4.1f}% busy "
+                  f"(pass p99 {stats['pass_p99_ms']:.1f} ms), {stats['threads']} threads, CPU {stats['cpu_percent']:5.1f}%, "
+                  f"RSS {stats['rss_mb']:.0f} MB ({stats['rss_per_unit_kb']:.0f} kB/unit)")
@@ -1,5 +1,10 @@
-import RPi.GPIO as GPIO
 import time
+import threading
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # Not running on a Raspberry Pi
+    GPIO = None
 
 def blink_led(gpio_number: int, switch_time: float = 3, mode: str = 'BCM'):
     """
@@ -35,5 +40,164 @@ def blink_led(gpio_number: int, switch_time: float = 3, mode: str = 'BCM'):
         GPIO.cleanup()
         print("GPIO cleaned up.")
 
+class MockGPIO:
+    """
+    Stand-in for the RPi.GPIO module that records every call, so the actuator
+    path can run and be tested on machines without GPIO pins.
+    """
+    BCM = 'BCM'
+    BOARD = 'BOARD'
+    OUT = 'OUT'
+    IN = 'IN'
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}  # pin -> last output level
+        self.duty_cycles = {}  # pin -> duty cycle in percent of the running PWM
+        self.calls = []
+
+    def setmode(self, mode):
+        self.calls.append(('setmode', mode))
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        self.calls.append(('setwarnings', flag))
+
+    def setup(self, pin, direction):
+        self.calls.append(('setup', pin, direction))
+        self.pins.setdefault(pin, self.LOW)
+
+    def output(self, pin, level):
+        if pin not in self.pins:
+            raise RuntimeError(f"GPIO pin {pin} is not set up as an output.")
+        self.calls.append(('output', pin, level))
+        self.pins[pin] = level
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def PWM(self, pin, frequency):
+        if pin not in self.pins:
+            raise RuntimeError(f"GPIO pin {pin} is not set up as an output.")
+        return MockPWM(self, pin, frequency)
+
+    def cleanup(self, channel=None):
+        self.calls.append(('cleanup',) if channel is None else ('cleanup', channel))
+        if channel is None:
+            self.pins.clear()
+            self.duty_cycles.clear()
+            return
+        for pin in channel if isinstance(channel, (list, tuple)) else [channel]:
+            self.pins.pop(pin, None)
+            self.duty_cycles.pop(pin, None)
+
+class MockPWM:
+    """
+    Stand-in for RPi.GPIO.PWM; the running duty cycle is kept in the
+    backend's `duty_cycles`, where the simulated plant reads it.
+    """
+
+    def __init__(self, backend, pin, frequency):
+        self.backend = backend
+        self.pin = pin
+        self.frequency = frequency
+
+    def start(self, duty_cycle):
+        self.backend.calls.append(('pwm_start', self.pin, duty_cycle))
+        self.backend.duty_cycles[self.pin] = duty_cycle
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.backend.calls.append(('pwm_duty', self.pin, duty_cycle))
+        self.backend.duty_cycles[self.pin] = duty_cycle
+
+    def ChangeFrequency(self, frequency):
+        self.backend.calls.append(('pwm_frequency', self.pin, frequency))
+        self.frequency = frequency
+
+    def stop(self):
+        self.backend.calls.append(('pwm_stop', self.pin))
+        self.backend.duty_cycles.pop(self.pin, None)
+
+class GPIOSession:
+    """
+    Long-lived GPIO session: the numbering mode is set once, pins are set up
+    the first time they are used and everything is cleaned up in `close`,
+    instead of on every call like `blink_led`. `close` only releases the pins
+    of this session, so several sessions can share one backend.
+
+    Parameters:
+    backend: Module-like GPIO backend (RPi.GPIO or MockGPIO). Defaults to RPi.GPIO.
+    mode (str): GPIO pin numbering mode ('BCM' or 'BOARD').
+    switch_time (float): Time in seconds to hold each level in `pulse`.
+    """
+
+    def __init__(self, backend=None, mode: str = 'BCM', switch_time: float = 3):
+        self.gpio = backend if backend is not None else GPIO
+        if self.gpio is None:
+            raise RuntimeError("RPi.GPIO is not available, use MockGPIO instead.")
+        if mode not in ('BCM', 'BOARD'):
+            raise ValueError("Invalid mode. Use 'BCM' or 'BOARD'.")
+        self.switch_time = switch_time
+        self.lock = threading.Lock()
+        self.outputs = set()
+        self.pwms = {}  # pin -> (PWM object, duty cycle in percent)
+        self.closed = False
+        self.gpio.setmode(getattr(self.gpio, mode))
+
+    def setup_output(self, pin: int):
+        # Called with the lock held, so a closed session never sets a pin up again
+        if self.closed:
+            raise RuntimeError(f"GPIO session is closed, pin {pin} not driven.")
+        if pin not in self.outputs:
+            self.gpio.setup(pin, self.gpio.OUT)
+            self.outputs.add(pin)
+
+    def set(self, pin: int, on: bool):
+        with self.lock:
+            self.setup_output(pin)
+            self.gpio.output(pin, self.gpio.HIGH if on else self.gpio.LOW)
+
+    def pulse(self, pin: int):
+        # Same LOW -> HIGH sequence as blink_led, without the setup/cleanup
+        with self.lock:
+            self.setup_output(pin)
+            self.gpio.output(pin, self.gpio.LOW)
+            time.sleep(self.switch_time)
+            self.gpio.output(pin, self.gpio.HIGH)
+            time.sleep(self.switch_time)
+
+    def set_duty(self, pin: int, duty: float, frequency: float = 100.0):
+        """
+        Drive `pin` with software PWM at `duty` (0-1). At low frequencies this
+        time-proportions relay outputs, e.g. 0.2 Hz switches a chiller within
+        5 s windows. The backend is only called when the duty cycle changes.
+        """
+        duty_cycle = round(min(max(duty, 0.0), 1.0) * 100, 1)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"GPIO session is closed, pin {pin} not driven.")
+            if pin in self.pwms:
+                pwm, current = self.pwms[pin]
+                if duty_cycle != current:
+                    pwm.ChangeDutyCycle(duty_cycle)
+                    self.pwms[pin] = (pwm, duty_cycle)
+                return
+            self.setup_output(pin)
+            pwm = self.gpio.PWM(pin, frequency)
+            pwm.start(duty_cycle)
+            self.pwms[pin] = (pwm, duty_cycle)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for pwm, _ in self.pwms.values():
+                pwm.stop()
+            self.pwms.clear()
+            if self.outputs:
+                self.gpio.cleanup(sorted(self.outputs))
+            self.outputs.clear()
+
 if __name__ == '__main__':
     blink_led(18)
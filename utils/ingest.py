@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import time
+import numpy as np
+
+LOG_PATTERN = re.compile(r'^sow_data_\d{8}_\d{6}\.(csv|sowlog)$')
+TAIL_BLOCK_BYTES = 1 << 16
+
+
+def find_latest_log(directory: str = '.', extension: str = 'csv'):
+    """
+    Return the newest sow_data_YYYYmmdd_HHMMSS.<extension> in `directory`, or None.
+    The timestamp in the name sorts chronologically.
+    """
+    names = [name for name in os.listdir(directory or '.') if LOG_PATTERN.match(name) and name.endswith('.' + extension)]
+    return os.path.join(directory, max(names)) if names else None
+
+
+def read_tail_lines(path: str, max_lines: int):
+    """
+    Read the last `max_lines` complete lines of a file by scanning backwards
+    from the end, without reading the rest. An unterminated last line is
+    ignored. Returns (lines as bytes, True if the whole file was read).
+    """
+    with open(path, 'rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        while position > 0 and newlines <= max_lines:
+            step = min(TAIL_BLOCK_BYTES, position)
+            position -= step
+            file.seek(position)
+            blocks.append(file.read(step))
+            newlines += blocks[-1].count(b'\n')
+    lines = b''.join(reversed(blocks)).split(b'\n')
+    lines.pop()  # Unterminated last line, or the empty string after the final newline
+    whole_file = position == 0
+    if not whole_file:
+        lines = lines[1:]  # The first line may have been cut by the block boundary
+    return lines[-max_lines:] if max_lines else [], whole_file
+
+
+def parse_csv_lines(lines, n_channels: int):
+    """
+    Vectorized parse of CSV log lines (idx, datetime, channels...).
+
+    Returns:
+    tuple: (int64 idx, datetime64[us] times, float64 values of shape (rows, n_channels))
+    """
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return np.empty(0, np.int64), np.empty(0, 'datetime64[us]'), np.empty((0, n_channels))
+    dtype = np.dtype([('idx', np.int64), ('time', 'datetime64[us]'), ('values', np.float64, (n_channels,))])
+    records = np.loadtxt(lines, delimiter=',', dtype=dtype, ndmin=1)  # One pass in numpy's C parser
+    return records['idx'], records['time'], records['values']
+
+
+def read_csv_tail(path: str, max_rows: int):
+    """
+    Load the newest `max_rows` rows of a CSV log.
+
+    Returns:
+    tuple: (headers, idx, times, values)
+    """
+    with open(path, 'r') as file:
+        headers = file.readline().strip().split(',')
+    lines, whole_file = read_tail_lines(path, max_rows + 1)  # One more, in case the header is among them
+    if whole_file and lines:
+        lines = lines[1:]  # Header
+    lines = lines[-max_rows:] if max_rows else []
+    idx, times, values = parse_csv_lines(lines, len(headers) - 2)
+    return headers, idx, times, values
+
+
+def iter_csv_chunks(path: str, chunk_rows: int = 10000):
+    """
+    Yield (headers, idx, times, values) chunks of a CSV log from the start,
+    parsing `chunk_rows` lines at a time.
+    """
+    with open(path, 'rb') as file:
+        headers = file.readline().decode().strip().split(',')
+        while True:
+            lines = [line for _, line in zip(range(chunk_rows), file)]
+            if not lines:
+                break
+            if not lines[-1].endswith(b'\n'):
+                lines.pop()  # Torn last line
+            idx, times, values = parse_csv_lines([line.rstrip(b'\r\n') for line in lines], len(headers) - 2)
+            if len(idx):
+                yield headers, idx, times, values
+
+if __name__ == '__main__':
+    # Time a restore of the newest rows of a log, e.g. a generated 1M-row file
+    path = sys.argv[1]
+    max_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 17280
+    start = time.perf_counter()
+    headers, idx, times, values = read_csv_tail(path, max_rows)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(idx)} rows ({times[0] if len(times) else '-'} .. {times[-1] if len(times) else '-'}) from {path} in {elapsed * 1000:.1f} ms")
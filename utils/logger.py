@@ -0,0 +1,236 @@
+import os
+import csv
+import time
+import threading
+import numpy as np
+from collections import deque
+from utils.perf import timed
+
+FLUSH_TIME_SAMPLES = 256  # Recent flush latencies kept for stats()
+
+
+def recover_csv(path: str) -> int:
+    """
+    Cut a torn last line (left by a crash or power loss) off a CSV file.
+
+    Returns:
+    int: Number of bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        file.seek(size - 1)
+        if file.read(1) == b'\n':
+            return 0
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            file.seek(position - step)
+            chunk = file.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        file.truncate(position)
+        return size - position
+
+
+class CsvLogger:
+    """
+    Write-behind CSV logger.
+
+    Rows are queued by `log` and written by a background thread through one
+    open file handle. A batch is flushed when `batch_rows` rows are queued or
+    the oldest queued row is `max_age` seconds old. A torn last line from a
+    previous crash is cut off when the file is opened.
+
+    Parameters:
+    path (str): CSV file; created with `headers` when missing or empty.
+    headers (list): Column names; rows are [idx, datetime, values...].
+    batch_rows (int): Queued rows that trigger a flush.
+    max_age (float): Maximum seconds a row waits in the queue.
+    fsync_interval (float): None never fsyncs, 0 fsyncs every flush, N fsyncs at most every N seconds.
+    max_queue (int): Rows kept when the writer falls behind; older rows are dropped and counted.
+    shared_writer (SharedLogWriter): Flush from this shared thread instead of starting one per logger.
+    """
+
+    def __init__(self, path, headers, batch_rows: int = 50, max_age: float = 5.0, fsync_interval: float = 0, max_queue: int = 100000,
+                 shared_writer=None):
+        self.path = path
+        self.headers = list(headers)
+        self.batch_rows = batch_rows
+        self.max_age = max_age
+        self.fsync_interval = fsync_interval
+        self.queue = deque(maxlen=max_queue)
+        self.shared_writer = shared_writer
+        self.wake = shared_writer.wake if shared_writer else threading.Event()
+        self.stopping = threading.Event()
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.recovered_bytes = 0
+        self.flush_times = deque(maxlen=FLUSH_TIME_SAMPLES)
+        self.last_fsync = 0.0
+        self.file = self.open()
+        if shared_writer:
+            self.thread = None
+            shared_writer.add(self)
+            return
+        self.thread = threading.Thread(target=self.run, name='logger', daemon=True)
+        self.thread.start()
+
+    def open(self):
+        self.recovered_bytes = recover_csv(self.path)
+        if self.recovered_bytes:
+            print(f"Recovered {self.path}: dropped a truncated last line ({self.recovered_bytes} bytes).")
+        file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(file)
+        if file.tell() == 0:
+            self.writer.writerow(self.headers)
+            file.flush()
+        return file
+
+    def write_rows(self, batch) -> int:
+        # Returns the number of bytes written
+        before = self.file.tell()
+        self.writer.writerows([row[0], row[1].strftime('%Y-%m-%d %H:%M:%S.%f')] + list(row[2:]) for row in batch)
+        return self.file.tell() - before
+
+    def log(self, row):
+        if len(self.queue) == self.queue.maxlen:
+            self.rows_dropped += 1
+        self.queue.append((time.monotonic(), row))
+        if len(self.queue) >= self.batch_rows:
+            self.wake.set()
+
+    def run(self):
+        while not self.stopping.is_set():
+            timeout = self.max_age
+            if self.queue:
+                timeout = max(0.0, self.queue[0][0] + self.max_age - time.monotonic())
+            self.wake.wait(timeout)
+            self.wake.clear()
+            if self.due():
+                self.flush()
+        self.flush()
+        self.close_files()  # Only stopped by close(), which leaves the files to this thread while it runs
+
+    def due(self) -> bool:
+        return bool(self.queue) and (len(self.queue) >= self.batch_rows or time.monotonic() - self.queue[0][0] >= self.max_age)
+
+    @timed('log flush')
+    def flush(self):
+        batch = []
+        while self.queue:
+            batch.append(self.queue.popleft()[1])
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            written = self.write_rows(batch)
+            self.file.flush()
+            if self.fsync_interval is not None and time.monotonic() - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_fsync = time.monotonic()
+            self.bytes_written += written
+            self.rows_written += len(batch)
+            self.flushes += 1
+        except Exception as e:
+            print(f"Error saving to log file {self.path}: {e}")
+        self.flush_times.append(time.perf_counter() - start)
+
+    def close(self, timeout: float = None):
+        """
+        Write everything still queued and close the file. If the writer
+        thread is still busy after `timeout`, it closes the file when it
+        finishes instead.
+        """
+        if self.shared_writer:
+            self.shared_writer.remove(self)  # Flushes what is queued
+        else:
+            self.stopping.set()
+            self.wake.set()
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                return
+        self.close_files()
+
+    def close_files(self):
+        self.file.close()
+
+    def stats(self) -> dict:
+        flush_ms = np.array(self.flush_times) * 1000
+        return {
+            'rows_written': self.rows_written,
+            'bytes_written': self.bytes_written,
+            'rows_dropped': self.rows_dropped,
+            'queue_depth': len(self.queue),
+            'flushes': self.flushes,
+            'flush_p50_ms': float(np.percentile(flush_ms, 50)) if len(flush_ms) else 0.0,
+            'flush_max_ms': float(flush_ms.max()) if len(flush_ms) else 0.0,
+        }
+
+
+class SharedLogWriter:
+    """
+    One background thread that flushes many CsvLoggers, for processes that
+    log hundreds of units. Pass it as `shared_writer`; every logger keeps its
+    own file, queue and batching rules, but they share the thread and its wake
+    event, so adding a unit adds no thread.
+
+    Parameters:
+    poll (float): Longest sleep when no logger has rows queued.
+    """
+
+    def __init__(self, poll: float = 1.0):
+        self.poll = poll
+        self.loggers = []
+        self.lock = threading.Lock()  # Held while flushing, so remove() never races a flush
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='log-writer', daemon=True)
+        self.thread.start()
+
+    def add(self, logger):
+        with self.lock:
+            self.loggers.append(logger)
+        self.wake.set()
+
+    def remove(self, logger):
+        with self.lock:
+            if logger in self.loggers:
+                self.loggers.remove(logger)
+            logger.flush()
+
+    def next_timeout(self) -> float:
+        now = time.monotonic()
+        oldest = [logger.queue[0][0] + logger.max_age - now for logger in self.loggers if logger.queue]
+        return max(0.0, min(oldest)) if oldest else self.poll
+
+    def run(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                timeout = self.next_timeout()
+            self.wake.wait(timeout)
+            self.wake.clear()
+            with self.lock:
+                for logger in self.loggers:
+                    if logger.due():
+                        logger.flush()
+
+    def close(self, timeout: float = None):
+        """
+        Stop the thread; loggers still registered are flushed, not closed.
+        """
+        self.stopping.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        with self.lock:
+            for logger in self.loggers:
+                logger.flush()
@@ -0,0 +1,170 @@
+import time
+import numpy as np
+import matplotlib
+matplotlib.use('Qt5Agg')  # Set the backend to Qt5Agg
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.ticker import MaxNLocator
+from datetime import datetime, timedelta
+from collections import deque
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from utils.perf import timed
+
+
+class TimeSeriesGraph(QWidget):
+    """
+    Matplotlib time-series graph, the fallback of the native PainterGraph.
+    Lives in its own module so the matplotlib import is only paid when this
+    backend is used.
+
+    Parameters:
+    blit (bool): Blitted incremental rendering, or full redraw every tick.
+    headroom (float): Fraction of the x/y range kept free so most ticks only need a blit.
+    draw_time_samples (int): Number of recent update_plot timings kept for draw_stats.
+    """
+
+    def __init__(self, blit: bool = True, headroom: float = 0.1, draw_time_samples: int = 100):
+        super().__init__()
+        self.blit = blit
+        self.headroom = headroom
+        self.draw_time_samples = draw_time_samples
+        self.initUI()
+
+    def initUI(self):
+        self.figure, self.ax = plt.subplots()
+        self.canvas = FigureCanvas(self.figure)
+        self.canvas.draw = timed('canvas.draw')(self.canvas.draw)
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        self.xlim_duration = timedelta(minutes=10)  # Default xlim duration
+        self.ax.set_xlim(datetime.now(), datetime.now() + self.xlim_duration)
+        self.times = []
+        self.data = {}
+        self.lines = {}
+        self.background = None  # Cached canvas without the animated lines
+        self.static_dirty = True  # Axes, legend and ticks need to be rebuilt
+        self.last_plot_args = None
+        self.draw_times = deque(maxlen=self.draw_time_samples)  # Seconds spent per update_plot call
+        self.static_redraws = 0
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+    def plot_width(self):
+        return self.canvas.width()
+
+    @timed('update_plot')
+    def update_plot(self, times, data, units, multipliers):
+        if len(times) == 0:
+            return  # Return if there are no times to plot
+        start = time.perf_counter()
+        self.times = times
+        self.last_plot_args = (times, data, units, multipliers)
+        if self.blit:
+            self.update_plot_blit(times, data, units, multipliers)
+        else:
+            self.update_plot_full(times, data, units, multipliers)
+        self.draw_times.append(time.perf_counter() - start)
+
+    def update_plot_full(self, times, data, units, multipliers):
+        self.ax.clear()
+        for label, values in data.items():
+            unit = units.get(label, '')
+            multiplier = multipliers.get(label, 1)
+            self.ax.plot(times, values * multiplier, label=f'{label} (x{multiplier} {unit})')
+        self.ax.set_xlim(times[-1] - self.xlim_duration, times[-1])
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        self.ax.xaxis.set_major_locator(MaxNLocator(nbins=5))
+        if data:
+            self.ax.legend(loc='upper left')
+        self.canvas.draw()
+
+    def update_plot_blit(self, times, data, units, multipliers):
+        x = mdates.date2num(times)
+        series = {label: values * multipliers.get(label, 1) for label, values in data.items()}
+        if self.needs_static_redraw(x, series):
+            self.redraw_static(x, series, units, multipliers)
+            return
+        for label, line in self.lines.items():
+            line.set_data(x, series[label])
+        self.canvas.restore_region(self.background)
+        self.draw_lines()
+        self.canvas.blit(self.ax.bbox)
+
+    def needs_static_redraw(self, x, series):
+        if self.static_dirty or self.background is None or list(series) != list(self.lines):
+            return True
+        xmin, xmax = self.ax.get_xlim()
+        if x[-1] > xmax:
+            return True  # The newest sample scrolled past the right edge
+        ymin, ymax = self.ax.get_ylim()
+        return any(len(y) and not ymin <= y[-1] <= ymax for y in series.values())
+
+    def redraw_static(self, x, series, units, multipliers):
+        # Rebuild axes, legend and ticks with one animated line per series. The
+        # x-axis keeps some headroom so most ticks only need a blit.
+        self.ax.clear()
+        self.lines = {}
+        for label, y in series.items():
+            unit = units.get(label, '')
+            multiplier = multipliers.get(label, 1)
+            self.lines[label], = self.ax.plot(x, y, label=f'{label} (x{multiplier} {unit})', animated=True)
+        span = self.xlim_duration / timedelta(days=1)  # Matplotlib dates are in days
+        xmax = x[-1] + span * self.headroom
+        xmin = xmax - span
+        self.ax.set_xlim(xmin, xmax)
+        self.ax.set_ylim(*self.visible_ylim(x, series, xmin))
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        self.ax.xaxis.set_major_locator(MaxNLocator(nbins=5))
+        if series:
+            self.ax.legend(loc='upper left')
+        self.static_dirty = False
+        self.static_redraws += 1
+        self.canvas.draw()  # The draw_event handler caches the background and draws the lines
+
+    def visible_ylim(self, x, series, xmin):
+        first = np.searchsorted(x, xmin)
+        visible = [y[first:] for y in series.values() if len(y[first:])]
+        if not visible:
+            return 0, 1
+        low = min(y.min() for y in visible)
+        high = max(y.max() for y in visible)
+        pad = (high - low) * self.headroom or 1
+        return low - pad, high + pad
+
+    def on_draw(self, event):
+        if not self.blit:
+            return
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def draw_stats(self):
+        # Summary of the recent update_plot timings, in milliseconds
+        if not self.draw_times:
+            return {}
+        times_ms = np.array(self.draw_times) * 1000
+        return {
+            'mode': 'blit' if self.blit else 'full',
+            'ticks': len(times_ms),
+            'mean_ms': float(times_ms.mean()),
+            'max_ms': float(times_ms.max()),
+            'last_ms': float(times_ms[-1]),
+            'static_redraws': self.static_redraws,
+        }
+
+    def set_xlim_duration(self, duration, redraw=True):
+        self.xlim_duration = duration
+        self.static_dirty = True
+        if not redraw:
+            return  # The caller plots the new window itself
+        if self.blit:
+            if self.last_plot_args:
+                self.update_plot(*self.last_plot_args)
+        elif len(self.times):
+            self.ax.set_xlim(self.times[-1] - self.xlim_duration, self.times[-1])
+            self.canvas.draw()
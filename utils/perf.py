@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import bisect
+import functools
+import numpy as np
+
+# Bucket upper edges in seconds, log-spaced from 10 us to 100 s (about 10 % wide)
+BUCKET_EDGES = np.geomspace(1e-5, 100, 97).tolist()
+
+
+class Histogram:
+    """
+    Fixed-size log-bucketed histogram of durations. Recording is a bisect and
+    an increment; memory does not grow with the number of samples.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_EDGES) + 1)
+        self.count = 0
+        self.max = 0.0
+        self.overruns = 0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_EDGES, seconds)] += 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """
+        Upper edge of the bucket holding the p-th percentile, in seconds.
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKET_EDGES[i], self.max) if i < len(BUCKET_EDGES) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'max_ms': self.max * 1000,
+            'overruns': self.overruns,
+        }
+
+
+class PerfMonitor:
+    """
+    Named duration histograms for the GUI hot paths. While `enabled` is False
+    the hooks only test that flag, so instrumentation can stay in place.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.last_ticks = {}
+        self.started = time.time()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def record(self, name: str, seconds: float, period: float = None):
+        histogram = self.histogram(name)
+        histogram.record(seconds)
+        if period is not None and seconds > period:
+            histogram.overruns += 1  # The call took longer than its timer period
+
+    def interval(self, name: str, target: float, now: float):
+        """
+        Record how far the time between two ticks of `name` drifted from `target` seconds.
+        """
+        last = self.last_ticks.get(name)
+        self.last_ticks[name] = now
+        if last is not None:
+            interval = now - last
+            histogram = self.histogram(f'{name} drift')
+            histogram.record(abs(interval - target))
+            if interval > target * 1.5:
+                histogram.overruns += 1  # A tick was late by more than half a period
+
+    def reset(self):
+        self.histograms.clear()
+        self.last_ticks.clear()
+        self.started = time.time()
+
+    def summary(self) -> dict:
+        return {name: histogram.summary() for name, histogram in list(self.histograms.items())}
+
+    def export(self, path: str):
+        """
+        Append the current summary to `path` as one JSON line.
+        """
+        with open(path, 'a') as file:
+            file.write(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                                   'histograms': self.summary()}) + '\n')
+
+    def format(self) -> str:
+        # Compact text table for the GUI panel
+        lines = []
+        for name, stats in self.summary().items():
+            line = f"{name[:16]:<16} {stats['p50_ms']:7.2f} {stats['p95_ms']:7.2f} {stats['max_ms']:8.1f}"
+            if stats['overruns']:
+                line += f" !{stats['overruns']}"
+            lines.append(line)
+        return f"{'ms':<16} {'p50':>7} {'p95':>7} {'max':>8}\n" + '\n'.join(lines)
+
+
+def process_age() -> float:
+    """
+    Seconds since this process was started, interpreter start-up included;
+    None where /proc is not available. Resolution is one clock tick (10 ms).
+    """
+    try:
+        with open('/proc/self/stat') as file:
+            start_ticks = int(file.read().rsplit(')', 1)[1].split()[19])  # Field 22, starttime
+        with open('/proc/uptime') as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def process_usage() -> dict:
+    """
+    Resident memory (MB) and total CPU time (s) of this process.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            rss = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, where /proc is not available
+    return {'rss_mb': rss / 2 ** 20, 'cpu_s': time.process_time()}
+
+
+monitor = PerfMonitor()  # Shared by the GUI, the graph and the logger thread
+
+
+def timed(name: str, period: float = None):
+    """
+    Decorator recording the duration of every call into monitor's `name`
+    histogram while the monitor is enabled. Calls longer than `period`
+    seconds are counted as overruns.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not monitor.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                monitor.record(name, time.perf_counter() - start, period)
+        return wrapper
+    return decorate
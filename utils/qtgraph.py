@@ -0,0 +1,218 @@
+import time
+import numpy as np
+from collections import deque
+from datetime import datetime, timedelta
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QPixmap, QPolygonF, QPen, QColor, QFont, QFontMetrics
+from utils.perf import timed
+
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']  # Matplotlib's default cycle
+MARGINS = (48, 6, 10, 20)  # Left, top, right, bottom space around the plot area in pixels
+TIME_STEPS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400, 172800, 604800]  # Seconds
+MAX_TIME_TICKS = 5
+MAX_VALUE_TICKS = 6
+
+
+def time_ticks(start_us: int, end_us: int, max_ticks: int = MAX_TIME_TICKS):
+    """
+    Return (tick times in us, label format) for a time axis: the smallest step
+    from TIME_STEPS giving at most `max_ticks` ticks, aligned to that step.
+    """
+    span = (end_us - start_us) / 1e6
+    step = next((step for step in TIME_STEPS if span / step <= max_ticks), TIME_STEPS[-1])
+    step_us = step * 1_000_000
+    first = -(-start_us // step_us) * step_us
+    fmt = '%H:%M:%S' if step < 60 else '%H:%M' if step < 86400 else '%m-%d'
+    if span > 86400 and step < 86400:
+        fmt = '%m-%d %H:%M'
+    return np.arange(first, end_us + 1, step_us), fmt
+
+
+def value_ticks(low: float, high: float, max_ticks: int = MAX_VALUE_TICKS):
+    """
+    Return "nice" tick values (1, 2 or 5 times a power of ten apart) within [low, high].
+    """
+    span = high - low
+    if span <= 0:
+        return np.array([low])
+    raw = span / max_ticks
+    magnitude = 10 ** np.floor(np.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    return np.arange(np.ceil(low / step) * step, high + step * 1e-9, step)
+
+
+def polyline(x, y) -> QPolygonF:
+    # Fill the polygon's point buffer straight from numpy instead of creating a QPointF per point
+    polygon = QPolygonF(len(x))
+    buffer = polygon.data()
+    buffer.setsize(len(x) * 2 * 8)
+    points = np.frombuffer(buffer, np.float64).reshape(-1, 2)
+    points[:, 0] = x
+    points[:, 1] = y
+    return polygon
+
+
+class PainterGraph(QWidget):
+    """
+    Native QPainter time-series graph with the interface of TimeSeriesGraph
+    (update_plot, set_xlim_duration, draw_stats). Axes, grid, tick labels and
+    legend are rendered to a cached pixmap that is only rebuilt when the view
+    scrolls out of its headroom, the scale or selection changes, or the widget
+    is resized; a tick only maps the arrays to pixels and draws polylines.
+
+    Parameters:
+    headroom (float): Fraction of the x/y range kept free so most ticks reuse the cached axes.
+    draw_time_samples (int): Number of recent update_plot timings kept for draw_stats.
+    """
+
+    def __init__(self, headroom: float = 0.1, draw_time_samples: int = 100):
+        super().__init__()
+        self.headroom = headroom
+        self.blit = False
+        self.xlim_duration = timedelta(minutes=10)  # Default xlim duration
+        self.times = []
+        self.series = {}
+        self.labels = {}
+        self.xlim = None  # (start us, end us) of the cached axes
+        self.ylim = None
+        self.background = None  # Cached pixmap with axes, grid, ticks and legend
+        self.static_dirty = True
+        self.last_plot_args = None
+        self.polylines = []
+        self.draw_times = deque(maxlen=draw_time_samples)
+        self.static_redraws = 0
+        self.font = QFont('Arial', 8)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)  # Every paint covers the whole widget
+
+    def plot_width(self) -> int:
+        return max(1, self.width() - MARGINS[0] - MARGINS[2])
+
+    def plot_rect(self) -> QRectF:
+        left, top, right, bottom = MARGINS
+        return QRectF(left, top, max(1, self.width() - left - right), max(1, self.height() - top - bottom))
+
+    @timed('update_plot')
+    def update_plot(self, times, data, units, multipliers):
+        if len(times) == 0:
+            return  # Return if there are no times to plot
+        start = time.perf_counter()
+        self.times = times
+        self.last_plot_args = (times, data, units, multipliers)
+        x = np.asarray(times, dtype='datetime64[us]').astype(np.int64)
+        series = {label: np.asarray(values, dtype=np.float64) * multipliers.get(label, 1) for label, values in data.items()}
+        self.labels = {label: f'{label} (x{multipliers.get(label, 1)} {units.get(label, "")})' for label in series}
+        if self.needs_static_redraw(x, series):
+            self.redraw_static(x, series)
+        rect = self.plot_rect()
+        x_scale = rect.width() / (self.xlim[1] - self.xlim[0])
+        y_scale = rect.height() / (self.ylim[1] - self.ylim[0])
+        px = rect.left() + (x - self.xlim[0]) * x_scale
+        self.polylines = [(COLORS[i % len(COLORS)], polyline(px, rect.bottom() - (y - self.ylim[0]) * y_scale))
+                          for i, y in enumerate(series.values()) if len(y)]
+        self.series = series
+        self.repaint()
+        self.draw_times.append(time.perf_counter() - start)
+
+    def needs_static_redraw(self, x, series) -> bool:
+        if self.static_dirty or self.background is None or list(series) != list(self.series):
+            return True
+        if x[-1] > self.xlim[1]:
+            return True  # The newest sample scrolled past the right edge
+        ymin, ymax = self.ylim
+        return any(len(y) and not ymin <= y[-1] <= ymax for y in series.values())
+
+    def redraw_static(self, x, series):
+        span = int(self.xlim_duration / timedelta(microseconds=1))
+        end = int(x[-1] + span * self.headroom)
+        self.xlim = (end - span, end)
+        first = np.searchsorted(x, self.xlim[0])
+        visible = [y[first:] for y in series.values() if len(y[first:])]
+        if visible:
+            low = min(float(np.nanmin(y)) for y in visible)
+            high = max(float(np.nanmax(y)) for y in visible)
+            pad = (high - low) * self.headroom or 1
+            self.ylim = (low - pad, high + pad)
+        else:
+            self.ylim = (0, 1)
+        self.render_background(list(series))
+        self.static_dirty = False
+        self.static_redraws += 1
+
+    def render_background(self, labels):
+        pixmap = QPixmap(self.size())
+        pixmap.fill(Qt.white)
+        painter = QPainter(pixmap)
+        painter.setFont(self.font)
+        metrics = QFontMetrics(self.font)
+        rect = self.plot_rect()
+        grid = QPen(QColor('#e0e0e0'))
+        axis = QPen(Qt.black)
+        x_scale = rect.width() / (self.xlim[1] - self.xlim[0])
+        ticks, fmt = time_ticks(*self.xlim)
+        for tick in ticks:
+            px = rect.left() + (tick - self.xlim[0]) * x_scale
+            painter.setPen(grid)
+            painter.drawLine(int(px), int(rect.top()), int(px), int(rect.bottom()))
+            label = (datetime(1970, 1, 1) + timedelta(microseconds=int(tick))).strftime(fmt)  # Naive local times, like the samples
+            painter.setPen(axis)
+            painter.drawText(int(px - metrics.horizontalAdvance(label) / 2), int(rect.bottom() + metrics.ascent() + 3), label)
+        y_scale = rect.height() / (self.ylim[1] - self.ylim[0])
+        for tick in value_ticks(*self.ylim):
+            py = rect.bottom() - (tick - self.ylim[0]) * y_scale
+            painter.setPen(grid)
+            painter.drawLine(int(rect.left()), int(py), int(rect.right()), int(py))
+            label = f'{tick + 0.0:g}'  # No '-0'
+            painter.setPen(axis)
+            painter.drawText(int(rect.left() - metrics.horizontalAdvance(label) - 4), int(py + metrics.ascent() / 2), label)
+        painter.setPen(axis)
+        painter.drawRect(rect)
+        for i, label in enumerate(labels):
+            y = int(rect.top() + 4 + i * metrics.height())
+            painter.setPen(QPen(QColor(COLORS[i % len(COLORS)]), 2))
+            painter.drawLine(int(rect.left() + 4), y + metrics.height() // 2, int(rect.left() + 18), y + metrics.height() // 2)
+            painter.setPen(axis)
+            painter.drawText(int(rect.left() + 22), y + metrics.ascent(), self.labels.get(label, label))
+        painter.end()
+        self.background = pixmap
+
+    @timed('canvas.draw')
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.background is None or self.background.size() != self.size():
+            painter.fillRect(self.rect(), Qt.white)
+            painter.end()
+            return
+        painter.drawPixmap(0, 0, self.background)
+        painter.setClipRect(self.plot_rect())
+        for color, polygon in self.polylines:
+            painter.setPen(QPen(QColor(color), 1.5))
+            painter.drawPolyline(polygon)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.static_dirty = True
+        if self.last_plot_args:
+            self.update_plot(*self.last_plot_args)
+        super().resizeEvent(event)
+
+    def draw_stats(self):
+        # Summary of the recent update_plot timings, in milliseconds
+        if not self.draw_times:
+            return {}
+        times_ms = np.array(self.draw_times) * 1000
+        return {
+            'mode': 'native',
+            'ticks': len(times_ms),
+            'mean_ms': float(times_ms.mean()),
+            'max_ms': float(times_ms.max()),
+            'last_ms': float(times_ms[-1]),
+            'static_redraws': self.static_redraws,
+        }
+
+    def set_xlim_duration(self, duration, redraw=True):
+        self.xlim_duration = duration
+        self.static_dirty = True
+        if redraw and self.last_plot_args:
+            self.update_plot(*self.last_plot_args)
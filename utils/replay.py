@@ -0,0 +1,121 @@
+import time
+import threading
+import numpy as np
+from utils.acquisition import SampleQueue, notify
+from utils.ingest import iter_csv_chunks
+from utils.binlog import BinaryLog
+
+REPLAY_CHUNK_ROWS = 10000
+
+
+def iter_log_chunks(path: str, chunk_rows: int = REPLAY_CHUNK_ROWS):
+    """
+    Yield (idx, times, values) chunks from a CSV or binary (.sowlog) log.
+    """
+    if path.endswith('.sowlog'):
+        log = BinaryLog(path)
+        for start in range(0, len(log), chunk_rows):
+            records = log.records[start:start + chunk_rows]
+            values = np.column_stack([records[name] for name in log.channels]).astype(np.float64).round(3)
+            yield records['idx'], records['time_us'].view('datetime64[us]'), values
+    else:
+        for _, idx, times, values in iter_csv_chunks(path, chunk_rows):
+            yield idx, times, values
+
+
+class ReplaySource:
+    """
+    Plays a recorded log back through the same subscriber queues as
+    AcquisitionEngine, so the GUI, store and logger cannot tell the
+    difference. Samples keep their recorded idx and timestamps and are
+    paced by the recorded time deltas divided by `speed`; a speed of None
+    publishes as fast as possible.
+
+    Parameters:
+    path (str): Recorded sow_data_*.csv or .sowlog file.
+    speed (float): Playback speed (1, 10, 100, ...) or None for unthrottled.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self.subscribers = []
+        self.listeners = []
+        self.samples = 0
+        self.recorded_span = 0.0  # Seconds of recorded time published so far
+        self.started = None
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+        self.finished = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def subscribe(self, maxlen: int = 10000) -> SampleQueue:
+        queue = SampleQueue(maxlen)
+        self.subscribers.append(queue)
+        return queue
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self, next_idx: int = 1):
+        # next_idx is ignored: replayed samples keep their recorded idx
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='replay', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        self.started = time.monotonic()
+        first_us = None
+        try:
+            for idx, times, values in iter_log_chunks(self.path):
+                times_us = times.astype(np.int64)
+                if first_us is None:
+                    first_us = int(times_us[0])
+                offsets = (times_us - first_us) / 1e6  # Recorded seconds since the first sample
+                datetimes = times.astype(object)
+                rows = values.tolist()
+                for i in range(len(idx)):
+                    if self.speed:
+                        delay = self.started + offsets[i] / self.speed - time.monotonic()
+                        if delay > 0:
+                            if self.stopping.wait(delay):
+                                return
+                        else:
+                            self.max_lag = max(self.max_lag, -delay)
+                    elif self.stopping.is_set():
+                        return
+                    sample = (int(idx[i]), datetimes[i], rows[i])
+                    notify(self.listeners, sample)
+                    for queue in self.subscribers:
+                        queue.put(sample)
+                    self.samples += 1
+                    self.recorded_span = offsets[i]
+                    self.elapsed = time.monotonic() - self.started
+        except Exception as e:
+            print(f"Error replaying {self.path}: {e}")
+        finally:
+            self.elapsed = time.monotonic() - self.started
+            self.finished = True
+
+    def stats(self) -> dict:
+        """
+        Requested versus achieved playback rate in rows per second.
+        """
+        elapsed = self.elapsed or 1e-9
+        recorded_rate = self.samples / self.recorded_span if self.recorded_span else 0.0
+        return {
+            'speed': self.speed or float('inf'),
+            'samples': self.samples,
+            'requested_rows_per_s': recorded_rate * self.speed if self.speed else float('inf'),
+            'achieved_rows_per_s': self.samples / elapsed,
+            'achieved_speed': self.recorded_span / elapsed,
+            'max_lag_s': self.max_lag,
+            'dropped': sum(queue.dropped for queue in self.subscribers),
+            'finished': self.finished,
+        }
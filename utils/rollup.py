@@ -0,0 +1,212 @@
+import os
+import csv
+import numpy as np
+from datetime import timedelta
+from utils.store import TimeSeriesStore
+
+STATS = ('min', 'max', 'mean')
+
+# (name, bucket width, buckets kept in memory)
+DEFAULT_TIERS = [
+    ('1min', timedelta(minutes=1), 7 * 24 * 60),  # One week
+    ('1hour', timedelta(hours=1), 90 * 24),  # About three months
+]
+
+
+class RollupTier:
+    """
+    min/max/mean/count aggregates of all channels at one resolution.
+
+    Closed buckets live in a TimeSeriesStore (idx = bucket id, time = bucket
+    start) with a 'count' column followed by '<channel>:<stat>' columns, and
+    are appended to `path` when given. The bucket currently filling up is kept
+    in small accumulator arrays. Buckets only move forward: samples older than
+    the open or the last stored bucket are counted in `rejected` and dropped,
+    so the store stays sorted by time.
+
+    Parameters:
+    name (str): Tier name, used in the file name and query results.
+    channels (list): Names of the aggregated channels.
+    resolution (timedelta): Bucket width.
+    capacity (int): Number of closed buckets kept in memory.
+    path (str): Optional CSV file the closed buckets are persisted to.
+    """
+
+    def __init__(self, name, channels, resolution: timedelta, capacity: int, path: str = None):
+        self.name = name
+        self.channels = list(channels)
+        self.resolution = resolution
+        self.width_us = resolution // timedelta(microseconds=1)
+        self.columns = ['count'] + [f'{channel}:{stat}' for channel in self.channels for stat in STATS]
+        self.store = TimeSeriesStore(self.columns, capacity)
+        self.path = path
+        self.bucket = None  # Id of the open bucket
+        self.replace = False  # The open bucket continues the last stored one
+        self.count = 0
+        self.rejected = 0
+        self.mins = np.full(len(self.channels), np.inf)
+        self.maxs = np.full(len(self.channels), -np.inf)
+        self.sums = np.zeros(len(self.channels))
+        if path:
+            self.load()
+
+    def add(self, time_us: int, values):
+        bucket = time_us // self.width_us
+        if bucket != self.bucket:
+            if self.bucket is not None and bucket < self.bucket:
+                self.rejected += 1
+                return
+            self.close()
+            if not self.open(bucket):
+                self.rejected += 1
+                return
+        self.count += 1
+        np.minimum(self.mins, values, out=self.mins)
+        np.maximum(self.maxs, values, out=self.maxs)
+        self.sums += values
+
+    def open(self, bucket) -> bool:
+        last = self.store.last_row()
+        if last is not None and bucket < last[0]:
+            self.bucket = None  # Older than the stored history, e.g. the clock went back
+            return False
+        self.bucket = bucket
+        self.replace = last is not None and last[0] == bucket
+        if self.replace:
+            # Continue a bucket that was persisted before a restart
+            stats = np.array(last[3:]).reshape(len(self.channels), len(STATS))
+            self.count = int(last[2])
+            self.mins, self.maxs = stats[:, 0].copy(), stats[:, 1].copy()
+            self.sums = stats[:, 2] * self.count
+        else:
+            self.count = 0
+            self.mins.fill(np.inf)
+            self.maxs.fill(-np.inf)
+            self.sums.fill(0)
+        return True
+
+    def close(self):
+        if not self.count:
+            return
+        row = self.current_row()
+        if self.replace:
+            for name, value in zip(self.columns, row):
+                self.store.update_last(name, value)
+        else:
+            self.store.append(self.bucket, self.bucket_start(self.bucket), row)
+        if self.path:
+            self.persist(row)
+        self.count = 0
+
+    def current_row(self):
+        stats = np.column_stack((self.mins, self.maxs, self.sums / self.count))
+        return [self.count] + stats.ravel().tolist()
+
+    def bucket_start(self, bucket):
+        return np.datetime64(int(bucket) * self.width_us, 'us')
+
+    def persist(self, row):
+        try:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='') as file:
+                writer = csv.writer(file)
+                if new_file:
+                    writer.writerow(['bucket', 'datetime'] + self.columns)
+                start = self.bucket_start(self.bucket).item()
+                writer.writerow([self.bucket, start.strftime('%Y-%m-%d %H:%M:%S')] + row)
+        except Exception as e:
+            print(f"Error saving rollup file: {e}")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            rows = np.loadtxt(self.path, delimiter=',', skiprows=1, usecols=[0] + list(range(2, 2 + len(self.columns))), ndmin=2)
+        except Exception as e:
+            print(f"Error reading rollup file: {e}")
+            return
+        if not len(rows):
+            return
+        order = np.argsort(rows[:, 0], kind='stable')  # Older files may hold out-of-order runs
+        rows = rows[order]
+        buckets = rows[:, 0].astype(np.int64)
+        latest = np.append(buckets[1:] != buckets[:-1], True)  # A bucket written more than once keeps its last row
+        buckets, rows = buckets[latest], rows[latest]
+        self.store.extend(buckets, (buckets * self.width_us).astype('datetime64[us]'), rows[:, 1:])
+
+    def window(self, start, end=None):
+        """
+        Return (times, columns) for the buckets starting in [start, end],
+        including the open bucket.
+        """
+        _, times, columns = self.store.window(start, end)
+        if self.count and (end is None or self.bucket_start(self.bucket) <= np.datetime64(end, 'us')):
+            open_row = self.current_row()
+            if self.replace and len(times) and times[-1] == self.bucket_start(self.bucket):
+                times = times[:-1]
+                columns = {name: values[:-1] for name, values in columns.items()}
+            times = np.append(times, self.bucket_start(self.bucket))
+            columns = {name: np.append(columns[name], value) for name, value in zip(self.columns, open_row)}
+        return times, columns
+
+    def earliest(self):
+        if self.store:
+            return self.store.times()[0]
+        return None if self.bucket is None else self.bucket_start(self.bucket)
+
+
+class RollupEngine:
+    """
+    Incremental multi-resolution rollups of the sampled channels.
+
+    Every sample passed to `add` updates all tiers. `query` picks the coarsest
+    tier that still has at least `min_points` buckets in the requested window;
+    when none does, it returns None and the caller should use the raw samples.
+
+    Parameters:
+    channels (list): Names of the aggregated channels.
+    path_prefix (str): When given, tier N is persisted to '<path_prefix>_<N>.rollup'.
+    tiers (list): (name, resolution, capacity) tuples, finest first.
+    """
+
+    def __init__(self, channels, path_prefix: str = None, tiers=DEFAULT_TIERS):
+        self.channels = list(channels)
+        self.tiers = [
+            RollupTier(name, self.channels, resolution, capacity, f'{path_prefix}_{name}.rollup' if path_prefix else None)
+            for name, resolution, capacity in tiers
+        ]
+
+    def add(self, time, values):
+        time_us = int(np.datetime64(time, 'us').astype(np.int64))
+        values = np.asarray(values, dtype=np.float64)
+        for tier in self.tiers:
+            tier.add(time_us, values)
+
+    def flush(self):
+        # Close the open buckets, e.g. on shutdown
+        for tier in self.tiers:
+            tier.close()
+            tier.bucket = None
+
+    def select_tier(self, start, end, min_points: int):
+        span = np.datetime64(end, 'us') - np.datetime64(start, 'us')
+        for tier in reversed(self.tiers):
+            if span // np.timedelta64(tier.width_us, 'us') >= min_points:
+                return tier
+        return None
+
+    def query(self, start, end, min_points: int = 1):
+        """
+        Return (tier name, times, columns) from the coarsest tier that fills
+        the window [start, end] with at least `min_points` buckets, or None
+        when only the raw samples are fine enough.
+        """
+        tier = self.select_tier(start, end, min_points)
+        if tier is None:
+            return None
+        times, columns = tier.window(start, end)
+        return tier.name, times, columns
+
+    def earliest(self):
+        times = [tier.earliest() for tier in self.tiers if tier.earliest() is not None]
+        return min(times) if times else None
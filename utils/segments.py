@@ -0,0 +1,347 @@
+import os
+import re
+import csv
+import sys
+import gzip
+import shutil
+import bisect
+import numpy as np
+from datetime import datetime, timedelta
+from utils.logger import CsvLogger
+from utils.ingest import parse_csv_lines, read_csv_tail
+
+SEGMENT_PATTERN = re.compile(r'^sow_data_(\d{8}_\d{6})\.csv(\.gz)?$')
+CATALOG_NAME = 'sow_segments.csv'  # One line per closed segment: name, first/last time, rows
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'  # Fixed width, so times compare as strings
+
+
+def segment_name(time: datetime) -> str:
+    return f"sow_data_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+
+
+def index_path(segment_path: str) -> str:
+    # Sidecar with "time_us,byte offset,row" every N rows; offsets are into the uncompressed CSV
+    if segment_path.endswith('.gz'):
+        segment_path = segment_path[:-3]
+    return os.path.splitext(segment_path)[0] + '.idx'
+
+
+def open_segment(path: str):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def line_time(line: bytes) -> bytes:
+    start = line.index(b',') + 1
+    return line[start:start + 26]
+
+
+def to_us(time) -> int:
+    return int(np.datetime64(time, 'us').astype(np.int64))
+
+
+def build_index(path: str, every: int):
+    """
+    Scan a segment and return (index entries, rows, first time us, last time us).
+    Used when a segment is resumed or its sidecar index is missing.
+    """
+    entries = []
+    rows = 0
+    last_line = None
+    with open_segment(path) as file:
+        offset = len(file.readline())  # Header
+        for line in file:
+            if not line.strip():
+                offset += len(line)
+                continue
+            if rows % every == 0:
+                entries.append((to_us(line_time(line).decode()), offset, rows))
+            last_line = line
+            offset += len(line)
+            rows += 1
+    first_us = entries[0][0] if entries else None
+    last_us = to_us(line_time(last_line).decode()) if last_line else None
+    return entries, rows, first_us, last_us
+
+
+def load_index(path: str, every: int = 100):
+    """
+    Return (times us, byte offsets) of a segment's sparse index, rebuilding
+    the sidecar when it is missing.
+    """
+    sidecar = index_path(path)
+    if not os.path.exists(sidecar) or os.path.getsize(sidecar) == 0:
+        entries = build_index(path, every)[0]
+        write_index(sidecar, entries)
+    else:
+        entries = np.loadtxt(sidecar, delimiter=',', dtype=np.int64, ndmin=2)
+    entries = np.asarray(entries, dtype=np.int64).reshape(-1, 3)
+    return entries[:, 0], entries[:, 1]
+
+
+def write_index(sidecar: str, entries):
+    with open(sidecar, 'w') as file:
+        file.writelines(f"{time_us},{offset},{row}\n" for time_us, offset, row in entries)
+
+
+def read_catalog(directory: str) -> dict:
+    path = os.path.join(directory, CATALOG_NAME)
+    catalog = {}
+    if os.path.exists(path):
+        with open(path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for name, first_us, last_us, rows in reader:
+                catalog[name] = (int(first_us), int(last_us), int(rows))
+    return catalog
+
+
+def list_segments(directory: str = '.'):
+    """
+    Return the segments in `directory` oldest first as (path, first us, last us)
+    tuples. The time range comes from the catalog; for a segment that was not
+    closed (the active one, or after a crash) the first index entry is used and
+    the end is bounded by the next segment.
+    """
+    catalog = read_catalog(directory)
+    names = sorted((name for name in os.listdir(directory) if SEGMENT_PATTERN.match(name)), key=lambda name: SEGMENT_PATTERN.match(name).group(1))
+    segments = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if name in catalog:
+            first_us, last_us, _ = catalog[name]
+        else:
+            times, _ = load_index(path)
+            first_us = int(times[0]) if len(times) else to_us(datetime.strptime(SEGMENT_PATTERN.match(name).group(1), '%Y%m%d_%H%M%S'))
+            last_us = None
+        segments.append([path, first_us, last_us])
+    for i, segment in enumerate(segments):
+        if segment[2] is None:
+            segment[2] = segments[i + 1][1] if i + 1 < len(segments) else np.iinfo(np.int64).max
+    return [tuple(segment) for segment in segments]
+
+
+def iter_range_lines(directory, start, end, chunk_rows: int = 10000):
+    """
+    Yield the raw CSV lines (bytes, without the line break) with
+    start <= time <= end in lists of up to `chunk_rows`, oldest first. Only
+    the segments whose time range overlaps the query are opened, and each one
+    is read from the sparse index entry just before `start`.
+    """
+    start_us, end_us = to_us(start), to_us(end)
+    start_key = np.datetime64(start_us, 'us').item().strftime(TIME_FORMAT).encode()
+    end_key = np.datetime64(end_us, 'us').item().strftime(TIME_FORMAT).encode()
+    lines = []
+    for path, first_us, last_us in list_segments(directory):
+        if last_us < start_us or first_us > end_us:
+            continue
+        times, offsets = load_index(path)
+        if not len(times):
+            continue
+        entry = max(0, bisect.bisect_right(times.tolist(), start_us) - 1)
+        with open_segment(path) as file:
+            file.seek(int(offsets[entry]))
+            for line in file:
+                if not line.strip():
+                    continue
+                key = line_time(line)
+                if key < start_key:
+                    continue
+                if key > end_key:
+                    break
+                lines.append(line.rstrip(b'\r\n'))
+                if len(lines) >= chunk_rows:
+                    yield lines
+                    lines = []
+    if lines:
+        yield lines
+
+
+def query_range(directory, start, end, n_channels: int = 8):
+    """
+    Load the rows with start <= time <= end (see iter_range_lines).
+
+    Returns:
+    tuple: (int64 idx, datetime64[us] times, float64 values of shape (rows, n_channels))
+    """
+    lines = [line for chunk in iter_range_lines(directory, start, end) for line in chunk]
+    return parse_csv_lines(lines, n_channels)
+
+
+def read_segments_tail(path: str, max_rows: int):
+    """
+    Load the newest `max_rows` rows of a rotated log: the tail of `path`, then
+    the older segments in its directory, newest first, until `max_rows` rows
+    are loaded or the segments run out. A segment with other columns ends the
+    walk. A log that is not named like a segment is read on its own.
+
+    Returns:
+    tuple: (headers, idx, times, values)
+    """
+    headers, idx, times, values = read_csv_tail(path, max_rows)
+    match = SEGMENT_PATTERN.match(os.path.basename(path))
+    if not match or len(idx) >= max_rows:
+        return headers, idx, times, values
+    directory = os.path.dirname(path)
+    older = sorted((name for name in os.listdir(directory or '.')
+                    if SEGMENT_PATTERN.match(name) and SEGMENT_PATTERN.match(name).group(1) < match.group(1)),
+                   key=lambda name: SEGMENT_PATTERN.match(name).group(1))
+    parts = [(idx, times, values)]
+    remaining = max_rows - len(idx)
+    for name in reversed(older):
+        if remaining <= 0:
+            break
+        segment = os.path.join(directory, name)
+        if segment.endswith('.gz'):
+            with open_segment(segment) as file:
+                lines = file.read().split(b'\n')
+            segment_headers = lines[0].decode().strip().split(',')
+            part = parse_csv_lines(lines[1:-1][-remaining:], len(segment_headers) - 2)  # lines[-1] follows the final newline
+        else:
+            segment_headers, *part = read_csv_tail(segment, remaining)
+        if segment_headers != headers:
+            break
+        parts.append(part)
+        remaining -= len(part[0])
+    idx, times, values = (np.concatenate(column) for column in zip(*reversed(parts)))
+    return headers, idx, times, values
+
+
+class SegmentedCsvLogger(CsvLogger):
+    """
+    CsvLogger that rotates into size- or time-bounded segments named
+    sow_data_<first row time>.csv, keeps a sparse sidecar index per segment and
+    records closed segments in the directory catalog. Closed segments can be
+    gzip-compressed; the index offsets refer to the uncompressed data.
+
+    Parameters:
+    path (str): First (or resumed) segment.
+    headers (list): Column names; rows are [idx, datetime, values...].
+    max_segment_bytes (int): Rotate once a segment reaches this size.
+    max_segment_age (timedelta): Rotate once a segment spans this much time.
+    index_every (int): Rows between sparse index entries.
+    compress (bool): gzip closed segments.
+    """
+
+    def __init__(self, path, headers, max_segment_bytes: int = 16 * 1024 * 1024, max_segment_age: timedelta = timedelta(days=1), index_every: int = 100, compress: bool = False, **kwargs):
+        self.directory = os.path.dirname(path) or '.'
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.index_every = index_every
+        self.compress = compress
+        self.index_file = None
+        self.rotations = 0
+        super().__init__(path, headers, **kwargs)
+
+    def open(self):
+        file = super().open()
+        self.segment_bytes = file.tell()
+        # A resumed segment gets its index rebuilt, since rows written right before a crash may be missing from it
+        entries, self.segment_rows, self.first_us, self.last_us = build_index(self.path, self.index_every)
+        write_index(index_path(self.path), entries)
+        self.index_file = open(index_path(self.path), 'a')
+        return file
+
+    def should_rotate(self, time_us: int) -> bool:
+        if not self.segment_rows:
+            return False
+        return self.segment_bytes >= self.max_segment_bytes or time_us - self.first_us >= self.max_segment_age // timedelta(microseconds=1)
+
+    def write_rows(self, batch) -> int:
+        written = 0
+        start = self.file.tell()
+        for row in batch:
+            time_us = to_us(row[1])
+            if self.segment_rows % self.index_every == 0:
+                self.segment_bytes = self.file.tell()  # The size is only checked at index entries
+            if self.should_rotate(time_us):
+                written += self.file.tell() - start
+                self.rotate(row[1])
+                start = self.file.tell()
+            if self.segment_rows % self.index_every == 0:
+                self.index_file.write(f"{time_us},{self.file.tell()},{self.segment_rows}\n")
+            self.writer.writerow([row[0], row[1].strftime(TIME_FORMAT)] + list(row[2:]))
+            if self.first_us is None:
+                self.first_us = time_us
+            self.last_us = time_us
+            self.segment_rows += 1
+        self.segment_bytes = self.file.tell()
+        self.index_file.flush()
+        return written + self.segment_bytes - start
+
+    def rotate(self, first_time: datetime):
+        self.close_segment()
+        path = os.path.join(self.directory, segment_name(first_time))
+        while os.path.exists(path) or os.path.exists(path + '.gz'):
+            first_time += timedelta(seconds=1)
+            path = os.path.join(self.directory, segment_name(first_time))
+        self.path = path
+        self.file = self.open()
+        self.rotations += 1
+
+    def close_segment(self):
+        self.file.close()
+        self.index_file.close()
+        name = os.path.basename(self.path)
+        if self.compress:
+            with open(self.path, 'rb') as source, gzip.open(self.path + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(self.path)
+            name += '.gz'
+        catalog = os.path.join(self.directory, CATALOG_NAME)
+        new_catalog = not os.path.exists(catalog)
+        with open(catalog, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if new_catalog:
+                writer.writerow(['segment', 'first_time_us', 'last_time_us', 'rows'])
+            writer.writerow([name, self.first_us, self.last_us, self.segment_rows])
+
+    def close_files(self):
+        super().close_files()
+        if self.index_file:
+            self.index_file.close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({'segment': os.path.basename(self.path), 'segment_rows': self.segment_rows, 'rotations': self.rotations})
+        return stats
+
+def self_test():
+    """
+    Write a log that rotates into many small segments with a sparse index,
+    then check query_range against a plain filter for windows before, on,
+    between and across index entries and segment boundaries, and
+    read_segments_tail against the newest rows. Raises AssertionError on a
+    mismatch.
+    """
+    import tempfile
+    start = datetime(2026, 1, 1)
+    times = [start + timedelta(seconds=5 * i) for i in range(500)]
+    with tempfile.TemporaryDirectory() as directory:
+        logger = SegmentedCsvLogger(os.path.join(directory, segment_name(start)), ['idx', 'datetime', 'a', 'b'],
+                                    max_segment_bytes=2000, index_every=7, batch_rows=10, max_age=0.1, fsync_interval=None)
+        for i, time in enumerate(times):
+            logger.log([i + 1, time, i, -i])
+        logger.close(timeout=5)
+        segments = list_segments(directory)
+        assert len(segments) > 3, f"expected several segments, got {len(segments)}"
+        for first, last in [(-10, 3), (0, 0), (6, 7), (6.5, 13.5), (13, 100), (99, 499), (250, 260), (499, 600), (600, 700)]:
+            window_start, window_end = start + timedelta(seconds=5 * first), start + timedelta(seconds=5 * last)
+            idx, _, values = query_range(directory, window_start, window_end, 2)
+            expected = [i + 1 for i, time in enumerate(times) if window_start <= time <= window_end]
+            assert idx.tolist() == expected, f"query {first}..{last}: {idx.tolist()[:5]}..., expected {expected[:5]}..."
+            assert values[:, 0].tolist() == [i - 1 for i in expected]
+        for rows in (1, 40, 123, 500, 1000):
+            _, idx, _, _ = read_segments_tail(segments[-1][0], rows)
+            assert idx.tolist() == list(range(max(1, 501 - rows), 501)), f"tail of {rows} rows"
+
+if __name__ == '__main__':
+    # python3 -m utils.segments [directory] START END, e.g. "2026-10-14 02:00" "2026-10-14 02:15"
+    # python3 -m utils.segments --self-test
+    args = sys.argv[1:]
+    if args == ['--self-test']:
+        self_test()
+        print("Segment index self-test passed.")
+        sys.exit(0)
+    directory = args.pop(0) if len(args) == 3 else '.'
+    idx, times, values = query_range(directory, np.datetime64(args[0].replace(' ', 'T')), np.datetime64(args[1].replace(' ', 'T')))
+    print(f"{len(idx)} rows" + (f" from {times[0]} to {times[-1]}" if len(idx) else ''))
@@ -0,0 +1,616 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import selectors
+import threading
+import numpy as np
+from collections import deque
+from datetime import datetime, timedelta
+from utils.store import TimeSeriesStore
+from utils.rollup import RollupEngine
+from utils.gpio import GPIOSession, MockGPIO
+from utils.actuator import ActuatorWorker, ActuatorCommand
+from utils.acquisition import AcquisitionEngine, RandomWalkDriver, SensorDriver, SampleQueue, notify, HEADERS, INITIAL_VALUES
+from utils.segments import SegmentedCsvLogger, read_segments_tail
+from utils.ingest import find_latest_log
+from utils.alarms import AlarmEngine, AlarmRule, AlarmEvent, DEFAULT_RULES
+from utils.shm import SharedRingWriter
+from utils.control import Controller, ControlLoop, PlantDriver, DEFAULT_LOOPS, CONTROL_RATE_HZ
+from utils.perf import process_usage
+
+SOCKET_PATH = '/tmp/sow.sock'  # Unix socket of the acquisition service
+CLIENT_BUFFER_BYTES = 16 * 1024 * 1024  # Clients with more unsent data than this are disconnected
+RECV_BYTES = 65536
+MAX_COMMAND_BYTES = 65536  # Longest accepted command line
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+def to_us(time) -> int:
+    return int(np.datetime64(time, 'us').astype(np.int64))
+
+
+def from_us(time_us: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(microseconds=time_us)  # Naive local times, like the samples
+
+
+def alarm_message(event) -> dict:
+    return {'type': 'alarm', 'time_us': to_us(event.time), 'rule': event.rule.name, 'channel': event.rule.channel,
+            'state': event.state, 'value': event.value, 'severity': event.rule.severity}
+
+
+class Client:
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        self.sent = 0
+        self.closing = False
+
+
+class SowService:
+    """
+    Headless acquisition service. Sampling, logging, rollups, alarms, the
+    control loops and the actuators run here without Qt, and any number of GUIs (or other tools)
+    attach over a Unix socket. The protocol is newline-delimited JSON:
+
+    - server -> client: one 'hello' with the headers, a snapshot of the
+      in-memory history (idx, time_us and one column per channel) and the
+      control setpoints ('control', null without control loops), then a
+      'sample' delta per acquired sample, plus 'actuator', 'alarm',
+      'setpoint' and 'stats' messages.
+    - client -> server: {"cmd": "set", "channel", "value"} for manual
+      values, {"cmd": "setpoint", "channel", "value"} for the control loops,
+      {"cmd": "actuate", "name", "pin", "action"} for the pumps and chiller,
+      and {"cmd": "stats"}.
+
+    The snapshot and the deltas are produced under one lock, so a client never
+    misses or repeats a sample. Each client has its own outbound buffer
+    drained by the selector loop; a client that stops reading is disconnected
+    once it is CLIENT_BUFFER_BYTES behind, so it cannot stall acquisition.
+
+    Parameters:
+    socket_path (str): Unix socket the clients connect to.
+    directory (str): Where the sow_data_* log, rollups and alarm log are written.
+    capacity (int): Samples kept in memory for the snapshot.
+    rate (float): Sample rate in Hz.
+    gpio: GPIO backend for the actuators; None uses MockGPIO.
+    alarm_rules (list): AlarmRule keyword dicts.
+    shm_name (str): Also publish the samples to this shared memory ring (utils/shm.py).
+    control_loops (list): ControlLoop keyword dicts run by a Controller; None disables
+                          closed-loop control. With MockGPIO the readings come from PlantDriver.
+    control_rate (float): Control loop rate in Hz.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH, directory: str = '.', capacity: int = 24 * 60 * 60 // 5, rate: float = 0.2,
+                 gpio=None, alarm_rules=DEFAULT_RULES, shm_name: str = None, control_loops=DEFAULT_LOOPS, control_rate: float = CONTROL_RATE_HZ):
+        self.socket_path = socket_path
+        self.headers = list(HEADERS)
+        self.channels = self.headers[2:]
+        self.lock = threading.Lock()
+        self.data = TimeSeriesStore(self.channels, capacity=capacity)
+        gpio = gpio if gpio is not None else MockGPIO()
+        self.driver = RandomWalkDriver(INITIAL_VALUES)
+        self.controller = None
+        if control_loops:
+            loops = [ControlLoop(**loop) for loop in control_loops]
+            if isinstance(gpio, MockGPIO):
+                self.driver = PlantDriver(INITIAL_VALUES, gpio, loops)  # Responds to the PWM outputs of the loops
+            try:
+                self.controller = Controller(self.driver, loops, GPIOSession(gpio), control_rate)
+            except ValueError as e:
+                print(f"Closed-loop control disabled: {e}")
+        self.acquisition = AcquisitionEngine(self.driver, self.channels, rate=rate)
+        previous_log = find_latest_log(directory, 'csv')
+        self.csv_filename = previous_log or os.path.join(directory, f"sow_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        self.restore()
+        self.logger = SegmentedCsvLogger(self.csv_filename, self.headers)
+        self.rollups = RollupEngine(self.channels, os.path.join(directory, 'sow_data'))
+        self.actuators = ActuatorWorker(
+            GPIOSession(gpio),
+            on_done=lambda command, latency: self.broadcast({'type': 'actuator', 'name': command.name, 'pin': command.pin, 'action': command.action, 'state': 'done', 'latency': latency}),
+            on_failed=lambda command, message: self.broadcast({'type': 'actuator', 'name': command.name, 'pin': command.pin, 'action': command.action, 'state': 'failed', 'message': message}))
+        self.alarms = AlarmEngine(self.channels, [AlarmRule(**rule) for rule in alarm_rules], self.actuators,
+                                  log_path=os.path.join(directory, 'sow_alarms.csv'))
+        self.alarms.listeners.append(self.on_alarm)
+        self.acquisition.add_listener(self.alarms.check)
+        self.acquisition.add_listener(self.on_sample)
+        self.shared_ring = SharedRingWriter(shm_name, self.headers) if shm_name else None
+        if self.shared_ring:
+            self.acquisition.add_listener(self.shared_ring.publish)
+        self.clients = {}  # socket -> Client
+        self.selector = selectors.DefaultSelector()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.server = None
+        self.stopping = threading.Event()
+        self.connections = 0
+        self.disconnected_slow = 0
+        self.commands = 0
+
+    def restore(self):
+        # Continue the newest log like the GUI does
+        if not os.path.exists(self.csv_filename):
+            return
+        headers, idx, times, values = read_segments_tail(self.csv_filename, self.data.capacity)
+        if headers != self.headers:
+            print(f"Unexpected columns in {self.csv_filename}, starting with an empty dataset.")
+            return
+        self.data.extend(idx, times, values)
+        last_row = self.data.last_row()
+        if last_row:
+            for name, value in zip(self.channels, last_row[2:]):
+                self.driver.set_value(name, value)
+
+    def on_sample(self, sample):
+        # Acquisition thread
+        idx, sample_time, values = sample
+        self.logger.log([idx, sample_time] + values)
+        self.rollups.add(sample_time, values)
+        with self.lock:
+            self.data.append(idx, sample_time, values)
+            self.send_all(encode({'type': 'sample', 'idx': idx, 'time_us': to_us(sample_time), 'values': values}))
+
+    def on_alarm(self, event):
+        self.broadcast(alarm_message(event))
+
+    def broadcast(self, message: dict):
+        data = encode(message)
+        with self.lock:
+            self.send_all(data)
+
+    def send_all(self, data: bytes):
+        # Caller holds self.lock
+        for client in self.clients.values():
+            if client.closing:
+                continue
+            if len(client.outbound) + len(data) > CLIENT_BUFFER_BYTES:
+                client.closing = True  # Too slow; the selector loop disconnects it
+                continue
+            client.outbound += data
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b'x')
+        except (BlockingIOError, OSError):
+            pass  # A wake-up is already pending
+
+    def snapshot(self) -> dict:
+        # Caller holds self.lock
+        idx, times, columns = self.data.last()
+        return {
+            'type': 'hello',
+            'headers': self.headers,
+            'idx': idx.tolist(),
+            'time_us': times.astype(np.int64).tolist(),
+            'columns': [columns[name].tolist() for name in self.channels],
+            'control': dict(self.controller.setpoints) if self.controller else None,
+            'alarms': [{'rule': rule.name, 'channel': rule.channel, 'severity': rule.severity} for rule in self.alarms.active_rules()],
+        }
+
+    def accept(self):
+        try:
+            sock, _ = self.server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        client = Client(sock)
+        with self.lock:
+            client.outbound += encode(self.snapshot())
+            self.clients[sock] = client
+        self.connections += 1
+        self.selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def disconnect(self, client):
+        with self.lock:
+            self.clients.pop(client.sock, None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def read(self, client):
+        try:
+            data = client.sock.recv(RECV_BYTES)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.disconnect(client)
+            return
+        client.inbound += data
+        while b'\n' in client.inbound:
+            line, _, rest = bytes(client.inbound).partition(b'\n')
+            client.inbound = bytearray(rest)
+            if line.strip():
+                self.handle(client, line)
+        if len(client.inbound) > MAX_COMMAND_BYTES:
+            self.disconnect(client)
+
+    def handle(self, client, line: bytes):
+        try:
+            message = json.loads(line)
+            command = message['cmd']
+            if command == 'set':
+                channel, value = message['channel'], float(message['value'])
+                if channel not in self.channels:
+                    raise ValueError(f"unknown channel {channel!r}")
+                self.driver.set_value(channel, value)
+                with self.lock:
+                    self.data.update_last(channel, value)
+            elif command == 'setpoint':
+                channel, value = message['channel'], float(message['value'])
+                if not self.controller or channel not in self.controller.setpoints:
+                    raise ValueError(f"no control loop for {channel!r}")
+                self.controller.set_setpoint(channel, value)
+                self.broadcast({'type': 'setpoint', 'channel': channel, 'value': value})
+            elif command == 'actuate':
+                self.actuators.submit(message['name'], int(message['pin']), message.get('action', 'pulse'))
+            elif command == 'stats':
+                self.reply(client, {'type': 'stats', **self.stats()})
+            else:
+                raise ValueError(f"unknown command {command!r}")
+            self.commands += 1
+        except Exception as e:
+            self.reply(client, {'type': 'error', 'message': str(e)})
+
+    def reply(self, client, message: dict):
+        with self.lock:
+            client.outbound += encode(message)
+        self.selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def write(self, client):
+        with self.lock:
+            pending = bytes(client.outbound[:RECV_BYTES * 4])
+        if pending:
+            try:
+                sent = client.sock.send(pending)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self.disconnect(client)
+                return
+            with self.lock:
+                del client.outbound[:sent]
+                client.sent += sent
+                empty = not client.outbound
+        else:
+            empty = True
+        if empty:
+            self.selector.modify(client.sock, selectors.EVENT_READ, client)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left over by a previous run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen()
+        self.server.setblocking(False)
+        self.selector.register(self.server, selectors.EVENT_READ, 'accept')
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, 'wake')
+        last_row = self.data.last_row()
+        self.acquisition.start(next_idx=last_row[0] + 1 if last_row else 1)
+        if self.controller:
+            self.controller.start()
+        try:
+            while not self.stopping.is_set():
+                for key, events in self.selector.select(timeout=1.0):
+                    if key.data == 'accept':
+                        self.accept()
+                    elif key.data == 'wake':
+                        self.on_wake()
+                    else:
+                        if events & selectors.EVENT_READ:
+                            self.read(key.data)
+                        if events & selectors.EVENT_WRITE and key.data.sock in self.clients:
+                            self.write(key.data)
+        finally:
+            self.close()
+
+    def on_wake(self):
+        try:
+            while self.wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            if client.closing:
+                self.disconnected_slow += 1
+                print(f"Disconnected a client that fell {len(client.outbound)} bytes behind")
+                self.disconnect(client)
+            elif client.outbound:
+                self.selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def stop(self):
+        self.stopping.set()
+        self.wake()
+
+    def close(self):
+        self.acquisition.stop(timeout=1)
+        if self.controller:
+            self.controller.stop(timeout=1)  # Switches the control outputs off
+        if self.shared_ring:
+            self.shared_ring.close()
+        self.actuators.stop(timeout=1)
+        self.alarms.close(timeout=1)
+        self.rollups.flush()
+        self.logger.close(timeout=5)
+        for client in list(self.clients.values()):
+            self.disconnect(client)
+        if self.server:
+            self.selector.unregister(self.server)
+            self.server.close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            clients = len(self.clients)
+            backlog = max((len(client.outbound) for client in self.clients.values()), default=0)
+        return {
+            'clients': clients,
+            'connections': self.connections,
+            'disconnected_slow': self.disconnected_slow,
+            'max_backlog_bytes': backlog,
+            'commands': self.commands,
+            'stored': len(self.data),
+            'acquisition': self.acquisition.stats(),
+            'alarms': self.alarms.stats(),
+            'logger': self.logger.stats(),
+            'control': self.controller.stats() if self.controller else None,
+            **process_usage(),
+        }
+
+
+class RemoteDriver(SensorDriver):
+    """
+    Driver side of a ServiceClient: manual setpoints are forwarded to the
+    service's driver.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def set_value(self, name: str, value: float):
+        self.client.send({'cmd': 'set', 'channel': name, 'value': value})
+
+
+class RemoteActuators:
+    """
+    ActuatorWorker stand-in that submits commands to the service. `on_done`
+    and `on_failed` are called on the client's reader thread when the service
+    reports the result, with the same arguments as ActuatorWorker's callbacks.
+    """
+
+    def __init__(self, client, on_done=None, on_failed=None):
+        self.client = client
+        self.on_done = on_done
+        self.on_failed = on_failed
+        client.actuator_listeners.append(self.on_result)
+
+    def submit(self, name: str, pin: int, action: str = 'pulse') -> ActuatorCommand:
+        command = ActuatorCommand(name, pin, action)
+        self.client.send({'cmd': 'actuate', 'name': name, 'pin': pin, 'action': action})
+        return command
+
+    def on_result(self, message: dict):
+        command = ActuatorCommand(message['name'], message['pin'], message['action'])
+        if message['state'] == 'done' and self.on_done:
+            self.on_done(command, message['latency'])
+        elif message['state'] == 'failed' and self.on_failed:
+            self.on_failed(command, message['message'])
+
+    def stop(self, timeout: float = None, report_cancelled: bool = True):
+        pass  # The service owns the actuators
+
+
+class RemoteController:
+    """
+    Controller stand-in for an attached GUI: setpoints go to the service's
+    control loops, which keep running when the GUI closes.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.setpoints = client.control
+
+    def set_setpoint(self, channel: str, value: float):
+        if self.setpoints.get(channel) != value:
+            self.client.send({'cmd': 'setpoint', 'channel': channel, 'value': value})
+
+    def start(self):
+        pass
+
+    def stop(self, timeout: float = None):
+        pass  # The service owns the loops
+
+
+class RemoteAlarms:
+    """
+    AlarmEngine stand-in for an attached GUI: the service checks the rules,
+    and its alarm messages are turned back into AlarmEvents for `listeners`
+    (called on the client's reader thread). `active_rules` starts from the
+    alarms active when the client connected.
+    """
+
+    def __init__(self, client):
+        self.listeners = []
+        self.lock = threading.Lock()  # The GUI thread reads the active rules while the reader thread updates them
+        self.active = {}  # Rule name -> AlarmRule, in the order they were raised
+        for message in client.alarms:
+            self.active[message['rule']] = self.rule(message)
+        client.alarm_listeners.append(self.on_alarm)
+
+    @staticmethod
+    def rule(message: dict) -> AlarmRule:
+        return AlarmRule(message['rule'], message['channel'], severity=message['severity'])
+
+    def on_alarm(self, message: dict):
+        with self.lock:
+            rule = self.active.get(message['rule']) or self.rule(message)
+            if message['state'] == 'raised':
+                self.active[rule.name] = rule
+            else:
+                self.active.pop(rule.name, None)
+        notify(self.listeners, AlarmEvent(from_us(message['time_us']), rule, message['state'], message['value']))
+
+    def active_rules(self) -> list:
+        with self.lock:
+            return list(self.active.values())
+
+    def close(self, timeout: float = None):
+        pass  # The service keeps the alarm log
+
+
+class ServiceClient:
+    """
+    Connection to a SowService with the interface of AcquisitionEngine
+    (subscribe, add_listener, start, stop, stats), so the GUI can use it as
+    its sample source. The snapshot sent on connect is available as
+    `headers`, `idx`, `times` and `values` right after construction; the
+    deltas are read on a background thread once `start` is called.
+
+    Parameters:
+    socket_path (str): Unix socket of the service.
+    timeout (float): Seconds to wait for the connection and the snapshot.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile('rb')
+        hello = json.loads(self.file.readline())
+        self.sock.settimeout(None)
+        self.headers = hello['headers']
+        self.idx = np.array(hello['idx'], dtype=np.int64)
+        self.times = np.array(hello['time_us'], dtype=np.int64).view('datetime64[us]')
+        self.values = np.array(hello['columns'], dtype=np.float64).reshape(len(self.headers) - 2, -1).T
+        self.control = hello.get('control')  # Setpoints of the service's control loops, kept current
+        self.alarms = hello.get('alarms') or []  # Alarms active on connect
+        self.send_lock = threading.Lock()
+        self.subscribers = []
+        self.listeners = []
+        self.actuator_listeners = []
+        self.alarm_listeners = []  # Called with the service's alarm messages
+        self.samples = 0
+        self.latencies = deque(maxlen=1024)  # Seconds from sample time to arrival
+        self.connected = True
+        self.thread = None
+
+    def subscribe(self, maxlen: int = 10000) -> SampleQueue:
+        queue = SampleQueue(maxlen)
+        self.subscribers.append(queue)
+        return queue
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self, next_idx: int = None):
+        # next_idx is ignored: the service numbers the samples
+        self.thread = threading.Thread(target=self.run, name='service-client', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.connected = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.thread:
+            self.thread.join(timeout)
+        self.sock.close()
+
+    def send(self, message: dict):
+        try:
+            with self.send_lock:
+                self.sock.sendall(encode(message))
+        except OSError as e:
+            print(f"Error sending to the acquisition service: {e}")
+
+    def run(self):
+        try:
+            for line in self.file:
+                message = json.loads(line)
+                kind = message.get('type')
+                if kind == 'sample':
+                    sample = (message['idx'], from_us(message['time_us']), message['values'])
+                    self.samples += 1
+                    self.latencies.append(time.time() - sample[1].timestamp())
+                    notify(self.listeners, sample)
+                    for queue in self.subscribers:
+                        queue.put(sample)
+                elif kind == 'setpoint':
+                    if self.control is not None:
+                        self.control[message['channel']] = message['value']
+                else:
+                    listeners = {'actuator': self.actuator_listeners, 'alarm': self.alarm_listeners}.get(kind, [])
+                    notify(listeners, message)
+                    if kind == 'error':
+                        print(f"Acquisition service error: {message['message']}")
+        except (OSError, ValueError) as e:
+            if self.connected:
+                print(f"Lost the connection to the acquisition service: {e}")
+        if self.connected:
+            print("The acquisition service closed the connection.")
+        self.connected = False
+
+    def stats(self) -> dict:
+        latency_ms = np.array(self.latencies) * 1000
+        return {
+            'connected': self.connected,
+            'samples': self.samples,
+            'dropped': sum(queue.dropped for queue in self.subscribers),
+            'latency_p50_ms': float(np.percentile(latency_ms, 50)) if len(latency_ms) else 0.0,
+            'latency_max_ms': float(latency_ms.max()) if len(latency_ms) else 0.0,
+        }
+
+
+def report(service, interval: float):
+    # Print memory, CPU and client count every `interval` seconds until the service stops
+    last_wall, last_cpu = time.monotonic(), time.process_time()
+    while not service.stopping.wait(interval):
+        stats = service.stats()
+        now = time.monotonic()
+        cpu = (stats['cpu_s'] - last_cpu) / (now - last_wall) * 100
+        last_wall, last_cpu = now, stats['cpu_s']
+        print(f"{datetime.now():%H:%M:%S} rss {stats['rss_mb']:.1f} MB, cpu {cpu:.2f}%, {stats['clients']} clients, "
+              f"{stats['acquisition']['samples']} samples, backlog {stats['max_backlog_bytes']} B", flush=True)
+
+
+if __name__ == '__main__':
+    # python3 -m utils.service --socket /tmp/sow.sock --dir . --report 60
+    parser = argparse.ArgumentParser(description='Headless S.O.W acquisition service; attach the GUI with sow_gui.py --attach.')
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('--dir', default='.', help='Directory of the data, rollup and alarm logs')
+    parser.add_argument('--rate', type=float, default=0.2, help='Sample rate in Hz')
+    parser.add_argument('--gpio', action='store_true', help='Drive the real GPIO pins instead of MockGPIO')
+    parser.add_argument('--report', type=float, default=0, help='Print memory and CPU usage every N seconds')
+    parser.add_argument('--shm', default=None, help="Also publish the samples to this shared memory ring, e.g. 'sow_live'")
+    parser.add_argument('--no-control', action='store_true', help='Do not run the closed control loops')
+    args = parser.parse_args(sys.argv[1:])
+    if args.gpio:
+        import RPi.GPIO as gpio
+    else:
+        gpio = None
+    service = SowService(args.socket, args.dir, rate=args.rate, gpio=gpio, shm_name=args.shm, control_loops=None if args.no_control else DEFAULT_LOOPS)
+    signal.signal(signal.SIGTERM, lambda *_: service.stop())
+    signal.signal(signal.SIGINT, lambda *_: service.stop())
+    if args.report:
+        threading.Thread(target=report, args=(service, args.report), name='report', daemon=True).start()
+    print(f"Serving {service.csv_filename} on {args.socket}")
+    service.serve_forever()
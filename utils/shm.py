@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+
+MAGIC = 0x534F5752494E4731  # 'SOWRING1'
+VERSION = 1
+HEADER_BYTES = 4096  # Control words followed by the JSON schema; the records start after it
+CONTROL_WORDS = 8
+# Control word positions
+C_MAGIC, C_VERSION, C_CAPACITY, C_CHANNELS, C_WRITE_SEQ, C_CLOSED, C_SCHEMA_BYTES, C_WRITER_PID = range(CONTROL_WORDS)
+
+
+def record_dtype(n_channels: int) -> np.dtype:
+    # seq is 0 for a slot never written, -seq while the writer fills it and seq once it is complete
+    return np.dtype([('seq', '<i8'), ('idx', '<i8'), ('time_us', '<i8'), ('values', '<f8', (n_channels,))])
+
+
+def segment_bytes(capacity: int, n_channels: int) -> int:
+    return HEADER_BYTES + capacity * record_dtype(n_channels).itemsize
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    # Readers must not unlink the segment when they exit, which the resource
+    # tracker of Python < 3.13 does for every SharedMemory it has seen
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by someone else
+    return True
+
+
+class SharedRingWriter:
+    """
+    Publishes samples into a multiprocessing.shared_memory ring buffer that
+    other local processes map as NumPy arrays (see SharedRingReader).
+
+    The segment holds a control block, the schema as JSON (headers, channels,
+    capacity, record layout) and `capacity` fixed-width records of
+    (seq, idx, time_us, values). Each record is a seqlock: its seq is set to
+    -seq while the fields are written and to seq once they are complete, and
+    the global write sequence is only advanced afterwards, so readers can
+    detect both torn and overwritten records without any locking.
+
+    Parameters:
+    name (str): Shared memory name, e.g. 'sow_live' (/dev/shm/sow_live on Linux).
+    headers (list): Log headers; everything after idx and datetime is a channel.
+    capacity (int): Records kept in the ring.
+    """
+
+    def __init__(self, name: str, headers, capacity: int = 4096):
+        self.name = name
+        self.headers = list(headers)
+        self.channels = self.headers[2:]
+        self.capacity = capacity
+        dtype = record_dtype(len(self.channels))
+        schema = json.dumps({'headers': self.headers, 'channels': self.channels, 'capacity': capacity,
+                             'record': {name: dtype.fields[name][0].str for name in dtype.names},
+                             'values_shape': [len(self.channels)], 'time_unit': 'us'}).encode()
+        if len(schema) > HEADER_BYTES - CONTROL_WORDS * 8:
+            raise ValueError("Too many channels for the schema block.")
+        self.memory = self.create(segment_bytes(capacity, len(self.channels)))
+        self.control = np.ndarray(CONTROL_WORDS, dtype='<i8', buffer=self.memory.buf)
+        self.memory.buf[CONTROL_WORDS * 8:CONTROL_WORDS * 8 + len(schema)] = schema
+        self.records = np.ndarray(capacity, dtype=dtype, buffer=self.memory.buf, offset=HEADER_BYTES)
+        self.records['seq'] = 0
+        self.seqs = self.records['seq']
+        self.idx = self.records['idx']
+        self.times = self.records['time_us']
+        self.values = self.records['values']
+        self.control[:] = [0, VERSION, capacity, len(self.channels), 0, 0, len(schema), os.getpid()]
+        self.control[C_MAGIC] = MAGIC  # Last, so a reader never sees a half-initialized segment
+        self.write_seq = 0
+
+    def create(self, size: int) -> shared_memory.SharedMemory:
+        try:
+            return shared_memory.SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            pass
+        # Left behind by a writer that crashed, or still owned by another process
+        existing = attach(self.name)
+        control = np.ndarray(CONTROL_WORDS, dtype='<i8', buffer=existing.buf)
+        pid = int(control[C_WRITER_PID]) if existing.size >= CONTROL_WORDS * 8 else 0
+        owned = pid != os.getpid() and pid > 0 and process_alive(pid) and not control[C_CLOSED]
+        del control
+        existing.close()
+        if owned:
+            raise FileExistsError(f"Shared memory '{self.name}' is already published by process {pid}.")
+        shared_memory.SharedMemory(self.name).unlink()
+        return shared_memory.SharedMemory(self.name, create=True, size=size)
+
+    def write(self, idx: int, time_us: int, values):
+        seq = self.write_seq + 1
+        pos = seq % self.capacity
+        self.seqs[pos] = -seq
+        self.idx[pos] = idx
+        self.times[pos] = time_us
+        self.values[pos] = values
+        self.seqs[pos] = seq
+        self.control[C_WRITE_SEQ] = seq
+        self.write_seq = seq
+
+    def publish(self, sample):
+        """
+        Write one (idx, datetime, values) sample; usable as an acquisition listener.
+        """
+        idx, sample_time, values = sample
+        self.write(idx, int(np.datetime64(sample_time, 'us').astype(np.int64)), values)
+
+    def close(self):
+        self.control[C_CLOSED] = 1  # Tells the readers no more samples will come
+        del self.control, self.records, self.seqs, self.idx, self.times, self.values  # Release the buffer exports
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedRingReader:
+    """
+    Maps a SharedRingWriter segment read-only. `records` is a zero-copy
+    structured view of the whole ring. `read` returns the records published
+    since the previous call, validated against their sequence numbers;
+    records the writer overwrote before they were read are counted in `lost`.
+
+    Parameters:
+    name (str): Shared memory name of the writer.
+    from_start (bool): Also return the records already in the ring on the first read.
+    """
+
+    def __init__(self, name: str, from_start: bool = False):
+        self.name = name
+        self.memory = attach(name)
+        self.control = np.ndarray(CONTROL_WORDS, dtype='<i8', buffer=self.memory.buf)
+        if self.control[C_MAGIC] != MAGIC or self.control[C_VERSION] != VERSION:
+            raise ValueError(f"Shared memory '{name}' is not a S.O.W ring buffer of version {VERSION}.")
+        schema_bytes = int(self.control[C_SCHEMA_BYTES])
+        self.schema = json.loads(bytes(self.memory.buf[CONTROL_WORDS * 8:CONTROL_WORDS * 8 + schema_bytes]))
+        self.headers = self.schema['headers']
+        self.channels = self.schema['channels']
+        self.capacity = int(self.control[C_CAPACITY])
+        self.writer_pid = int(self.control[C_WRITER_PID])  # Identifies this ring: a restarted writer publishes a new one
+        self.records = np.ndarray(self.capacity, dtype=record_dtype(len(self.channels)), buffer=self.memory.buf, offset=HEADER_BYTES)
+        self.seqs = self.records['seq']
+        head = self.head()
+        self.next_seq = max(1, head - self.capacity + 1) if from_start else head + 1
+        self.received = 0
+        self.lost = 0
+
+    def head(self) -> int:
+        return int(self.control[C_WRITE_SEQ])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.control[C_CLOSED])
+
+    def read(self, max_rows: int = None):
+        """
+        Return (idx, times, values) of the records published since the last
+        read, oldest first, as arrays copied out of the ring (times as
+        datetime64[us], values with one column per channel).
+        """
+        self.next_seq, lost, idx, times, values = self.read_since(self.next_seq, max_rows)
+        self.lost += lost
+        self.received += len(idx)
+        return idx, times, values
+
+    def read_since(self, seq: int, max_rows: int = None):
+        """
+        Stateless read for callers that keep their own cursor, e.g. one per
+        subscriber: return (next seq, lost, idx, times, values) for the
+        records from sequence number `seq` on.
+        """
+        head = self.head()
+        first = max(seq, head - self.capacity + 1)
+        lost = first - seq  # Overwritten before we got to them
+        last = head if max_rows is None else min(head, first + max_rows - 1)
+        seqs = np.arange(first, last + 1)
+        positions = seqs % self.capacity
+        batch = self.records[positions]  # One copy; then check nothing was overwritten meanwhile
+        valid = (batch['seq'] == seqs) & (self.seqs[positions] == seqs)
+        if not valid.all():
+            # The writer lapped us during the copy: everything up to the last bad record is gone
+            cut = int(np.flatnonzero(~valid)[-1]) + 1
+            lost += cut
+            batch = batch[cut:]
+        return max(seq, last + 1), lost, batch['idx'], batch['time_us'].view('datetime64[us]'), batch['values']
+
+    def latest(self, n: int = 1):
+        """
+        Return (idx, times, values) of the newest `n` complete records without
+        advancing the read position.
+        """
+        head = self.head()
+        seqs = np.arange(max(1, head - min(n, self.capacity) + 1), head + 1)
+        positions = seqs % self.capacity
+        batch = self.records[positions]
+        batch = batch[(batch['seq'] == seqs) & (self.seqs[positions] == seqs)]
+        return batch['idx'], batch['time_us'].view('datetime64[us]'), batch['values']
+
+    def wait(self, timeout: float = None, poll: float = 0.001) -> bool:
+        """
+        Poll until new records are published or the writer closes; False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.head() < self.next_seq:
+            if self.closed or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            time.sleep(poll)
+        return True
+
+    def close(self):
+        del self.control, self.records, self.seqs
+        self.memory.close()
+
+
+def reader_process(name: str, seconds: float, poll: float, ready, results):
+    # Reads until the writer closes; latency is measured from the writer's timestamp (epoch us) to the end of the read
+    reader = SharedRingReader(name)
+    ready.wait()
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        more = reader.wait(timeout=0.1, poll=poll)
+        _, times, _ = reader.read()
+        if len(times):
+            now_us = time.time_ns() // 1000
+            latencies.append(now_us - times.astype(np.int64))
+        if not more and reader.closed:
+            break
+    latencies = np.concatenate(latencies) if latencies else np.zeros(0)
+    results.put({
+        'received': reader.received,
+        'lost': reader.lost,
+        'latency_p50_us': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'latency_p99_us': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'latency_max_us': float(latencies.max()) if len(latencies) else 0.0,
+    })
+    reader.close()
+
+
+def benchmark(readers: int = 4, rate: float = None, seconds: float = 5.0, capacity: int = 4096, n_channels: int = 8, poll: float = 0.0005) -> dict:
+    """
+    Write samples for `seconds` at `rate` per second (None: as fast as
+    possible) while `readers` processes consume them, and return the write
+    throughput and per-reader received/lost counts and latencies.
+    """
+    name = f'sow_bench_{os.getpid()}'
+    headers = ['idx', 'datetime'] + [f'ch{i}' for i in range(n_channels)]
+    writer = SharedRingWriter(name, headers, capacity)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    ready = context.Barrier(readers + 1)
+    processes = [context.Process(target=reader_process, args=(name, seconds + 30.0, poll, ready, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    ready.wait()  # Every reader has attached
+    values = np.zeros(n_channels)
+    written = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        if rate and written >= elapsed * rate:
+            time.sleep(min(0.001, 1 / rate))
+            continue
+        values += 1
+        writer.write(written + 1, time.time_ns() // 1000, values)
+        written += 1
+    elapsed = time.perf_counter() - start
+    writer.close()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {'written': written, 'writes_per_s': written / elapsed, 'readers': reports}
+
+
+if __name__ == '__main__':
+    # python3 -m utils.shm --readers 4 --rate 1000 --seconds 5
+    parser = argparse.ArgumentParser(description='Throughput and latency of the shared-memory ring buffer.')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=None, help='Writes per second; default as fast as possible')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--capacity', type=int, default=4096)
+    args = parser.parse_args(sys.argv[1:])
+    stats = benchmark(args.readers, args.rate, args.seconds, args.capacity)
+    print(f"Wrote {stats['written']} samples, {stats['writes_per_s']:.0f} per second")
+    for i, report in enumerate(stats['readers']):
+        print(f"reader {i}: received {report['received']}, lost {report['lost']}, latency p50 {report['latency_p50_us']:.0f} us, "
+              f"p99 {report['latency_p99_us']:.0f} us, max {report['latency_max_us']:.0f} us")
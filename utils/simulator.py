@@ -0,0 +1,428 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from utils.acquisition import SensorDriver, RandomWalkDriver, SampleQueue, notify, HEADERS, INITIAL_VALUES
+from utils.store import TimeSeriesStore
+from utils.logger import CsvLogger
+from utils.stats import StreamingStats
+from utils.alarms import AlarmEngine, AlarmRule, DEFAULT_RULES
+from utils.perf import process_usage
+
+MAX_TICK_HZ = 100  # Above this rate FleetSource publishes several samples per wake-up
+TIMING_SAMPLES = 1024  # Recent step times kept for stats()
+FAULT_NAMES = {1: 'dropout', 2: 'stuck', 3: 'spike'}
+DRIFT_REVERSION = 1e-3  # Share of the calibration offset that decays per sample (mean reversion over ~1000 samples)
+DRIFT_MAX_FRACTION = 0.05  # Calibration offsets never exceed this share of the channel range
+
+
+@dataclass
+class FaultConfig:
+    """
+    Fault injection rates, as the probability per unit, channel and sample
+    that a fault starts. A dropped-out sensor reads `dropout_value` (what a
+    disconnected analog input reads) and a stuck one repeats its last reading,
+    each for a geometrically distributed number of samples with the given
+    mean. A spike offsets one reading by `spike_size` times the channel range.
+    """
+    dropout: float = 0.0
+    dropout_samples: float = 20
+    dropout_value: float = 0.0
+    stuck: float = 0.0
+    stuck_samples: float = 100
+    spike: float = 0.0
+    spike_size: float = 0.5
+
+
+class FleetSimulator:
+    """
+    Advances N simulated SOW machines x all channels in one NumPy step.
+
+    Every walking channel moves like RandomWalkDriver (a uniform change of up
+    to `noise` times its max change per sample, bounded to its range), the
+    C-box follows the lower tank temperature and the external temperature is
+    static. On top of the true values each sensor has its own calibration
+    offset, a mean-reverting random walk (Ornstein-Uhlenbeck) bounded to
+    DRIFT_MAX_FRACTION of the channel range, so long runs stay in physical
+    ranges. Faults from `faults` replace or offset the readings. All
+    randomness comes from one seedable generator, so a seed replays the same
+    fleet.
+
+    Parameters:
+    n_units (int): Number of machines.
+    initial (dict): Starting value per channel; units start spread around it.
+    noise (float): Scale of the random walk relative to RandomWalkDriver.
+    drift (float): Std of each sensor's offset change per sample, relative to its max change per sample.
+    faults (FaultConfig): Fault rates; None injects no faults.
+    seed (int): Seed of the random generator.
+    """
+    channels = RandomWalkDriver.channels
+
+    def __init__(self, n_units: int, initial: dict = INITIAL_VALUES, noise: float = 1.0, drift: float = 0.0,
+                 faults: FaultConfig = None, seed: int = None):
+        self.n_units = n_units
+        self.rng = np.random.default_rng(seed)
+        self.faults = faults or FaultConfig()
+        limits = RandomWalkDriver.limits
+        n_channels = len(self.channels)
+        self.walking = np.array([name in limits for name in self.channels])
+        self.low = np.array([limits[name][0] if name in limits else -np.inf for name in self.channels])
+        self.high = np.array([limits[name][1] if name in limits else np.inf for name in self.channels])
+        self.step_size = np.array([limits[name][2] if name in limits else 0.0 for name in self.channels]) * noise
+        self.span = np.where(self.walking, self.high - self.low, 1.0)
+        self.lower = self.channels.index('lower tank temp')
+        self.cbox = self.channels.index('C-box')
+        start = np.array([initial[name] for name in self.channels], dtype=np.float64)
+        spread = self.rng.uniform(-10, 10, (n_units, n_channels)) * self.step_size  # So the units do not move in lockstep
+        self.values = np.clip(start + spread, self.low, self.high)
+        self.values[:, self.cbox] = self.values[:, self.lower] + 4
+        self.drift_scale = drift * np.where(self.walking, self.step_size, 0.01)
+        self.drift_limit = DRIFT_MAX_FRACTION * self.span
+        self.offsets = np.zeros((n_units, n_channels))
+        self.fault_kind = np.zeros((n_units, n_channels), dtype=np.int8)  # 0 none, see FAULT_NAMES
+        self.fault_left = np.zeros((n_units, n_channels), dtype=np.int64)
+        self.stuck_values = np.zeros((n_units, n_channels))
+        self.spike_offsets = np.zeros((n_units, n_channels))
+        self.readings = self.values.copy()
+        self.fault_counts = {name: 0 for name in FAULT_NAMES.values()}
+        self.steps = 0
+        self.lock = threading.Lock()
+
+    def step(self) -> np.ndarray:
+        """
+        Advance every unit by one sample and return the (units, channels) readings.
+        """
+        with self.lock:
+            shape = self.values.shape
+            changes = self.rng.uniform(-1, 1, shape) * self.step_size
+            np.clip(self.values + changes, self.low, self.high, out=self.values)
+            self.values[:, self.cbox] = self.values[:, self.lower] + 4
+            if self.drift_scale.any():
+                self.offsets += self.rng.standard_normal(shape) * self.drift_scale - self.offsets * DRIFT_REVERSION
+                np.clip(self.offsets, -self.drift_limit, self.drift_limit, out=self.offsets)
+            readings = self.values + self.offsets
+            self.apply_faults(readings)
+            self.readings = np.round(readings, 3)
+            self.steps += 1
+            return self.readings
+
+    def apply_faults(self, readings):
+        faults = self.faults
+        if faults.dropout or faults.stuck or faults.spike:
+            # One uniform draw per reading picks at most one new fault
+            draw = self.rng.random(readings.shape)
+            idle = self.fault_kind == 0
+            dropout = idle & (draw < faults.dropout)
+            stuck = idle & ~dropout & (draw < faults.dropout + faults.stuck)
+            spike = idle & ~dropout & ~stuck & (draw < faults.dropout + faults.stuck + faults.spike)
+            for kind, started, mean in ((1, dropout, faults.dropout_samples), (2, stuck, faults.stuck_samples), (3, spike, 1)):
+                count = int(started.sum())
+                if count:
+                    self.fault_kind[started] = kind
+                    self.fault_left[started] = self.rng.geometric(1 / max(mean, 1), count)
+                    self.fault_counts[FAULT_NAMES[kind]] += count
+            self.stuck_values[stuck] = self.readings[stuck]
+            if spike.any():
+                signs = self.rng.choice((-1.0, 1.0), int(spike.sum()))
+                self.spike_offsets[spike] = signs * faults.spike_size * np.broadcast_to(self.span, readings.shape)[spike]
+        active = self.fault_kind != 0
+        if not active.any():
+            return
+        readings[self.fault_kind == 1] = faults.dropout_value
+        stuck = self.fault_kind == 2
+        readings[stuck] = self.stuck_values[stuck]
+        spike = self.fault_kind == 3
+        if spike.any():
+            readings[spike] += self.spike_offsets[spike]
+        self.fault_left[active] -= 1
+        self.fault_kind[active & (self.fault_left <= 0)] = 0
+
+    def inject(self, unit: int, channel: str, kind: str, samples: int = 1):
+        """
+        Start a fault ('dropout', 'stuck' or 'spike') on one sensor now.
+        """
+        codes = {name: code for code, name in FAULT_NAMES.items()}
+        i = self.channels.index(channel)
+        with self.lock:
+            self.fault_kind[unit, i] = codes[kind]
+            self.fault_left[unit, i] = samples
+            self.stuck_values[unit, i] = self.readings[unit, i]
+            self.spike_offsets[unit, i] = self.faults.spike_size * self.span[i]
+            self.fault_counts[kind] += 1
+
+    def set_value(self, unit: int, name: str, value: float):
+        i = self.channels.index(name)
+        with self.lock:
+            self.values[unit, i] = value - self.offsets[unit, i]
+            if i == self.lower:
+                self.values[unit, self.cbox] = self.values[unit, i] + 4
+
+    def driver(self, unit: int) -> SensorDriver:
+        return UnitDriver(self, unit)
+
+
+class UnitDriver(SensorDriver):
+    """
+    One unit of a FleetSimulator seen as a SensorDriver: `read` returns its
+    latest readings without stepping the fleet, `set_value` overrides a value.
+    """
+    channels = FleetSimulator.channels
+    simulated = True
+
+    def __init__(self, simulator, unit: int):
+        self.simulator = simulator
+        self.unit = unit
+
+    def read(self, names) -> dict:
+        readings = self.simulator.readings[self.unit].tolist()
+        return {name: readings[self.channels.index(name)] for name in names}
+
+    def set_value(self, name: str, value: float):
+        self.simulator.set_value(self.unit, name, value)
+
+
+class FleetSource:
+    """
+    Publishes the samples of every unit of a FleetSimulator from one thread,
+    through the same subscriber queues and listeners as AcquisitionEngine (per
+    unit). Scheduling is drift-free; above MAX_TICK_HZ each wake-up steps the
+    simulator several times, so rates of kHz per unit do not need kHz
+    wake-ups. Sample timestamps follow the simulated clock (start + n / rate).
+
+    Parameters:
+    simulator (FleetSimulator): The simulated fleet.
+    rate (float): Samples per second per unit.
+    """
+
+    def __init__(self, simulator, rate: float = 0.2):
+        self.simulator = simulator
+        self.rate = rate
+        self.tick_rate = min(rate, MAX_TICK_HZ)
+        self.steps_per_tick = max(1, round(rate / self.tick_rate))
+        self.subscribers = [[] for _ in range(simulator.n_units)]
+        self.listeners = [[] for _ in range(simulator.n_units)]
+        self.next_idx = np.ones(simulator.n_units, dtype=np.int64)
+        self.samples = 0
+        self.overruns = 0
+        self.step_times = deque(maxlen=TIMING_SAMPLES)  # Seconds per simulator step
+        self.publish_times = deque(maxlen=TIMING_SAMPLES)  # Seconds per wake-up spent publishing
+        self.started = None
+        self.elapsed = 0.0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def subscribe(self, maxlen: int = 10000, unit: int = 0) -> SampleQueue:
+        queue = SampleQueue(maxlen)
+        self.subscribers[unit].append(queue)
+        return queue
+
+    def add_listener(self, callback, unit: int = 0):
+        self.listeners[unit].append(callback)
+
+    def start(self, next_idx=1):
+        """
+        `next_idx` is the first idx of every unit, or a sequence with one per unit.
+        """
+        self.next_idx[:] = next_idx
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='simulator', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        self.started = time.monotonic()
+        origin = datetime.now()
+        period = 1 / self.tick_rate
+        tick = 0
+        sample = 0
+        while not self.stopping.is_set():
+            delay = self.started + tick * period - time.monotonic()
+            if delay > 0 and self.stopping.wait(delay):
+                break
+            publish_start = time.perf_counter()
+            for _ in range(self.steps_per_tick):
+                step_start = time.perf_counter()
+                rows = self.simulator.step().tolist()
+                self.step_times.append(time.perf_counter() - step_start)
+                sample_time = origin + timedelta(seconds=sample / self.rate)
+                self.publish(sample_time, rows)
+                sample += 1
+            self.publish_times.append(time.perf_counter() - publish_start)
+            self.elapsed = time.monotonic() - self.started
+            tick += 1
+            behind = int(self.elapsed / period) + 1 - tick
+            if behind > 0:
+                self.overruns += behind  # Skipped, not made up, like AcquisitionEngine
+                tick += behind
+                sample += behind * self.steps_per_tick
+        self.elapsed = time.monotonic() - self.started
+
+    def publish(self, sample_time, rows):
+        idx = self.next_idx.tolist()
+        self.next_idx += 1
+        for unit, values in enumerate(rows):
+            sample = (idx[unit], sample_time, values)
+            if self.listeners[unit]:
+                notify(self.listeners[unit], sample)
+            for queue in self.subscribers[unit]:
+                queue.put(sample)
+        self.samples += len(rows)
+
+    def stats(self) -> dict:
+        """
+        Requested versus achieved samples per second over all units, and the
+        step and publish times in milliseconds.
+        """
+        elapsed = (time.monotonic() - self.started if self.thread and self.thread.is_alive() else self.elapsed) or 1e-9
+        step_ms = np.array(self.step_times) * 1000
+        publish_ms = np.array(self.publish_times) * 1000
+        percentile = lambda values, p: float(np.percentile(values, p)) if len(values) else 0.0
+        return {
+            'units': self.simulator.n_units,
+            'rate_hz': self.rate,
+            'samples': self.samples,
+            'requested_samples_per_s': self.rate * self.simulator.n_units,
+            'achieved_samples_per_s': self.samples / elapsed,
+            'overruns': self.overruns,
+            'dropped': sum(queue.dropped for queues in self.subscribers for queue in queues),
+            'step_p50_ms': percentile(step_ms, 50),
+            'step_p99_ms': percentile(step_ms, 99),
+            'publish_p99_ms': percentile(publish_ms, 99),
+            'faults': dict(self.simulator.fault_counts),
+        }
+
+
+class UnitPipeline:
+    """
+    The per-sample work of the GUI without Qt, for one unit: store, logger and
+    streaming statistics, fed from `drain`; the alarms run on the source thread.
+    """
+
+    def __init__(self, source, unit: int, directory: str, capacity: int):
+        self.samples = source.subscribe(unit=unit)
+        self.store = TimeSeriesStore(FleetSimulator.channels, capacity)
+        self.logger = CsvLogger(os.path.join(directory, f'unit{unit:04d}.csv'), HEADERS, batch_rows=50, max_age=5.0, fsync_interval=None)
+        self.stats = StreamingStats(FleetSimulator.channels)
+        self.alarms = AlarmEngine(FleetSimulator.channels, [AlarmRule(**rule) for rule in DEFAULT_RULES])
+        source.add_listener(self.alarms.check, unit)
+
+    def drain(self) -> int:
+        batch = self.samples.drain()
+        for idx, sample_time, values in batch:
+            self.store.append(idx, sample_time, values)
+            self.logger.log([idx, sample_time] + values)
+            self.stats.add(sample_time, values)
+        return len(batch)
+
+    def close(self):
+        self.logger.close(timeout=5)
+
+
+def loadtest(units: int, rate: float, seconds: float, faults: FaultConfig = None, seed: int = 0,
+             directory: str = None, refresh: float = 0.2, capacity: int = 17280) -> dict:
+    """
+    Drive `units` headless pipelines from one FleetSource for `seconds`. The
+    pipelines are drained from this thread every `refresh` seconds, like the
+    GUI timer. Logs go to a temporary directory unless `directory` is given.
+    """
+    workdir = directory or tempfile.mkdtemp(prefix='sow_sim_')
+    os.makedirs(workdir, exist_ok=True)
+    usage_before = process_usage()
+    simulator = FleetSimulator(units, faults=faults, seed=seed, drift=0.01)
+    source = FleetSource(simulator, rate)
+    pipelines = [UnitPipeline(source, unit, workdir, capacity) for unit in range(units)]
+    source.start()
+    start = time.monotonic()
+    busy = 0.0
+    rows = 0
+    while time.monotonic() - start < seconds:
+        time.sleep(refresh)
+        drain_start = time.perf_counter()
+        rows += sum(pipeline.drain() for pipeline in pipelines)
+        busy += time.perf_counter() - drain_start
+    source.stop(timeout=5)
+    elapsed = time.monotonic() - start
+    rows += sum(pipeline.drain() for pipeline in pipelines)
+    usage = process_usage()
+    stats = source.stats()
+    for pipeline in pipelines:
+        pipeline.close()
+    logged = [pipeline.logger.stats() for pipeline in pipelines]
+    stats.update({
+        'consumed_rows': rows,
+        'consumer_busy': busy / elapsed,  # Share of the consumer thread spent on the samples
+        'logged_rows': sum(log['rows_written'] for log in logged),
+        'log_rows_dropped': sum(log['rows_dropped'] for log in logged),
+        'alarm_events': sum(pipeline.alarms.event_count for pipeline in pipelines),
+        'alarm_check_p50_us': float(np.median([pipeline.alarms.stats()['check_p50_us'] for pipeline in pipelines])),
+        'cpu_percent': (usage['cpu_s'] - usage_before['cpu_s']) / elapsed * 100,
+        'rss_mb': usage['rss_mb'],
+        'rss_growth_mb': usage['rss_mb'] - usage_before['rss_mb'],
+    })
+    if not directory:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return stats
+
+
+def benchmark_step(units: int, steps: int = 1000, seed: int = 0) -> float:
+    """
+    Readings per second of FleetSimulator.step alone, with faults enabled.
+    """
+    simulator = FleetSimulator(units, faults=FaultConfig(dropout=1e-4, stuck=1e-4, spike=1e-3), seed=seed, drift=0.01)
+    start = time.perf_counter()
+    for _ in range(steps):
+        simulator.step()
+    return steps * units * len(simulator.channels) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    # python3 -m utils.simulator --units 10 100 500 --rate 1 10 --seconds 10
+    parser = argparse.ArgumentParser(description='Load-test the storage, logging, alarm and statistics paths with simulated units.')
+    parser.add_argument('--units', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--rate', type=float, nargs='+', default=[0.2, 10], help='Samples per second per unit')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dropout', type=float, default=1e-4, help='Fault start probability per reading')
+    parser.add_argument('--stuck', type=float, default=1e-4)
+    parser.add_argument('--spike', type=float, default=1e-3)
+    parser.add_argument('--dir', help='Keep the unit logs here instead of a temporary directory')
+    parser.add_argument('--step-only', action='store_true', help='Only time the vectorized simulator step')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(sys.argv[1:])
+    faults = FaultConfig(dropout=args.dropout, stuck=args.stuck, spike=args.spike)
+    if args.child:
+        json.dump(loadtest(args.units[0], args.rate[0], args.seconds, faults, args.seed, args.dir), sys.stdout)
+        sys.exit(0)
+    for units in args.units:
+        print(f"{units:5d} units: step {benchmark_step(units) / 1e6:7.2f} M readings/s")
+    if args.step_only:
+        sys.exit(0)
+    for units in args.units:
+        for rate in args.rate:
+            # One process per case, so the RSS of a case does not include the heap left over by the previous one
+            command = [sys.executable, '-m', 'utils.simulator', '--child', '--units', str(units), '--rate', str(rate), '--seconds', str(args.seconds),
+                       '--seed', str(args.seed), '--dropout', str(args.dropout), '--stuck', str(args.stuck), '--spike', str(args.spike)]
+            if args.dir:
+                command += ['--dir', os.path.join(args.dir, f'{units}x{rate:g}')]
+            child = subprocess.run(command, capture_output=True, text=True)
+            if child.returncode:
+                print(child.stderr, file=sys.stderr)
+                sys.exit(child.returncode)
+            stats = json.loads(child.stdout)
+            print(f"{units:5d} units x {rate:6g} Hz: {stats['achieved_samples_per_s']:8.0f}/{stats['requested_samples_per_s']:.0f} samples/s, "
+                  f"{stats['overruns']} overruns, {stats['dropped']} dropped, consumer {stats['consumer_busy'] * 100:4.1f}% busy, "
+                  f"logged {stats['logged_rows']} ({stats['log_rows_dropped']} dropped), {stats['alarm_events']} alarm events, "
+                  f"CPU {stats['cpu_percent']:5.1f}%, RSS {stats['rss_mb']:.0f} MB (+{stats['rss_growth_mb']:.0f}), "
+                  f"faults {', '.join(f'{name} {count}' for name, count in stats['faults'].items())}")
@@ -0,0 +1,183 @@
+import numpy as np
+from datetime import timedelta
+
+# Same durations as the x-axis scale of the GUI
+DEFAULT_WINDOWS = {
+    '1 min': timedelta(minutes=1),
+    '3 min': timedelta(minutes=3),
+    '10 min': timedelta(minutes=10),
+    '30 min': timedelta(minutes=30),
+    '1 hour': timedelta(hours=1),
+    '1 day': timedelta(days=1),
+    '1 week': timedelta(weeks=1),
+}
+WINDOW_BUCKETS = 120  # Time buckets per window: fixed memory, the window edge moves in 1/120 steps (5 s for 10 min, 84 min for 1 week)
+
+
+def to_us(time) -> int:
+    return int(np.datetime64(time, 'us').astype(np.int64))
+
+
+class WindowStats:
+    """
+    Sliding-window aggregates of all channels over the last `duration`, in
+    fixed memory: the window is split into `buckets` time buckets kept in a
+    preallocated NumPy ring, each with its count, Welford mean/M2, minimum
+    and maximum per channel. A sample updates one bucket in O(channels); a
+    query merges the buckets still inside the window (parallel variance), so
+    the window edge moves in steps of duration / buckets. The EWMA uses the
+    window length as its time constant.
+    """
+
+    def __init__(self, n_channels: int, duration: timedelta, buckets: int = WINDOW_BUCKETS):
+        self.n_channels = n_channels
+        self.span_us = duration // timedelta(microseconds=1)
+        self.n_buckets = buckets
+        self.width_us = max(self.span_us // buckets, 1)
+        self.ids = np.empty(buckets, dtype=np.int64)  # Bucket id held by each slot
+        self.counts = np.empty(buckets, dtype=np.int64)
+        self.means = np.empty((buckets, n_channels))
+        self.m2s = np.empty((buckets, n_channels))
+        self.mins = np.empty((buckets, n_channels))
+        self.maxs = np.empty((buckets, n_channels))
+        self.clear()
+
+    def clear(self):
+        self.ids.fill(np.iinfo(np.int64).min)
+        self.counts.fill(0)
+        self.head = None  # Id of the newest bucket
+        self.ewma = None
+        self.last_us = None
+        self.merged = None  # Cached result of merge(), reset by add
+
+    def add(self, time_us: int, values: np.ndarray):
+        bucket = time_us // self.width_us
+        if self.head is None or bucket > self.head:
+            self.head = bucket
+        elif bucket <= self.head - self.n_buckets:
+            return  # Older than the window
+        slot = bucket % self.n_buckets
+        if self.ids[slot] != bucket:
+            self.ids[slot] = bucket
+            self.counts[slot] = 0
+            self.means[slot] = 0
+            self.m2s[slot] = 0
+            self.mins[slot] = values
+            self.maxs[slot] = values
+        self.counts[slot] += 1
+        delta = values - self.means[slot]
+        self.means[slot] += delta / self.counts[slot]
+        self.m2s[slot] += delta * (values - self.means[slot])
+        np.minimum(self.mins[slot], values, out=self.mins[slot])
+        np.maximum(self.maxs[slot], values, out=self.maxs[slot])
+        if self.ewma is None:
+            self.ewma = values.copy()
+        elif time_us > self.last_us:
+            alpha = 1 - np.exp(-(time_us - self.last_us) / self.span_us)
+            self.ewma += alpha * (values - self.ewma)
+        self.last_us = time_us if self.last_us is None else max(time_us, self.last_us)
+        self.merged = None
+
+    def load(self, times_us: np.ndarray, values: np.ndarray):
+        """
+        Replace the state with a history of samples in one vectorized pass.
+        """
+        self.clear()
+        if not len(times_us):
+            return
+        buckets = times_us // self.width_us
+        self.head = int(buckets[-1])
+        first = np.searchsorted(buckets, self.head - self.n_buckets, side='right')
+        buckets, window = buckets[first:], values[first:]
+        starts = np.flatnonzero(np.append(True, buckets[1:] != buckets[:-1]))
+        counts = np.diff(np.append(starts, len(buckets)))
+        means = np.add.reduceat(window, starts, axis=0) / counts[:, None]
+        slots = buckets[starts] % self.n_buckets
+        self.ids[slots] = buckets[starts]
+        self.counts[slots] = counts
+        self.means[slots] = means
+        self.m2s[slots] = np.add.reduceat((window - np.repeat(means, counts, axis=0)) ** 2, starts, axis=0)
+        self.mins[slots] = np.minimum.reduceat(window, starts, axis=0)
+        self.maxs[slots] = np.maximum.reduceat(window, starts, axis=0)
+        # EWMA in closed form: every sample decays with the time since it arrived
+        decay = np.exp(-(times_us[-1] - times_us) / self.span_us)
+        alpha = 1 - np.exp(-np.diff(times_us).clip(0) / self.span_us)
+        weights = np.concatenate(([decay[0]], alpha * decay[1:]))
+        self.ewma = weights @ values
+        self.last_us = int(times_us[-1])
+
+    def merge(self):
+        """
+        Combine the buckets inside the window: (count, mean, M2, min, max).
+        """
+        if self.merged is None:
+            live = (self.ids > self.head - self.n_buckets) & (self.counts > 0) if self.head is not None else np.zeros(self.n_buckets, dtype=bool)
+            counts = self.counts[live]
+            count = int(counts.sum())
+            if not count:
+                self.merged = (0, None, None, None, None)
+            else:
+                means = self.means[live]
+                mean = counts @ means / count
+                m2 = self.m2s[live].sum(axis=0) + counts @ (means - mean) ** 2
+                self.merged = (count, mean, m2, self.mins[live].min(axis=0), self.maxs[live].max(axis=0))
+        return self.merged
+
+    def channel(self, i: int) -> dict:
+        count, mean, m2, mins, maxs = self.merge()
+        if not count:
+            return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None, 'ewma': None}
+        return {
+            'count': count,
+            'mean': float(mean[i]),
+            'std': float(np.sqrt(max(m2[i], 0) / count)),
+            'min': float(mins[i]),
+            'max': float(maxs[i]),
+            'ewma': float(self.ewma[i]),
+        }
+
+
+class StreamingStats:
+    """
+    Rolling mean/std/min/max and EWMA per channel for several windows, fed one
+    sample at a time. Queries never rescan the history.
+
+    Parameters:
+    channels (list): Channel names, in the order of the values passed to add.
+    windows (dict): Window name -> timedelta.
+    buckets (int): Time buckets per window.
+    """
+
+    def __init__(self, channels, windows=None, buckets: int = WINDOW_BUCKETS):
+        self.channels = list(channels)
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        self.windows = {name: WindowStats(len(self.channels), duration, buckets) for name, duration in (windows or DEFAULT_WINDOWS).items()}
+
+    def add(self, time, values):
+        time_us = to_us(time)
+        values = np.asarray(values, dtype=np.float64)
+        for window in self.windows.values():
+            window.add(time_us, values)
+
+    def load(self, times, values):
+        """
+        Initialize all windows from a restored history, e.g. the store contents.
+        """
+        times_us = np.asarray(times, dtype='datetime64[us]').astype(np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(times_us), len(self.channels))
+        for window in self.windows.values():
+            window.load(times_us, values)
+
+    def query(self, channel: str, window: str) -> dict:
+        """
+        Return count, mean, std, min, max and ewma of `channel` over `window`,
+        e.g. query('C-box', '1 day')['max'].
+        """
+        return self.windows[window].channel(self.index[channel])
+
+    def snapshot(self, window: str) -> dict:
+        return {name: self.windows[window].channel(i) for i, name in enumerate(self.channels)}
+
+    def clear(self):
+        for window in self.windows.values():
+            window.clear()
@@ -0,0 +1,147 @@
+import numpy as np
+
+
+class TimeSeriesStore:
+    """
+    Fixed-capacity, columnar ring buffer for the sampled channels.
+
+    Every column is preallocated with twice the capacity and each sample is
+    written to both halves ("mirrored"), so the most recent `n` samples are
+    always one contiguous slice. This keeps `append` O(1) and lets `last` and
+    `window` hand out zero-copy NumPy views even after the buffer has wrapped.
+
+    Parameters:
+    channels (list): Names of the float channels, in header order.
+    capacity (int): Maximum number of samples kept in memory.
+    """
+
+    def __init__(self, channels, capacity: int = 17280):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1.")
+        self.channels = list(channels)
+        self.capacity = capacity
+        self._idx = np.zeros(2 * capacity, dtype=np.int64)
+        self._times = np.zeros(2 * capacity, dtype='datetime64[us]')
+        self._columns = {name: np.zeros(2 * capacity, dtype=np.float64) for name in self.channels}
+        self._pos = -1  # Position of the newest sample in the first half
+        self.total = 0  # Number of samples ever appended
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def __bool__(self):
+        return self.total > 0
+
+    def append(self, idx: int, time, values):
+        """
+        Append one sample. `values` is a sequence in `channels` order.
+        """
+        pos = (self._pos + 1) % self.capacity
+        mirror = pos + self.capacity
+        time = np.datetime64(time, 'us')
+        self._idx[pos] = self._idx[mirror] = idx
+        self._times[pos] = self._times[mirror] = time
+        for name, value in zip(self.channels, values):
+            column = self._columns[name]
+            column[pos] = column[mirror] = value
+        self._pos = pos
+        self.total += 1
+
+    def extend(self, idx, times, values):
+        """
+        Append many samples at once. `values` is a 2D array with one column
+        per channel; only the newest `capacity` rows are kept.
+        """
+        n = len(idx)
+        if n == 0:
+            return
+        keep = min(n, self.capacity)
+        pos = (self._pos + 1 + np.arange(keep)) % self.capacity
+        values = np.asarray(values, dtype=np.float64)[n - keep:]
+        for target in (pos, pos + self.capacity):
+            self._idx[target] = np.asarray(idx)[n - keep:]
+            self._times[target] = np.asarray(times, dtype='datetime64[us]')[n - keep:]
+            for i, name in enumerate(self.channels):
+                self._columns[name][target] = values[:, i]
+        self._pos = int(pos[-1])
+        self.total += n
+
+    def update_last(self, name: str, value: float):
+        """
+        Overwrite a channel of the newest sample in place (manual overrides).
+        """
+        if not self.total:
+            return
+        column = self._columns[name]
+        column[self._pos] = column[self._pos + self.capacity] = value
+
+    def _slice(self, n):
+        n = min(n, len(self))
+        end = self._pos + self.capacity + 1
+        return slice(end - n, end)
+
+    def last(self, n: int = None):
+        """
+        Return (idx, times, columns) views over the newest `n` samples (all if None).
+        The views alias the buffer and are only valid until the next append.
+        """
+        s = self._slice(len(self) if n is None else n)
+        return self._idx[s], self._times[s], {name: column[s] for name, column in self._columns.items()}
+
+    def window(self, start, end=None):
+        """
+        Return (idx, times, columns) views over samples with start <= time <= end.
+        """
+        idx, times, columns = self.last()
+        lo = np.searchsorted(times, np.datetime64(start, 'us'), side='left')
+        hi = len(times) if end is None else np.searchsorted(times, np.datetime64(end, 'us'), side='right')
+        return idx[lo:hi], times[lo:hi], {name: column[lo:hi] for name, column in columns.items()}
+
+    def times(self):
+        return self.last()[1]
+
+    def column(self, name: str):
+        return self._columns[name][self._slice(len(self))]
+
+    def last_row(self):
+        """
+        Return the newest sample as a row laid out like the CSV headers:
+        [idx, datetime, channel values...].
+        """
+        if not self.total:
+            return None
+        pos = self._pos
+        return [int(self._idx[pos]), self._times[pos].item()] + [float(self._columns[name][pos]) for name in self.channels]
+
+    def clear(self):
+        self._pos = -1
+        self.total = 0
+
+    @staticmethod
+    def estimate_bytes(capacity: int, n_channels: int) -> int:
+        """
+        Bytes needed for a store of the given size, for per-device sizing.
+        """
+        per_sample = np.dtype(np.int64).itemsize + np.dtype('datetime64[us]').itemsize + n_channels * np.dtype(np.float64).itemsize
+        return 2 * capacity * per_sample
+
+    def memory_report(self) -> dict:
+        """
+        Report the memory footprint of the preallocated columns.
+        """
+        columns = {'idx': self._idx.nbytes, 'datetime': self._times.nbytes}
+        columns.update({name: column.nbytes for name, column in self._columns.items()})
+        return {
+            'capacity': self.capacity,
+            'used': len(self),
+            'total_appended': self.total,
+            'columns': columns,
+            'total_bytes': sum(columns.values()),
+        }
+
+if __name__ == '__main__':
+    # Print the footprint of a few capacities to size the store per device
+    n_channels = 8
+    for label, capacity in [('1 hour', 720), ('1 day', 17280), ('1 week', 120960)]:
+        size = TimeSeriesStore.estimate_bytes(capacity, n_channels)
+        print(f"{label:>7} @ 5 s ({capacity} samples): {size / 1024 / 1024:.2f} MiB")
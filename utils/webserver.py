@@ -0,0 +1,520 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from utils.shm import SharedRingReader, process_alive
+from utils.segments import list_segments, iter_range_lines, open_segment
+from utils.ingest import find_latest_log, parse_csv_lines
+from utils.binlog import BinaryLog, encode_header, record_dtype, CSV_TIME_FORMAT
+
+HOST = '127.0.0.1'  # Localhost only
+PORT = 8765
+SHM_NAME = 'sow_live'  # Ring buffer published by the GUI or the acquisition service (utils/shm.py)
+POLL_MS = 20  # How often the ring buffer is checked for new samples
+BATCH_MS = 200  # Default time a subscriber's deltas are collected before they are sent
+MAX_BATCH_ROWS = 1000  # Largest delta message; a lagging subscriber catches up in several
+MAX_SUBSCRIBERS = 1000
+EXPORT_CHUNK_ROWS = 10000  # Rows read, converted and sent per export chunk
+WRITE_BUFFER_BYTES = 256 * 1024  # drain() waits while more than this is queued for a client
+MAX_REQUEST_BYTES = 16384
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def parse_time(text, default):
+    if not text:
+        return default
+    return np.datetime64(text.replace(' ', 'T'), 'us').item()
+
+
+def now_us() -> int:
+    return int(np.datetime64(datetime.now(), 'us').astype(np.int64))  # Naive local time, like the samples
+
+
+def ws_frame(payload: bytes, opcode: int = 0x1, mask: bool = False) -> bytes:
+    """
+    One final WebSocket frame. Clients must mask their frames, servers must not.
+    """
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, (0x80 if mask else 0) | length])
+    elif length < 65536:
+        header = bytes([0x80 | opcode, (0x80 if mask else 0) | 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, (0x80 if mask else 0) | 127]) + length.to_bytes(8, 'big')
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    masked = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(key, np.uint8), length)).tobytes()
+    return header + key + masked
+
+
+async def ws_read(reader):
+    """
+    Read one WebSocket frame and return (opcode, payload). Fragmented
+    messages are not used by either side and are returned frame by frame.
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), 'big')
+    if length > MAX_REQUEST_BYTES:
+        raise ValueError("WebSocket frame too large.")
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if key:
+        payload = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(key, np.uint8), length)).tobytes()
+    return first & 0x0F, payload
+
+
+def delta_message(seq: int, next_seq: int, lost: int, idx, times, values, writer: int = None) -> bytes:
+    return json.dumps({
+        'writer': writer,
+        'seq': seq,
+        'next': next_seq,
+        'lost': lost,
+        'idx': idx.tolist(),
+        'time_us': times.astype(np.int64).tolist(),
+        'values': values.tolist(),
+    }, separators=(',', ':')).encode()
+
+
+class DataServer:
+    """
+    Localhost HTTP/WebSocket server for getting data off a unit.
+
+    Live samples come from the shared memory ring buffer (utils/shm.py), so
+    the server runs in its own process and never touches the GUI. Every
+    subscriber keeps its own sequence number into the ring, and new samples
+    are only read when the subscriber is ready for them, so a slow client
+    just falls behind. If it falls further behind than the ring holds, the
+    next message reports the `lost` count and the gap can be fetched from
+    /export. Exports are streamed from the log files in chunks with chunked
+    transfer encoding, so only one chunk is in memory per request.
+
+    Endpoints:
+    GET /schema                      headers, channels and the current sequence number
+    GET /latest?n=100                newest samples in the ring
+    GET /deltas?since=SEQ&writer=PID&wait=10  long poll: samples from SEQ on, waiting up to `wait` s
+    GET /live?since=SEQ&batch_ms=200 WebSocket stream of delta batches
+    GET /export?start=&end=&format=csv|binary  time range from the logs
+
+    Sequence numbers belong to one ring, identified by the `writer` pid in
+    every delta. When the writer restarts, subscribers continue at the start
+    of the new ring and the samples of the old one they never received are
+    counted in `lost`.
+
+    Parameters:
+    shm_name (str): Ring buffer of the live samples.
+    directory (str): Directory of the sow_data_* logs.
+    """
+
+    def __init__(self, shm_name: str = SHM_NAME, directory: str = '.', host: str = HOST, port: int = PORT):
+        self.shm_name = shm_name
+        self.directory = directory
+        self.host = host
+        self.port = port
+        self.ring = None
+        self.head = 0
+        self.writer = None  # Pid of the writer of the mapped ring
+        self.final_heads = {}  # Writer pid -> last sequence number of its ring, for rings that were replaced
+        self.next_attach = 0.0
+        self.new_samples = None  # asyncio.Condition, created on the loop
+        self.subscribers = 0
+        self.stats = {'requests': 0, 'exports': 0, 'export_rows': 0, 'messages': 0, 'rows_sent': 0, 'lost': 0, 'rejected': 0}
+
+    def attach(self):
+        # The writer may start later or be restarted (or crash); its new segment needs a new mapping
+        if self.ring is not None and not self.ring.closed and (time.monotonic() < self.next_attach or process_alive(self.ring.writer_pid)):
+            return self.ring
+        self.next_attach = time.monotonic() + 1.0  # Retry a crashed writer's segment once a second
+        try:
+            ring = SharedRingReader(self.shm_name)
+        except (FileNotFoundError, ValueError):
+            ring = None
+        if self.ring is not None and ring is not None and ring.writer_pid == self.ring.writer_pid:
+            ring.close()  # Still the same ring
+            return self.ring
+        if self.ring is not None:
+            if len(self.final_heads) >= 16:
+                self.final_heads.pop(next(iter(self.final_heads)))
+            self.final_heads[self.ring.writer_pid] = self.ring.head()
+            self.ring.close()
+        self.ring = ring
+        return self.ring
+
+    def resync(self, ring, seq: int, writer):
+        """
+        Return (seq, lost) for a subscriber at `seq` of the ring of `writer`:
+        unchanged while that ring is published, otherwise the start of the
+        current ring and the samples of the old one it never received.
+        """
+        if writer == ring.writer_pid or (writer is None and seq <= ring.head() + 1):
+            return seq, 0
+        final = self.final_heads.get(writer)
+        return 1, max(0, final - seq + 1) if final is not None else 0
+
+    async def poll(self):
+        while True:
+            ring = self.attach()
+            head = ring.head() if ring else 0
+            writer = ring.writer_pid if ring else None
+            if head != self.head or writer != self.writer:
+                self.head, self.writer = head, writer
+                async with self.new_samples:
+                    self.new_samples.notify_all()
+            await asyncio.sleep(POLL_MS / 1000)
+
+    async def wait_for(self, seq: int, timeout: float, writer=None) -> bool:
+        # Wait until the ring holds sequence number `seq`, or another writer took over
+        ready = lambda: self.head >= seq or (writer is not None and self.writer != writer)
+        if ready():
+            return True
+        try:
+            async with self.new_samples:
+                await asyncio.wait_for(self.new_samples.wait_for(ready), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def serve_forever(self):
+        self.new_samples = asyncio.Condition()
+        poller = asyncio.create_task(self.poll())
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        print(f"Serving {self.directory} and shared memory '{self.shm_name}' on http://{self.host}:{self.port}/")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+
+    async def handle(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_BYTES)
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            request_line, *header_lines = request.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(':') for line in header_lines if line)}
+            url = urlsplit(target)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            self.stats['requests'] += 1
+            if method != 'GET':
+                await self.respond(writer, 405, {'error': 'Only GET is supported.'})
+            elif url.path == '/live' and headers.get('upgrade', '').lower() == 'websocket':
+                await self.live(reader, writer, headers, query)
+            elif url.path == '/schema':
+                await self.respond(writer, 200, self.schema())
+            elif url.path == '/latest':
+                await self.latest(writer, query)
+            elif url.path == '/deltas':
+                await self.deltas(writer, query)
+            elif url.path == '/export':
+                await self.export(writer, query)
+            elif url.path == '/stats':
+                await self.respond(writer, 200, {**self.stats, 'subscribers': self.subscribers, 'head': self.head})
+            else:
+                await self.respond(writer, 404, {'error': f'Unknown path {url.path}.'})
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception as e:
+            try:
+                await self.respond(writer, 400, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status: int, body: dict):
+        data = json.dumps(body).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}[status]
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + data)
+        await writer.drain()
+
+    def schema(self) -> dict:
+        ring = self.attach()
+        if ring is None:
+            return {'live': False}
+        return {'live': True, 'headers': ring.headers, 'channels': ring.channels, 'capacity': ring.capacity, 'head': ring.head()}
+
+    async def latest(self, writer, query):
+        ring = self.attach()
+        if ring is None:
+            await self.respond(writer, 503, {'error': f"Shared memory '{self.shm_name}' is not published."})
+            return
+        idx, times, values = ring.latest(int(query.get('n', 1)))
+        await self.respond(writer, 200, {'head': ring.head(), 'idx': idx.tolist(), 'time_us': times.astype(np.int64).tolist(), 'values': values.tolist()})
+
+    async def deltas(self, writer, query):
+        ring = self.attach()
+        if ring is None:
+            await self.respond(writer, 503, {'error': f"Shared memory '{self.shm_name}' is not published."})
+            return
+        seq = int(query.get('since', self.head + 1))
+        seq, gap = self.resync(ring, seq, int(query['writer']) if 'writer' in query else None)
+        ring_writer = ring.writer_pid
+        await self.wait_for(seq, float(query.get('wait', 0)), ring_writer)
+        ring = self.attach()
+        if ring is None:
+            await self.respond(writer, 503, {'error': f"Shared memory '{self.shm_name}' is not published."})
+            return
+        seq, restart_gap = self.resync(ring, seq, ring_writer)  # The writer may have restarted during the wait
+        gap += restart_gap
+        next_seq, lost, idx, times, values = ring.read_since(seq, MAX_BATCH_ROWS)
+        lost += gap
+        self.stats['rows_sent'] += len(idx)
+        self.stats['lost'] += lost
+        data = delta_message(seq, next_seq, lost, idx, times, values, ring.writer_pid)
+        writer.write(f'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+        await writer.drain()
+
+    async def live(self, reader, writer, headers, query):
+        if self.subscribers >= MAX_SUBSCRIBERS:
+            self.stats['rejected'] += 1
+            await self.respond(writer, 503, {'error': 'Too many subscribers.'})
+            return
+        accept = base64.b64encode(hashlib.sha1(headers['sec-websocket-key'].encode() + WS_GUID).digest()).decode()
+        writer.write(f'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     f'Sec-WebSocket-Accept: {accept}\r\n\r\n'.encode())
+        await writer.drain()
+        self.subscribers += 1
+        closed = asyncio.Event()
+        control = asyncio.create_task(self.ws_control(reader, writer, closed))
+        seq = int(query.get('since', self.head + 1))
+        ring_writer = int(query['writer']) if 'writer' in query else self.writer
+        batch = float(query.get('batch_ms', BATCH_MS)) / 1000
+        try:
+            while not closed.is_set():
+                if not await self.wait_for(seq, 1.0, ring_writer):
+                    continue
+                await asyncio.sleep(batch)  # Collect a batch instead of sending every sample
+                ring = self.attach()
+                if ring is None:
+                    continue
+                seq, gap = self.resync(ring, seq, ring_writer)  # A restarted writer starts a new ring at 1
+                ring_writer = ring.writer_pid
+                next_seq, lost, idx, times, values = ring.read_since(seq, MAX_BATCH_ROWS)
+                lost += gap
+                writer.write(ws_frame(delta_message(seq, next_seq, lost, idx, times, values, ring_writer)))
+                await writer.drain()  # Backpressure: wait until the client has taken it
+                seq = next_seq
+                self.stats['messages'] += 1
+                self.stats['rows_sent'] += len(idx)
+                self.stats['lost'] += lost
+        finally:
+            self.subscribers -= 1
+            control.cancel()
+
+    async def ws_control(self, reader, writer, closed):
+        # Answer pings and notice when the client goes away
+        try:
+            while True:
+                opcode, payload = await ws_read(reader)
+                if opcode == 0x8:
+                    writer.write(ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    writer.write(ws_frame(payload, 0xA))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            closed.set()
+
+    async def export(self, writer, query):
+        start = parse_time(query.get('start'), datetime(1970, 1, 2))
+        end = parse_time(query.get('end'), datetime(9999, 12, 31))
+        output = query.get('format', 'csv')
+        if output not in ('csv', 'binary'):
+            raise ValueError("format must be 'csv' or 'binary'.")
+        chunks = self.export_chunks(start, end, output)
+        content_type = 'text/csv' if output == 'csv' else 'application/octet-stream'
+        writer.write(f'HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n'.encode())
+        self.stats['exports'] += 1
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)  # File reads and parsing stay off the event loop
+            if chunk is None:
+                break
+            data, rows = chunk
+            self.stats['export_rows'] += rows
+            if data:
+                writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def export_chunks(self, start, end, output: str):
+        """
+        Yield (bytes, rows) chunks of the range: a CSV header or a binary log
+        header (utils/binlog.py layout) first, then the rows.
+        """
+        if list_segments(self.directory):
+            headers = None
+            for lines in iter_range_lines(self.directory, start, end, EXPORT_CHUNK_ROWS):
+                if headers is None:
+                    headers = self.log_headers()
+                    yield (','.join(headers) + '\n').encode() if output == 'csv' else encode_header(headers[2:], 'float64'), 0
+                if output == 'csv':
+                    yield b'\n'.join(lines) + b'\n', len(lines)  # Straight from the log, no parsing
+                else:
+                    idx, times, values = parse_csv_lines(lines, len(headers) - 2)
+                    records = np.empty(len(idx), dtype=record_dtype(headers[2:], 'float64'))
+                    records['idx'] = idx
+                    records['time_us'] = times.astype(np.int64)
+                    for i, name in enumerate(headers[2:]):
+                        records[name] = values[:, i]
+                    yield records.tobytes(), len(idx)
+            return
+        path = find_latest_log(self.directory, 'sowlog')
+        if path is None:
+            return
+        log = BinaryLog(path)
+        records = log.window(start, end)
+        yield (','.join(['idx', 'datetime'] + log.channels) + '\n').encode() if output == 'csv' else encode_header(log.channels, log.schema['value_dtype']), 0
+        for first in range(0, len(records), EXPORT_CHUNK_ROWS):
+            chunk = records[first:first + EXPORT_CHUNK_ROWS]
+            if output == 'binary':
+                yield chunk.tobytes(), len(chunk)  # Same record layout as the log
+                continue
+            times = chunk['time_us'].view('datetime64[us]').astype(object)
+            values = [chunk[name].round(3).astype(str) for name in log.channels]
+            lines = [','.join([str(i), t.strftime(CSV_TIME_FORMAT), *row]) for i, t, row in zip(chunk['idx'].tolist(), times, zip(*values))]
+            yield ('\n'.join(lines) + '\n').encode(), len(chunk)
+
+    def log_headers(self) -> list:
+        with open_segment(list_segments(self.directory)[0][0]) as file:
+            return file.readline().decode().strip().split(',')
+
+
+async def open_websocket(host: str, port: int, path: str):
+    reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.readuntil(b'\r\n\r\n')
+    if not response.startswith(b'HTTP/1.1 101'):
+        raise ConnectionError(response.split(b'\r\n')[0].decode())
+    return reader, writer
+
+
+async def ws_read_message(reader):
+    # Server frames are unmasked and may be larger than MAX_REQUEST_BYTES
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), 'big')
+    return first & 0x0F, await reader.readexactly(length)
+
+
+async def load_subscriber(host, port, seconds, batch_ms, slow, results):
+    reader, writer = await open_websocket(host, port, f'/live?batch_ms={batch_ms}')
+    report = {'slow': bool(slow), 'messages': 0, 'rows': 0, 'lost': 0, 'latencies_ms': []}
+    deadline = time.monotonic() + seconds
+    try:
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                opcode, payload = await asyncio.wait_for(ws_read_message(reader), remaining)
+            except asyncio.TimeoutError:
+                break
+            if opcode != 0x1:
+                continue
+            message = json.loads(payload)
+            report['messages'] += 1
+            report['rows'] += len(message['idx'])
+            report['lost'] += message['lost']
+            if message['time_us']:
+                report['latencies_ms'].append((now_us() - message['time_us'][-1]) / 1000)
+            if slow:
+                await asyncio.sleep(slow)  # Simulates a client that cannot keep up
+        writer.write(ws_frame(b'\x03\xe8', 0x8, mask=True))
+        await writer.drain()
+    finally:
+        writer.close()
+    results.append(report)
+
+
+async def load_export(host, port, start, end, output, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    query = '&'.join(f'{name}={value}' for name, value in (('start', start), ('end', end), ('format', output)) if value)
+    started = time.perf_counter()
+    writer.write(f'GET /export?{query.replace(" ", "T")} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode())
+    await writer.drain()
+    await reader.readuntil(b'\r\n\r\n')
+    size = 0
+    while True:
+        length = int((await reader.readuntil(b'\r\n')).strip(), 16)
+        if length == 0:
+            break
+        size += len(await reader.readexactly(length + 2)) - 2
+    writer.close()
+    results.append({'bytes': size, 'seconds': time.perf_counter() - started})
+
+
+async def load_test(host: str, port: int, subscribers: int, seconds: float, batch_ms: float, slow_fraction: float,
+                    exports: int, export_format: str, start: str, end: str) -> dict:
+    """
+    Run `subscribers` WebSocket subscribers (a fraction of them deliberately
+    slow) and `exports` concurrent range exports against a running server.
+    """
+    subscriptions, downloads = [], []
+    n_slow = int(subscribers * slow_fraction)
+    tasks = [load_subscriber(host, port, seconds, batch_ms, 1.0 if i < n_slow else 0, subscriptions) for i in range(subscribers)]
+    tasks += [load_export(host, port, start, end, export_format, downloads) for _ in range(exports)]
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [str(outcome) for outcome in outcomes if isinstance(outcome, Exception)]
+    fast = [report for report in subscriptions if not report['slow']]
+    latencies = np.concatenate([report['latencies_ms'] for report in fast if report['latencies_ms']] or [np.zeros(0)])
+    return {
+        'subscribers': len(subscriptions),
+        'errors': errors[:5],
+        'error_count': len(errors),
+        'rows_per_subscriber': float(np.mean([report['rows'] for report in fast])) if fast else 0.0,
+        'messages': sum(report['messages'] for report in subscriptions),
+        'lost_fast': sum(report['lost'] for report in fast),
+        'lost_slow': sum(report['lost'] for report in subscriptions if report['slow']),
+        'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,  # Of the fast subscribers
+        'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'exports': len(downloads),
+        'export_mb_per_s': [download['bytes'] / download['seconds'] / 2 ** 20 for download in downloads],
+    }
+
+
+if __name__ == '__main__':
+    # python3 -m utils.webserver serve --dir . --shm sow_live
+    # python3 -m utils.webserver loadtest --subscribers 200 --seconds 10 --exports 4
+    parser = argparse.ArgumentParser(description='Local streaming data server and its load-test client.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--dir', default='.', help='Directory of the sow_data_* logs')
+    serve.add_argument('--shm', default=SHM_NAME, help='Shared memory ring of the live samples')
+    serve.add_argument('--port', type=int, default=PORT)
+    load = commands.add_parser('loadtest')
+    load.add_argument('--port', type=int, default=PORT)
+    load.add_argument('--subscribers', type=int, default=100)
+    load.add_argument('--seconds', type=float, default=10)
+    load.add_argument('--batch-ms', type=float, default=BATCH_MS)
+    load.add_argument('--slow', type=float, default=0.1, help='Fraction of subscribers that read one message per second')
+    load.add_argument('--exports', type=int, default=2, help='Concurrent range exports')
+    load.add_argument('--format', default='csv', choices=['csv', 'binary'])
+    load.add_argument('--start', default='')
+    load.add_argument('--end', default='')
+    args = parser.parse_args(sys.argv[1:])
+    if args.command == 'serve':
+        try:
+            asyncio.run(DataServer(args.shm, args.dir, HOST, args.port).serve_forever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        stats = asyncio.run(load_test(HOST, args.port, args.subscribers, args.seconds, args.batch_ms, args.slow,
+                                      args.exports, args.format, args.start, args.end))
+        print(json.dumps(stats, indent=2))
@@ -0,0 +1,88 @@
+import os
+import weakref
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPalette, QColor, QPixmap
+from PyQt5.QtWidgets import QAbstractButton
+
+_pixmaps = {}  # (path, mtime, width, height) -> scaled QPixmap, per process
+
+
+def load_pixmap(path: str, width: int, height: int, cache_dir: str = None) -> QPixmap:
+    """
+    Load an image scaled to fit width x height. The scaled pixmap is kept in
+    memory and, with `cache_dir`, saved as a small PNG keyed by the source's
+    modification time, so later starts skip decoding the full-size original.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return QPixmap()
+    key = (os.path.abspath(path), mtime, width, height)
+    pixmap = _pixmaps.get(key)
+    if pixmap is not None:
+        return pixmap
+    cached = None
+    if cache_dir:
+        cached = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{width}x{height}_{mtime}.png")
+        if os.path.exists(cached):
+            pixmap = QPixmap(cached)
+    if pixmap is None or pixmap.isNull():
+        pixmap = QPixmap(path).scaled(width, height, Qt.KeepAspectRatio)
+        if cached and not pixmap.isNull():
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                pixmap.save(cached, 'PNG')
+            except OSError as e:
+                print(f"Error caching {path}: {e}")
+    _pixmaps[key] = pixmap
+    return pixmap
+
+
+class WidgetBinder:
+    """
+    Diff layer between the GUI state and Qt widgets. The last text, color and
+    tooltip applied to each widget are cached and Qt is only called when they
+    change. Colors go through the widget palette instead of setStyleSheet,
+    which would re-polish the widget on every call.
+    """
+
+    def __init__(self):
+        self.texts = weakref.WeakKeyDictionary()
+        self.colors = weakref.WeakKeyDictionary()
+        self.tooltips = weakref.WeakKeyDictionary()
+        self.applied = 0
+        self.skipped = 0
+
+    def set_text(self, widget, text: str):
+        if self.texts.get(widget) == text:
+            self.skipped += 1
+            return
+        self.texts[widget] = text
+        widget.setText(text)
+        self.applied += 1
+
+    def set_color(self, widget, color: str):
+        if self.colors.get(widget) == color:
+            self.skipped += 1
+            return
+        self.colors[widget] = color
+        role = QPalette.ButtonText if isinstance(widget, QAbstractButton) else QPalette.WindowText
+        palette = widget.palette()
+        palette.setColor(role, QColor(color))
+        widget.setPalette(palette)
+        self.applied += 1
+
+    def set_tooltip(self, widget, text: str):
+        if self.tooltips.get(widget) == text:
+            self.skipped += 1
+            return
+        self.tooltips[widget] = text
+        widget.setToolTip(text)
+        self.applied += 1
+
+    def set_value(self, widget, value):
+        self.set_text(widget, str(value))
+
+    def stats(self) -> dict:
+        total = self.applied + self.skipped
+        return {'applied': self.applied, 'skipped': self.skipped, 'skipped_ratio': self.skipped / total if total else 0.0}